@@ -0,0 +1,372 @@
+"""
+Benchmarks of the bot, run without network access.
+
+Usage:
+    python bench.py startup [runs]               Import time and time to the first handled
+                                                 command, each run in a fresh interpreter
+    python bench.py workers [updates] [max]      Throughput with 1, 2, 4... up to max
+                                                 worker processes (see workers.py)
+    python bench.py commands [updates] [concurrency] [latency_ms] [error_rate]
+                                                 Latency percentiles and throughput of each
+                                                 command against the Grillo simulator
+    python bench.py clients [updates] [concurrency] [latency_ms]
+                                                 The same handler with the blocking
+                                                 GrilloClient and with AsyncGrilloClient,
+                                                 against the simulator over HTTP
+"""
+import asyncio
+import functools
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from telegram.request import BaseRequest, RequestData
+
+BENCH_ENV = {
+    "TELEGRAM_BOT_TOKEN": "123456:bench",
+    "GRILLO_API_TOKEN": "bench",
+    # Nothing listens there: Grillo calls fail fast instead of leaving the machine
+    "GRILLO_API_URL": "http://127.0.0.1:9",
+    "STATE_DB": "",
+    "LAB_TIME_DB": ":memory:",
+    "METRICS_PORT": "0",
+}
+
+
+def command_update(update_id: int, user_id: int, text: str) -> Dict[str, Any]:
+    """A Bot API update carrying text sent by user_id in a private chat."""
+    command = text.split()[0]
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": f"User {user_id}"},
+            "text": text,
+            "entities": [{"type": "bot_command", "offset": 0, "length": len(command)}],
+        },
+    }
+
+
+class FakeTelegramRequest(BaseRequest):
+    """
+    Bot API transport answering locally.
+
+    getUpdates serves the queued updates, sendMessage records the message
+    (and calls on_send with its parameters) and every other method succeeds.
+    """
+
+    def __init__(self, updates: Optional[List[Dict[str, Any]]] = None,
+                 on_send: Optional[Callable[[Dict[str, Any]], Any]] = None):
+        self.updates = list(updates or [])
+        self.on_send = on_send
+        self.sent: List[Tuple[float, Dict[str, Any]]] = []
+        self.message_sent = asyncio.Event()
+
+    @property
+    def read_timeout(self) -> Optional[float]:
+        return None
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def do_request(self, url: str, method: str, request_data: Optional[RequestData] = None,
+                         read_timeout=None, write_timeout=None, connect_timeout=None,
+                         pool_timeout=None) -> Tuple[int, bytes]:
+        endpoint = url.rsplit("/", 1)[-1]
+        parameters = request_data.parameters if request_data else {}
+        if endpoint == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+        elif endpoint == "getUpdates":
+            result, self.updates = self.updates, []
+            if not result:
+                await asyncio.sleep(0.01)
+        elif endpoint == "sendMessage":
+            self.sent.append((time.perf_counter(), parameters))
+            self.message_sent.set()
+            if self.on_send:
+                self.on_send(parameters)
+            result = {
+                "message_id": len(self.sent),
+                "date": int(time.time()),
+                "chat": {"id": parameters["chat_id"], "type": "private"},
+                "text": parameters["text"],
+            }
+        else:
+            result = True
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+
+async def _first_update(application, request: FakeTelegramRequest):
+    """Start the application and wait until it answers the first update."""
+    async with application:
+        await application.start()
+        await application.updater.start_polling()
+        await request.message_sent.wait()
+        await application.updater.stop()
+        await application.stop()
+
+
+# Run in a fresh interpreter: the clock starts before anything is imported
+_STARTUP_CHILD = """
+import time
+started_at = time.perf_counter()
+import bot
+imported_at = time.perf_counter()
+import bench
+bench.startup_child(started_at, imported_at)
+"""
+
+
+def startup_child(started_at: float, imported_at: float):
+    """Time to the first handled command, printed as JSON with the import time."""
+    import logging
+    import bot
+
+    logging.disable(logging.CRITICAL)
+    request = FakeTelegramRequest([command_update(1, 1000, "/help")])
+    asyncio.run(_first_update(bot.build_application(request=request), request))
+    print(json.dumps({
+        "import": imported_at - started_at,
+        "first_update": request.sent[0][0] - started_at,
+    }))
+
+
+def bench_startup(runs: int):
+    """Report import time and time to the first handled command over runs fresh interpreters."""
+    # process: whole run, including interpreter startup and shutdown
+    samples = {"import": [], "first_update": [], "process": []}
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, MAPPING_FILE=os.path.join(tmp, "mapping.json"), GRILLO_RETRIES="0", **BENCH_ENV)
+        for _ in range(runs):
+            start = time.perf_counter()
+            output = subprocess.run(
+                [sys.executable, "-c", _STARTUP_CHILD],
+                env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+                check=True, capture_output=True, text=True,
+            ).stdout
+            samples["process"].append(time.perf_counter() - start)
+            for name, value in json.loads(output.splitlines()[-1]).items():
+                samples[name].append(value)
+    for name, values in samples.items():
+        print(
+            f"{name:>12}: median {statistics.median(values) * 1000:7.1f} ms"
+            f"  min {min(values) * 1000:7.1f} ms  max {max(values) * 1000:7.1f} ms"
+        )
+
+
+def _reporting_request(replies) -> FakeTelegramRequest:
+    """Bot API transport of a benchmark worker, reporting each message sent on the replies queue."""
+    return FakeTelegramRequest(on_send=lambda parameters: replies.put(parameters["chat_id"]))
+
+
+def _await_replies(replies, count: int):
+    for _ in range(count):
+        replies.get(timeout=60)
+
+
+def bench_workers(updates: int, max_workers: int):
+    """Report /help throughput with 1, 2, 4... up to max_workers worker processes."""
+    import multiprocessing
+    import workers
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        # Inherited by the spawned workers
+        os.environ.update(
+            BENCH_ENV,
+            MAPPING_BACKEND="sqlite",
+            MAPPING_DB=os.path.join(tmp, "mapping.db"),
+            STATE_DB=os.path.join(tmp, "state.db"),
+            OUTBOX_GLOBAL_RATE="1000000",
+        )
+        count = 1
+        while count <= max_workers:
+            replies = multiprocessing.get_context("spawn").Queue()
+            pool = workers.start_workers(count, functools.partial(_reporting_request, replies))
+            try:
+                # One message per worker, so that startup is not measured
+                for index in range(count):
+                    pool[index]["updates"].put(command_update(index + 1, index, "/help"))
+                _await_replies(replies, count)
+
+                start = time.perf_counter()
+                for update_id in range(updates):
+                    # A different user for every update: no per-chat rate limit applies
+                    user_id = 1000 + update_id
+                    pool[user_id % count]["updates"].put(command_update(update_id + 100, user_id, "/help"))
+                _await_replies(replies, updates)
+                results[count] = updates / (time.perf_counter() - start)
+            finally:
+                workers.stop_workers(pool)
+            print(f"{count:>3} workers: {results[count]:8.0f} updates/s  ({results[count] / results[1]:.2f}x)")
+            count *= 2
+
+
+# Name and text of the commands measured by bench_commands. /clockin names the
+# location, or it would only show the location keyboard; /clockout shows the
+# confirmation keyboard
+COMMANDS = {
+    "/help": "/help",
+    "/start": "/start",
+    "/status": "/status",
+    "/status all": "/status all",
+    "/clockin": "/clockin @lab",
+    "/clockout": "/clockout benchmarking",
+    "/hours": "/hours",
+    "/leaderboard": "/leaderboard",
+    "/bookings": "/bookings",
+    "/tonight": "/tonight",
+}
+
+
+def percentile(values: List[float], p: int) -> float:
+    """p-th percentile of values (at least two of them)."""
+    return statistics.quantiles(values, n=100, method="inclusive")[p - 1]
+
+
+async def _run_command(application, text: str, updates: int, users: int, concurrency: int,
+                       first_update_id: int) -> Tuple[List[float], float]:
+    """Handle updates copies of the command text, spread over users, concurrency at a time."""
+    from telegram import Update
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(n: int):
+        data = command_update(first_update_id + n, 1000 + n % users, text)
+        async with semaphore:
+            start = time.perf_counter()
+            await application.process_update(Update.de_json(data, application.bot))
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(n) for n in range(updates)))
+    return latencies, time.perf_counter() - start
+
+
+def bench_commands(updates: int, concurrency: int, latency: float, error_rate: float):
+    """Report latency percentiles and throughput of each command, with Grillo simulated in process."""
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.update(
+            BENCH_ENV,
+            MAPPING_FILE=os.path.join(tmp, "mapping.json"),
+            # Measure the bot, not Telegram's flood limits
+            OUTBOX_CHAT_RATE="1000000",
+            OUTBOX_GROUP_RATE="1000000",
+            OUTBOX_GLOBAL_RATE="1000000",
+        )
+        import logging
+        import bot
+        import grillo_client
+        from grillo_sim import GrilloSimulator
+
+        logging.disable(logging.CRITICAL)
+        users = min(updates, 200)
+        sim = GrilloSimulator(users=users, admins=0, latency=latency, error_rate=error_rate, seed=1)
+
+        async def run():
+            grillo_client.use_transport(sim.transport())
+            application = bot.build_application(request=FakeTelegramRequest(), jobs=False)
+            async with application:
+                print(f"{'command':<14} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'updates/s':>10}")
+                for index, (name, text) in enumerate(COMMANDS.items()):
+                    latencies, elapsed = await _run_command(
+                        application, text, updates, users, concurrency, index * updates
+                    )
+                    print(
+                        f"{name:<14} {percentile(latencies, 50) * 1000:8.1f}"
+                        f" {percentile(latencies, 95) * 1000:8.1f} {percentile(latencies, 99) * 1000:8.1f}"
+                        f" {updates / elapsed:10.0f}"
+                    )
+            await grillo_client.aclose()
+            print(f"Grillo requests: {sim.requests}")
+
+        asyncio.run(run())
+
+
+def bench_clients(updates: int, concurrency: int, latency: float):
+    """
+    Compare one Grillo lookup per update made with the blocking GrilloClient
+    (as the handlers did before AsyncGrilloClient) and with AsyncGrilloClient.
+    """
+    os.environ.update(BENCH_ENV)
+    import logging
+    import grillo_client
+    from telegram import Update
+    from telegram.ext import Application, CommandHandler, ContextTypes
+    from grillo_sim import GrilloSimulator
+
+    logging.disable(logging.CRITICAL)
+    users = min(updates, 200)
+    sim = GrilloSimulator(users=users, latency=latency, seed=1)
+    server, api_url = sim.serve_http()
+
+    async def blocking(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        user = grillo_client.GrilloClient(api_url=api_url).get_user_by_telegram_id(update.effective_user.id)
+        await update.effective_message.reply_text(str(user.get("uid")))
+
+    async def awaited(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        user = await grillo_client.AsyncGrilloClient(api_url=api_url).get_user_by_telegram_id(update.effective_user.id)
+        await update.effective_message.reply_text(str(user.get("uid")))
+
+    async def run():
+        print(f"{'client':<10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'updates/s':>10}")
+        results = {}
+        for index, (name, handler) in enumerate((("blocking", blocking), ("async", awaited))):
+            application = Application.builder().token(BENCH_ENV["TELEGRAM_BOT_TOKEN"]).request(
+                FakeTelegramRequest()
+            ).build()
+            application.add_handler(CommandHandler("whoami", handler))
+            async with application:
+                latencies, elapsed = await _run_command(
+                    application, "/whoami", updates, users, concurrency, index * updates
+                )
+            results[name] = updates / elapsed
+            print(
+                f"{name:<10} {percentile(latencies, 50) * 1000:8.1f}"
+                f" {percentile(latencies, 95) * 1000:8.1f} {percentile(latencies, 99) * 1000:8.1f}"
+                f" {results[name]:10.0f}"
+            )
+        await grillo_client.aclose()
+        print(f"async / blocking throughput: {results['async'] / results['blocking']:.1f}x")
+
+    try:
+        asyncio.run(run())
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "startup":
+        bench_startup(int(sys.argv[2]) if len(sys.argv) > 2 else 10)
+    elif len(sys.argv) >= 2 and sys.argv[1] == "workers":
+        bench_workers(
+            int(sys.argv[2]) if len(sys.argv) > 2 else 2000,
+            int(sys.argv[3]) if len(sys.argv) > 3 else os.cpu_count() or 1,
+        )
+    elif len(sys.argv) >= 2 and sys.argv[1] == "commands":
+        bench_commands(
+            int(sys.argv[2]) if len(sys.argv) > 2 else 500,
+            int(sys.argv[3]) if len(sys.argv) > 3 else 20,
+            float(sys.argv[4]) / 1000 if len(sys.argv) > 4 else 0.02,
+            float(sys.argv[5]) if len(sys.argv) > 5 else 0.0,
+        )
+    elif len(sys.argv) >= 2 and sys.argv[1] == "clients":
+        bench_clients(
+            int(sys.argv[2]) if len(sys.argv) > 2 else 200,
+            int(sys.argv[3]) if len(sys.argv) > 3 else 20,
+            float(sys.argv[4]) / 1000 if len(sys.argv) > 4 else 0.02,
+        )
+    else:
+        print(__doc__)
+        sys.exit(1)
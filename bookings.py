@@ -0,0 +1,306 @@
+"""Local calendar of lab bookings, synced from Grillo week by week."""
+import bisect
+import logging
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from telegram.ext import ContextTypes
+
+import metrics
+from cache import TTLCache
+from config import config
+from grillo_client import AsyncGrilloClient, async_admin_grillo, week_start
+
+logger = logging.getLogger(__name__)
+
+BOOKING_SYNCS = metrics.counter(
+    "booking_syncs_total", "Weeks of bookings fetched from Grillo, by outcome", ["result"]
+)
+
+# Bookings a user can cancel without being an admin: the ones listed by /bookings
+UNBOOK_LOOKAHEAD = 7 * 86400
+
+
+def booking_end(booking: Dict[str, Any], default_duration: float) -> int:
+    """End of a booking, or start + default_duration if it has none."""
+    return int(booking.get("endTime") or booking["startTime"] + default_duration)
+
+
+class BookingIndex:
+    """
+    Bookings sorted by start time, answering range queries with binary search.
+
+    Bookings have a bounded length, so those overlapping [start, end) all
+    start between start - longest length and end: a bisect on the start
+    times finds them without scanning the whole calendar.
+
+    IDs are compared as strings, so "42" typed in a command finds the
+    booking whose ID Grillo returned as 42.
+    """
+
+    def __init__(self, default_duration: float):
+        """
+        Initialize an empty index.
+
+        Args:
+            default_duration: Seconds assumed for bookings without an end time
+        """
+        self.default_duration = default_duration
+        self._starts: List[int] = []
+        self._bookings: List[Dict[str, Any]] = []
+        self._by_id: Dict[str, Dict[str, Any]] = {}
+        self._longest = 0
+
+    def __len__(self) -> int:
+        return len(self._bookings)
+
+    def __contains__(self, booking_id: Any) -> bool:
+        return str(booking_id) in self._by_id
+
+    def get(self, booking_id: Any) -> Optional[Dict[str, Any]]:
+        return self._by_id.get(str(booking_id))
+
+    def add(self, booking: Dict[str, Any]):
+        """Insert booking, replacing the one with the same ID if present."""
+        if booking["id"] in self:
+            self.remove(booking["id"])
+        start = int(booking["startTime"])
+        position = bisect.bisect_right(self._starts, start)
+        self._starts.insert(position, start)
+        self._bookings.insert(position, booking)
+        self._by_id[str(booking["id"])] = booking
+        self._longest = max(self._longest, booking_end(booking, self.default_duration) - start)
+
+    def remove(self, booking_id: Any) -> Optional[Dict[str, Any]]:
+        """Remove a booking by ID, returning it if it was indexed."""
+        booking = self._by_id.pop(str(booking_id), None)
+        if booking is None:
+            return None
+        start = int(booking["startTime"])
+        position = bisect.bisect_left(self._starts, start)
+        while self._bookings[position] is not booking:
+            position += 1
+        del self._starts[position]
+        del self._bookings[position]
+        return booking
+
+    def between(self, start: float, end: float, location: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Bookings overlapping [start, end), optionally at one location, by start time."""
+        first = bisect.bisect_left(self._starts, start - self._longest)
+        last = bisect.bisect_left(self._starts, end)
+        return [
+            booking for booking in self._bookings[first:last]
+            if booking_end(booking, self.default_duration) > start
+            and (location is None or booking.get("location") == location)
+        ]
+
+    def replace_range(self, start: float, end: float, bookings: List[Dict[str, Any]]) -> Tuple[int, int]:
+        """
+        Make the bookings starting in [start, end) match bookings, touching only the differences.
+
+        Returns:
+            Number of bookings added or changed, and number removed
+        """
+        current = {
+            str(booking["id"]): booking
+            for booking in self._bookings[bisect.bisect_left(self._starts, start):bisect.bisect_left(self._starts, end)]
+        }
+        changed = 0
+        for booking in bookings:
+            if current.pop(str(booking["id"]), None) != booking:
+                self.add(booking)
+                changed += 1
+        for booking_id in current:
+            self.remove(booking_id)
+        return changed, len(current)
+
+
+class BookingCalendar:
+    """
+    BookingIndex kept in sync with Grillo.
+
+    A week is fetched when a query first needs it and again once its copy is
+    older than max_age; each fetch applies only the differences to the index.
+    Bookings made or deleted through the bot update the index directly, and a
+    background job keeps the current and next week fresh, so commands are
+    normally answered from memory.
+    """
+
+    def __init__(self, grillo_client: AsyncGrilloClient, max_age: float, default_duration: float):
+        """
+        Initialize an empty calendar.
+
+        Args:
+            grillo_client: AsyncGrilloClient with the admin token, used to sync
+            max_age: Seconds after which a synced week is fetched again
+            default_duration: Seconds assumed for bookings without an end time
+        """
+        self.grillo = grillo_client
+        self.index = BookingIndex(default_duration)
+        # Weeks synced recently; also coalesces concurrent syncs of one week
+        self._synced = TTLCache("booking_weeks", ttl=max_age)
+
+    async def _sync_week(self, week: date) -> bool:
+        try:
+            bookings = await self.grillo.get_bookings(week.isoformat())
+        except Exception:
+            BOOKING_SYNCS.inc(result="error")
+            raise
+        start = datetime.combine(week, datetime.min.time()).timestamp()
+        end = datetime.combine(week + timedelta(days=7), datetime.min.time()).timestamp()
+        changed, removed = self.index.replace_range(start, end, [b for b in bookings if b.get("startTime")])
+        BOOKING_SYNCS.inc(result="ok")
+        if changed or removed:
+            logger.info(f"Bookings of week {week}: {changed} new or changed, {removed} removed")
+        return True
+
+    def _weeks(self, start: float, end: float) -> Iterator[date]:
+        """Weeks touching [start, end), including the one of a booking started before start."""
+        week = week_start(datetime.fromtimestamp(start - self.index.default_duration).date())
+        last = week_start(datetime.fromtimestamp(end).date())
+        while week <= last:
+            yield week
+            week += timedelta(days=7)
+
+    async def ensure_synced(self, start: float, end: float):
+        """Sync every week touching [start, end) that is missing or out of date."""
+        for week in self._weeks(start, end):
+            await self._synced.get_or_load(week, lambda week=week: self._sync_week(week))
+
+    async def find(self, booking_id: Any, start: float, end: float) -> Optional[Dict[str, Any]]:
+        """
+        Booking with the given ID among those overlapping [start, end).
+
+        If it is not indexed those weeks are fetched again, even if recently
+        synced: it may have been made through another worker or the website.
+        """
+        await self.ensure_synced(start, end)
+        if booking_id not in self.index:
+            for week in self._weeks(start, end):
+                self._synced.pop(week)
+            await self.ensure_synced(start, end)
+        return self.index.get(booking_id)
+
+    async def between(self, start: float, end: float, location: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Bookings overlapping [start, end), syncing the weeks involved if needed."""
+        await self.ensure_synced(start, end)
+        return self.index.between(start, end, location)
+
+    async def book(self, grillo: AsyncGrilloClient, start: int, end: int,
+                   location: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Book [start, end) for the user of grillo, refusing overlaps with their own bookings.
+
+        Raises:
+            ValueError: If the user already has an overlapping booking, or Grillo refuses it
+        """
+        for booking in await self.between(start, end):
+            if str(booking.get("user")) == str(grillo.user["id"]):
+                raise ValueError(f"You already have a booking at {format_booking_time(booking)}")
+        booking = await grillo.create_booking(start, end, location)
+        if booking.get("id") is not None and booking.get("startTime"):
+            self.index.add(booking)
+        else:
+            # Unexpected answer: let the next query fetch the week again
+            self._synced.pop(week_start(datetime.fromtimestamp(start).date()))
+        return booking
+
+    async def unbook(self, grillo: AsyncGrilloClient, booking_id: Any) -> bool:
+        """
+        Delete a booking of the user of grillo (admins: anybody's).
+
+        Per-user clients send the admin token, so Grillo would delete any
+        booking: for non-admins the booking is looked up first, among those
+        of the coming week, and refused unless it is theirs.
+
+        Returns:
+            True if the booking was deleted
+        """
+        booking = self.index.get(booking_id)
+        if not grillo.is_admin():
+            if grillo.user is None:
+                return False
+            if booking is None:
+                now = time.time()
+                booking = await self.find(booking_id, now, now + UNBOOK_LOOKAHEAD)
+            if booking is None or str(booking.get("user")) != str(grillo.user["id"]):
+                return False
+        if not await grillo.delete_booking(booking["id"] if booking is not None else booking_id):
+            return False
+        self.index.remove(booking_id)
+        return True
+
+    async def sync_job(self, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """JobQueue callback refreshing the current and the next week."""
+        this_week = week_start(date.today())
+        for week in (this_week, this_week + timedelta(days=7)):
+            self._synced.pop(week)
+            try:
+                await self._synced.get_or_load(week, lambda week=week: self._sync_week(week))
+            except Exception as e:
+                logger.error(f"Error syncing bookings of week {week}: {e}")
+
+
+def format_booking_time(booking: Dict[str, Any]) -> str:
+    """Booking time as e.g. "Mon 18:00-21:00", or "Mon 18:00" without an end time."""
+    start = datetime.fromtimestamp(booking["startTime"])
+    text = start.strftime("%a %H:%M")
+    if booking.get("endTime"):
+        text += datetime.fromtimestamp(booking["endTime"]).strftime("-%H:%M")
+    return text
+
+
+def parse_booking(args: List[str], now: Optional[datetime] = None) -> Tuple[int, int]:
+    """
+    Parse the arguments of /book: [today|tomorrow|YYYY-MM-DD] HH:MM [HH:MM].
+
+    Without an end time the booking lasts BOOKING_DEFAULT_DURATION.
+
+    Returns:
+        Start and end as Unix timestamps
+
+    Raises:
+        ValueError: If the arguments are malformed or the booking is in the past
+    """
+    usage = "Usage: /book [today|tomorrow|YYYY-MM-DD] HH:MM [HH:MM] [@location]"
+    now = now or datetime.now()
+    args = list(args)
+    day = now.date()
+    try:
+        if args and args[0] in ("today", "tomorrow"):
+            day += timedelta(days=1 if args.pop(0) == "tomorrow" else 0)
+        elif args and "-" in args[0]:
+            day = date.fromisoformat(args.pop(0))
+        times = [datetime.combine(day, datetime.strptime(arg, "%H:%M").time()) for arg in args]
+    except ValueError:
+        raise ValueError(usage)
+    if not 1 <= len(times) <= 2:
+        raise ValueError(usage)
+    start = times[0]
+    end = times[1] if len(times) > 1 else start + timedelta(seconds=config.BOOKING_DEFAULT_DURATION)
+    if end <= start:
+        raise ValueError("The booking must end after it starts.")
+    if start < now:
+        raise ValueError("The booking starts in the past.")
+    return int(start.timestamp()), int(end.timestamp())
+
+
+def tonight(now: Optional[datetime] = None) -> Tuple[int, int]:
+    """Start and end of this evening: from TONIGHT_FROM (or now, if later) to midnight."""
+    now = now or datetime.now()
+    evening = datetime.combine(now.date(), datetime.min.time()) + timedelta(hours=config.TONIGHT_FROM)
+    midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+    return int(max(now, evening).timestamp()), int(midnight.timestamp())
+
+
+# Initialize booking calendar
+booking_calendar = BookingCalendar(
+    async_admin_grillo,
+    max_age=config.BOOKING_SYNC_INTERVAL,
+    default_duration=config.BOOKING_DEFAULT_DURATION,
+)
+
+metrics.gauge(
+    "bookings_indexed", "Bookings held in the local calendar index"
+).set_function(lambda: len(booking_calendar.index))
@@ -3,14 +3,38 @@ Grillo Telegram Bot - Main bot file with command handlers.
 
 This bot allows interaction with the WEEE-Open/grillo API via Telegram.
 """
+import asyncio
+import functools
+import html
+import io
 import logging
-from datetime import datetime
-from telegram import Update
-from telegram.ext import Application, CommandHandler, MessageHandler, ContextTypes, filters
+import time
+
+# Taken before the third-party imports below, to measure startup time
+STARTED_AT = time.perf_counter()
+
+from telegram import InlineKeyboardMarkup, InlineQueryResultArticle, InputTextMessageContent, Update
+from telegram.constants import ChatType, ParseMode
+from telegram.ext import (
+    Application, CallbackQueryHandler, CommandHandler, InlineQueryHandler, MessageHandler, ContextTypes, filters
+)
+from telegram.request import BaseRequest
 
 from config import config
-from grillo_client import GrilloClient, get_user_client_by_telegram
+import metrics
+import grillo_client
+from bookings import booking_calendar, format_booking_time, parse_booking, tonight as tonight_range
+from callbacks import callbacks, keyboard_rows
+from grillo_client import AsyncGrilloClient, async_admin_grillo, get_user_client_by_telegram
+from lab_time import lab_time, reconcile_job
+from live_status import live_status
+from outbox import outbox
+from reminders import reminders
+from state_store import StatePersistence, state_store
+from update_processor import PerUserUpdateProcessor
+from user_directory import user_directory
 from user_mapper import user_mapper
+from utils import format_duration, format_location_status, user_display_name
 
 # Enable logging
 logging.basicConfig(
@@ -19,19 +43,83 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+STARTUP_IMPORT_SECONDS = metrics.gauge(
+    "bot_startup_import_seconds", "Time spent importing the bot modules at startup"
+)
+STARTUP_FIRST_UPDATE_SECONDS = metrics.gauge(
+    "bot_startup_first_update_seconds", "Time from startup until the first command was handled"
+)
+if not STARTUP_IMPORT_SECONDS.value():  # not on in-process reloads (dev.py)
+    STARTUP_IMPORT_SECONDS.set(time.perf_counter() - STARTED_AT)
+
+HANDLER_SECONDS = metrics.histogram(
+    "bot_handler_duration_seconds", "Time spent handling a command, by command", ["command"]
+)
+HANDLERS_IN_FLIGHT = metrics.gauge(
+    "bot_handlers_in_flight", "Commands currently being handled"
+)
+
+
+def timed(handler):
+    """Wrap a handler so that its duration is recorded under its own name."""
+    @functools.wraps(handler)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        HANDLERS_IN_FLIGHT.inc()
+        try:
+            with HANDLER_SECONDS.time(command=handler.__name__):
+                return await handler(update, context)
+        finally:
+            HANDLERS_IN_FLIGHT.dec()
+            _record_first_update()
+    return wrapper
+
+
+def _record_first_update():
+    """Record how long after startup the first command was handled, once."""
+    if STARTUP_FIRST_UPDATE_SECONDS.value() == 0:
+        elapsed = time.perf_counter() - STARTED_AT
+        STARTUP_FIRST_UPDATE_SECONDS.set(elapsed)
+        logger.info(f"First command handled {elapsed:.3f}s after startup")
+
+
+async def reply_text(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str, **kwargs):
+    """
+    Answer in the chat of update through the rate-limited outbox.
+
+    In groups the answer quotes the command, unless merged with other answers.
+    """
+    private = update.effective_chat.type == ChatType.PRIVATE
+    return await outbox.send(
+        context.bot, update.effective_chat.id, text,
+        reply_to_message_id=None if private else update.effective_message.message_id, **kwargs
+    )
+
+
+async def reply_html(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str, **kwargs):
+    """Like reply_text, for HTML formatted text."""
+    return await reply_text(update, context, text, parse_mode=ParseMode.HTML, **kwargs)
+
 
 handlers = []
 
 async def help(update: Update, context: ContextTypes.DEFAULT_TYPE, pre: str = "") -> None:
     """Send a message when the command /help is issued."""
 
-    await update.effective_message.reply_html(
+    await reply_html(update, context,
         pre +
         "<b>Available commands:</b>\n"
         "/help - Show this help message\n"
-        "/status - Check current lab status\n"
+        "/status - Check current lab status (/status all for every lab)\n"
+        "/livestatus - Pin a lab status that updates itself\n"
         "/clockin - Clock in to the lab\n"
         "/clockout - Clock out from the lab\n"
+        "/hours - Show your lab hours\n"
+        "/leaderboard - Who spent the most time in the lab\n"
+        "/bookings - Lab bookings of the next 7 days\n"
+        "/book - Book the lab: /book [today|tomorrow|YYYY-MM-DD] HH:MM [HH:MM] [@location]\n"
+        "/unbook - Cancel a booking: /unbook <id>\n"
+        "/tonight - Who is coming to the lab tonight\n"
+        f"\nType @{context.bot.username} in any chat to share who is in the lab.\n"
     )
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -41,10 +129,10 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 
     # Check if user is mapped
     is_mapped = user_mapper.is_user_mapped(telegram_id)
-    print(is_mapped)
+    logger.debug(f"Telegram user {telegram_id} mapped: {is_mapped}")
     mapping_status = ""
     if not is_mapped:
-        res = user_mapper.map_user(telegram_id)
+        res = await user_mapper.map_user(telegram_id)
         if res:
             mapping_status = "\n\n<b>Successfully linked your account to {ldap_user}!</b>"
         else:
@@ -55,90 +143,484 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     await help(update, context, f"🦗 <b>Welcome to Grillo Bot, {user.mention_html()}!</b>\n{mapping_status}\n\n")
 
 async def status(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None: # TODO check, function is as from Copilot
-    """Check the status of the default lab location."""
+    """
+    Check the status of the default lab location.
+
+    /status <location> checks another location, /status all every location.
+    """
     try:
-        grillo = get_user_client_by_telegram(update.effective_user.id)
+        grillo = await get_user_client_by_telegram(update.effective_user.id)
         location_id = " ".join(context.args) if context.args else "default"
-        location = grillo.get_location(location_id)
+        if location_id == "all":
+            await reply_html(update, context, await all_locations_status(grillo))
+            return
+        location = await grillo.get_location(location_id)
 
-        response = f"📊 <b>Status for {location['name']}</b>\n\n"
+        response = format_location_status(location)
 
-        # People in the lab
-        people = location.get("people", [])
-        if people:
-            response += "👥 <b>People in lab:</b>\n"
-            for person in people:
-                response += f"  • {person.get('name', 'Unknown')}\n"
+        await reply_html(update, context, response)
+    except Exception as e:
+        logger.error(f"Error fetching status: {e}")
+        await reply_text(update, context, f"❌ Error fetching status: {str(e)}")
+
+async def all_locations_status(grillo: AsyncGrilloClient) -> str:
+    """Status of every location in one message, fetching the locations concurrently."""
+    locations = await grillo.get_locations()
+    if not locations:
+        return "No locations found."
+    details = await asyncio.gather(
+        *(grillo.get_location(location["id"]) for location in locations),
+        return_exceptions=True,
+    )
+    sections = []
+    for location, detail in zip(locations, details):
+        if isinstance(detail, BaseException):
+            logger.error(f"Error fetching status of location {location['id']}: {detail}")
+            name = html.escape(str(location.get("name", location["id"])))
+            sections.append(f"📊 <b>Status for {name}</b>\n\n❌ Not available right now.\n")
         else:
-            response += "👥 No one is currently in the lab.\n"
+            sections.append(format_location_status(detail))
+    return "\n".join(sections)
 
-        # Upcoming bookings
-        bookings = location.get("bookings", [])
-        if bookings:
-            response += "\n📅 <b>Upcoming bookings:</b>\n"
-            for booking in bookings[:5]:  # Show max 5
-                start = datetime.fromtimestamp(booking['startTime'])
-                response += f"  • {start.strftime('%a %H:%M')} - {booking.get('userName', 'Unknown')}\n"
+async def inline_status(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Answer inline queries (@bot [location]) with who is in each matching location.
 
-        await update.effective_message.reply_html(response)
+    Locations come from the same caches as /status, so typing a query does not
+    cost one Grillo round per keystroke.
+    """
+    query = update.inline_query
+    try:
+        grillo = await get_user_client_by_telegram(update.effective_user.id)
+        wanted = query.query.strip().lower()
+        locations = [
+            location for location in await grillo.get_locations()
+            if wanted in str(location["id"]).lower() or wanted in str(location.get("name") or "").lower()
+        ]
+        details = await asyncio.gather(
+            *(grillo.get_location(location["id"]) for location in locations),
+            return_exceptions=True,
+        )
+        results = []
+        for location, detail in zip(locations, details):
+            if isinstance(detail, BaseException):
+                logger.error(f"Error fetching status of location {location['id']}: {detail}")
+                continue
+            people = len(detail.get("people", []))
+            results.append(InlineQueryResultArticle(
+                id=str(location["id"]),
+                title=f"Who's in {detail.get('name', location['id'])}",
+                description=f"{people} {'person' if people == 1 else 'people'} in the lab",
+                input_message_content=InputTextMessageContent(
+                    format_location_status(detail), parse_mode=ParseMode.HTML
+                ),
+            ))
+        await query.answer(results, cache_time=int(config.LOCATION_CACHE_TTL))
     except Exception as e:
-        logger.error(f"Error fetching status: {e}")
-        await update.effective_message.reply_text(f"❌ Error fetching status: {str(e)}")
+        logger.error(f"Error answering inline query: {e}")
+        await query.answer([], cache_time=0)
+
+async def livestatus(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Pin a status message in this chat that is kept up to date.
+
+    /livestatus [location] starts it, /livestatus off stops it.
+    """
+    chat_id = update.effective_chat.id
+    if context.args and context.args[0] == "off":
+        message_id = live_status.unsubscribe(chat_id)
+        if message_id is None:
+            await reply_text(update, context, "There is no live status in this chat.")
+            return
+        try:
+            await context.bot.unpin_chat_message(chat_id, message_id)
+        except Exception:
+            pass  # not pinned, or no rights to unpin
+        await reply_text(update, context, "✅ Live status stopped.")
+        return
+
+    try:
+        location_id = " ".join(context.args) if context.args else "default"
+        location = await async_admin_grillo.get_location(location_id)
+        content = format_location_status(location)
+        message = await reply_html(update, context, live_status.render(content), coalesce=False)
+
+        previous = live_status.unsubscribe(chat_id)
+        if previous is not None:
+            try:
+                await context.bot.unpin_chat_message(chat_id, previous)
+            except Exception:
+                pass
+        live_status.subscribe(chat_id, message.message_id, location_id, content)
+        try:
+            await message.pin(disable_notification=True)
+        except Exception:
+            pass  # the bot may not be allowed to pin here, the message is updated anyway
+    except Exception as e:
+        logger.error(f"Error starting live status: {e}")
+        await reply_text(update, context, f"❌ Error starting live status: {str(e)}")
+
+async def for_each_user(uids: list, action) -> str:
+    """
+    Run action(client) for the users with the given uids, concurrently.
+
+    Users are resolved in bulk through the directory, and at most
+    BATCH_CONCURRENCY calls to Grillo run at the same time, so the total time
+    is bounded by the slowest call rather than the sum of all of them.
+
+    Args:
+        uids: LDAP uids of the users to act on
+        action: Coroutine function taking an AsyncGrilloClient and returning a result line
+
+    Returns:
+        One result line per user
+    """
+    users = await user_directory.get_by_uids(uids)
+    semaphore = asyncio.Semaphore(config.BATCH_CONCURRENCY)
+
+    async def run(uid: str) -> str:
+        if not users.get(uid):
+            return f"❌ {uid}: user not found"
+        async with semaphore:
+            try:
+                return f"✅ {uid}: {await action(AsyncGrilloClient(user=users[uid], api_token=config.GRILLO_API_TOKEN))}"
+            except Exception as e:
+                return f"❌ {uid}: {e}"
+
+    # dict.fromkeys drops duplicated uids while keeping their order
+    return "\n".join(await asyncio.gather(*(run(uid) for uid in dict.fromkeys(uids))))
+
+
+async def clockin_user(grillo: AsyncGrilloClient, location: str = None) -> str:
+    """Clock a user in and record the open session; returns the location name."""
+    result = await grillo.clockin(location)
+    if 'error' in result:
+        raise ValueError(result['error'])
+    lab_time.record_clockin(grillo.user["id"], result.get("startTime"))
+    reminders.track(grillo.user["id"], result.get("startTime") or int(time.time()))
+    return result.get("location", "the lab")
+
+
+async def clockout_user(grillo: AsyncGrilloClient, summary: str) -> int:
+    """Clock a user out and record the session; returns its duration in seconds."""
+    res = await grillo.clockout(summary)
+    endTime = int(res.get("endTime", 0))
+    startTime = int(res.get("startTime", 0))
+    lab_time.record_session(grillo.user["id"], startTime, endTime)
+    reminders.forget(grillo.user["id"])
+    return endTime - startTime
+
 
 async def clockin(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Clock in to the lab."""
+    """
+    Clock in to the lab.
+
+    Admins can clock in other users: /clockin uid1 uid2 ... [@location]
+    """
     try:
-        grillo = get_user_client_by_telegram(update.effective_user.id)
-        if context.args:
-            admin = grillo.is_admin()
-            if admin:
-                grillo = GrilloClient(user_id=context.args[0], api_token=config.GRILLO_API_TOKEN)
-                location = context.args[1] if len(context.args) > 1 else None
-            else:
-                location=  context.args[0]
-        else:
-            location = None
+        grillo = await get_user_client_by_telegram(update.effective_user.id)
+        uids = [arg for arg in context.args if not arg.startswith("@")]
+        locations = [arg[1:] for arg in context.args if arg.startswith("@")]
+        location = locations[0] if locations else None
+
+        if uids and grillo.is_admin():
+            async def action(client: AsyncGrilloClient) -> str:
+                return f"clocked in to {await clockin_user(client, location)}"
+
+            results = await for_each_user(uids, action)
+            await reply_text(update, context, f"Clock-in results:\n{results}")
+            return
+        if uids:
+            location = uids[0]
+        if not grillo.user:
+            await reply_text(update, context, "❌ Your Telegram account is not linked to a Grillo user.")
+            return
+
+        if location is None:
+            try:
+                locations = await grillo.get_locations()
+            except Exception as e:
+                # Clocking in matters more than picking: fall back to the default location
+                logger.error(f"Error fetching locations for /clockin: {e}")
+                locations = []
+            if len(locations) > 1:
+                # Let the user pick: the keyboard remembers the locations shown
+                keyboard_id = callbacks.register(update.effective_user.id, {
+                    "locations": [(loc["id"], loc.get("name", loc["id"])) for loc in locations],
+                })
+                buttons = [
+                    callbacks.button(loc.get("name", loc["id"]), "clockin", keyboard_id, index)
+                    for index, loc in enumerate(locations)
+                ]
+                await reply_text(update, context, "📍 Where are you clocking in?",
+                                 reply_markup=InlineKeyboardMarkup(keyboard_rows(buttons)))
+                return
+
+        loc_name = await clockin_user(grillo, location)
+        await reply_text(update, context, f"✅ Clocked in to {loc_name}!")
+    except Exception as e:
+        logger.error(f"Error clocking in: {e}")
+        await reply_text(update, context, f"❌ Error clocking in: {str(e)}")
+
+
+async def answer_unusable_button(update: Update, result: str) -> None:
+    """Answer a tap on a keyboard that is stale (used, expired) or meant for somebody else."""
+    query = update.callback_query
+    if result == "foreign":
+        await query.answer("This button is not for you.")
+        return
+    await query.answer("This button has expired, please send the command again.", show_alert=True)
+    try:
+        await query.edit_message_reply_markup(reply_markup=None)
+    except Exception:
+        pass  # already without keyboard, or too old to edit
+
 
-        result = grillo.clockin(location)
+async def unknown_button(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handle taps on buttons no handler recognises, e.g. of keyboards sent by older versions."""
+    await answer_unusable_button(update, "stale")
 
-        loc_name = result.get("location", "the lab")
-        await update.effective_message.reply_text(f"✅ Clocked in to {loc_name}!")
+
+async def clockin_button(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Clock in to the location picked on the /clockin keyboard."""
+    query = update.callback_query
+    result, data, choice = callbacks.claim(query.data, update.effective_user.id)
+    if result != "ok":
+        await answer_unusable_button(update, result)
+        return
+    await query.answer()
+    try:
+        location_id, name = data["locations"][int(choice)]
+        grillo = await get_user_client_by_telegram(update.effective_user.id)
+        await clockin_user(grillo, location_id)
+        await query.edit_message_text(f"✅ Clocked in to {name}!")
     except Exception as e:
         logger.error(f"Error clocking in: {e}")
-        await update.effective_message.reply_text(f"❌ Error clocking in: {str(e)}")
+        await query.edit_message_text(f"❌ Error clocking in: {str(e)}")
+
+
+# Separates the uids from the summary in a batch /clockout (phones often turn "--" into "—")
+SUMMARY_SEPARATORS = ("--", "—")
 
 
 async def clockout(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Clock out from the lab."""
+    """
+    Clock out from the lab.
+
+    Admins can clock out other users: /clockout uid1 uid2 ... -- summary
+    """
     if not context.args:
-        await update.effective_message.reply_text(
+        await reply_text(update, context,
             "❌ Please provide a summary of your work.\n"
             "Usage: /clockout <summary>"
         )
         return
 
     try:
-        grillo = get_user_client_by_telegram(update.effective_user.id)
+        grillo = await get_user_client_by_telegram(update.effective_user.id)
+        separator = next((i for i, arg in enumerate(context.args) if arg in SUMMARY_SEPARATORS), None)
+        if separator is not None and grillo.is_admin():
+            uids = context.args[:separator]
+            summary = " ".join(context.args[separator + 1:])
+            if not uids or not summary:
+                await reply_text(update, context, "Usage: /clockout uid1 uid2 ... -- <summary>")
+                return
+            async def action(client: AsyncGrilloClient) -> str:
+                return f"spent {format_duration(await clockout_user(client, summary))} in the lab"
+
+            results = await for_each_user(uids, action)
+            await reply_text(update, context, f"Clock-out results:\n{results}")
+            return
+
+        if not grillo.user:
+            await reply_text(update, context, "❌ Your Telegram account is not linked to a Grillo user.")
+            return
+
+        # Ask for confirmation; the keyboard remembers the summary
         summary = " ".join(context.args)
-        res = grillo.clockout(summary)
-        endTime = int(res.get("endTime", 0))
-        startTime = int(res.get("startTime", 0))
-        duration = endTime - startTime
-        hours = duration // 3600
-        minutes = (duration % 3600) // 60
-        time_str = "Spent "
-        if hours > 0:
-            time_str += f"{hours}h "
-        time_str += f"{minutes}m in the lab."
-
-        await update.effective_message.reply_text(f"✅ Clocked out successfully!\n{time_str}")
+        start = lab_time.open_session(grillo.user["id"])
+        keyboard_id = callbacks.register(update.effective_user.id, {"summary": summary})
+        session = f" after {format_duration(int(time.time()) - start)}" if start else ""
+        await reply_html(update, context,
+            f"Clock out{session} with this summary?\n\n<i>{html.escape(summary)}</i>",
+            reply_markup=InlineKeyboardMarkup([[
+                callbacks.button("✅ Clock out", "clockout", keyboard_id, "yes"),
+                callbacks.button("✖️ Cancel", "clockout", keyboard_id, "no"),
+            ]]),
+        )
     except Exception as e:
         logger.error(f"Error clocking out: {e}")
-        await update.effective_message.reply_text(f"❌ Error clocking out: {str(e)}")
+        await reply_text(update, context, f"❌ Error clocking out: {str(e)}")
+
+
+async def clockout_button(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Confirm or cancel the clock-out asked with /clockout."""
+    query = update.callback_query
+    result, data, choice = callbacks.claim(query.data, update.effective_user.id)
+    if result != "ok":
+        await answer_unusable_button(update, result)
+        return
+    await query.answer()
+    if choice != "yes":
+        await query.edit_message_text("Clock-out cancelled, you are still clocked in.")
+        return
+    try:
+        grillo = await get_user_client_by_telegram(update.effective_user.id)
+        duration = await clockout_user(grillo, data["summary"])
+        await query.edit_message_text(
+            f"✅ Clocked out successfully!\nSpent {format_duration(duration)} in the lab."
+        )
+    except Exception as e:
+        logger.error(f"Error clocking out: {e}")
+        await query.edit_message_text(f"❌ Error clocking out: {str(e)}")
+
+async def hours(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Show lab hours for today, this week and this month.
+
+    Admins can pass a uid to see someone else's hours.
+    """
+    try:
+        grillo = await get_user_client_by_telegram(update.effective_user.id)
+        target = context.args[0] if context.args else None
+        if target and not grillo.is_admin():
+            await reply_text(update, context, "❌ Only admins can see other users' hours.")
+            return
+
+        if target:
+            user = await user_directory.get_by_uid(target)
+            if not user:
+                raise ValueError(f"User with UID '{target}' not found.")
+        elif grillo.user:
+            user = grillo.user
+        else:
+            await reply_text(update, context, "❌ Your Telegram account is not linked to a Grillo user.")
+            return
+
+        await reply_html(update, context,
+            f"⏱ <b>Lab hours of {html.escape(user_display_name(user))}</b>\n\n"
+            f"  • Today: {format_duration(lab_time.total(user['id'], 'day'))}\n"
+            f"  • This week: {format_duration(lab_time.total(user['id'], 'week'))}\n"
+            f"  • This month: {format_duration(lab_time.total(user['id'], 'month'))}\n"
+        )
+    except Exception as e:
+        logger.error(f"Error fetching hours: {e}")
+        await reply_text(update, context, f"❌ Error fetching hours: {str(e)}")
+
+async def leaderboard(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Rank members by lab time this week (or day/month)."""
+    period = context.args[0] if context.args else "week"
+    if period not in ("day", "week", "month"):
+        await reply_text(update, context, "Usage: /leaderboard [day|week|month]")
+        return
+
+    response = f"🏆 <b>Lab leaderboard ({period})</b>\n\n"
+    ranking = lab_time.top(period, limit=10)
+    for position, (user_id, seconds) in enumerate(ranking, start=1):
+        name = user_display_name(user_directory.get_by_id(user_id), fallback=str(user_id))
+        response += f"{position}. {html.escape(name)}: {format_duration(seconds)}\n"
+    if not ranking:
+        response += "Nobody has been in the lab yet.\n"
+    await reply_html(update, context, response)
+
+def format_bookings(title: str, found: list) -> str:
+    """Render bookings as an HTML list, one line per booking."""
+    response = f"📅 <b>{title}</b>\n\n"
+    for booking in found:
+        name = booking.get("userName") or user_display_name(user_directory.get_by_id(booking.get("user")))
+        where = f" @{booking['location']}" if booking.get("location") else ""
+        when = format_booking_time(booking)
+        response += f"  • {when}{html.escape(where)} - {html.escape(name)} (#{booking['id']})\n"
+    if not found:
+        response += "No bookings.\n"
+    return response
+
+async def bookings(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Show the bookings of the next 7 days, optionally of one location: /bookings [location]."""
+    try:
+        now = int(time.time())
+        location = context.args[0] if context.args else None
+        found = await booking_calendar.between(now, now + 7 * 86400, location)
+        await reply_html(update, context, format_bookings("Bookings of the next 7 days", found))
+    except Exception as e:
+        logger.error(f"Error fetching bookings: {e}")
+        await reply_text(update, context, f"❌ Error fetching bookings: {str(e)}")
+
+async def book(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Book the lab: /book [today|tomorrow|YYYY-MM-DD] HH:MM [HH:MM] [@location]."""
+    try:
+        grillo = await get_user_client_by_telegram(update.effective_user.id)
+        if not grillo.user:
+            await reply_text(update, context, "❌ Your Telegram account is not linked to a Grillo user.")
+            return
+        locations = [arg[1:] for arg in context.args if arg.startswith("@")]
+        start, end = parse_booking([arg for arg in context.args if not arg.startswith("@")])
+        booking = await booking_calendar.book(grillo, start, end, locations[0] if locations else None)
+        when = format_booking_time({"startTime": start, "endTime": end, **booking})
+        await reply_text(update, context, f"✅ Booked for {when}!")
+    except Exception as e:
+        logger.error(f"Error booking: {e}")
+        await reply_text(update, context, f"❌ Error booking: {str(e)}")
+
+async def unbook(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Cancel a booking: /unbook <id>. Admins can cancel anybody's bookings."""
+    if not context.args:
+        await reply_text(update, context, "Usage: /unbook <id>")
+        return
+    try:
+        grillo = await get_user_client_by_telegram(update.effective_user.id)
+        if await booking_calendar.unbook(grillo, context.args[0].lstrip("#")):
+            await reply_text(update, context, "✅ Booking cancelled.")
+        else:
+            await reply_text(update, context, "❌ Booking not found, or not yours.")
+    except Exception as e:
+        logger.error(f"Error cancelling booking: {e}")
+        await reply_text(update, context, f"❌ Error cancelling booking: {str(e)}")
+
+async def tonight(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Show who booked the lab for tonight."""
+    try:
+        start, end = tonight_range()
+        found = await booking_calendar.between(start, end)
+        await reply_html(update, context, format_bookings("Coming tonight", found))
+    except Exception as e:
+        logger.error(f"Error fetching bookings: {e}")
+        await reply_text(update, context, f"❌ Error fetching bookings: {str(e)}")
+
+async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Show a summary of the internal metrics, or all of them as a file with "full" (admins only)."""
+    grillo = await get_user_client_by_telegram(update.effective_user.id)
+    if not grillo.is_admin():
+        await reply_text(update, context, "❌ This command is reserved to admins.")
+        return
+
+    if context.args and context.args[0] == "full":
+        # The Prometheus text is far longer than a message can be
+        await update.effective_message.reply_document(
+            io.BytesIO(metrics.render().encode()), filename="metrics.txt"
+        )
+        return
+
+    usage = user_mapper.memory_usage()
+    breaker = grillo_client.breaker
+    await reply_html(update, context,
+        "<b>User client cache:</b> "
+        f"{usage['entries']} entries, ~{usage['bytes'] // 1024} KiB "
+        f"(~{usage['bytes_per_entry']} bytes/entry)\n"
+        f"<b>Caches:</b> {len(grillo_client.location_cache)} locations, "
+        f"{len(grillo_client.audit_cache)} audit weeks, {len(booking_calendar.index)} bookings, "
+        f"{len(user_directory)} directory users\n"
+        f"<b>In flight:</b> {int(HANDLERS_IN_FLIGHT.value())} updates, "
+        f"{int(grillo_client.REQUESTS_IN_FLIGHT.value())} Grillo requests\n"
+        f"<b>Grillo circuit:</b> {'🔴 open' if breaker.is_open else '🟢 closed'} "
+        f"({breaker.failures} consecutive failures)\n"
+        f"<b>Reminders:</b> {len(reminders.tracked)} sessions followed\n\n"
+        "Send /stats full for all the metrics."
+    )
 
 async def unknown_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle unknown commands."""
-    await update.effective_message.reply_text(
+    await reply_text(update, context,
         "❌ Command not recognized.\n\n"
         "Use /help to see available commands."
     )
@@ -149,25 +631,40 @@ def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     logger.error(f"Update {update} caused error {context.error}")
 
 
-def main() -> None:
-    """Start the bot."""
-    # Validate configuration
-    try:
-        config.validate()
-    except ValueError as e:
-        logger.error(f"Configuration error: {e}")
-        return
+async def post_init(application: Application) -> None:
+    """Start auxiliary services once the bot is initialized."""
+    if config.METRICS_PORT:
+        application.bot_data["metrics_server"] = await metrics.start_server(
+            config.METRICS_HOST, config.METRICS_PORT
+        )
+
 
-    # Create the Application
-    application = Application.builder().token(config.TELEGRAM_BOT_TOKEN).build()
+async def post_shutdown(application: Application) -> None:
+    """Release shared resources once the bot has stopped."""
+    metrics_server = application.bot_data.pop("metrics_server", None)
+    if metrics_server:
+        metrics_server.close()
+        await metrics_server.wait_closed()
+    await grillo_client.aclose()
 
+
+def register_handlers(application: Application) -> None:
+    """Add the command and error handlers of this module to application."""
     # Register command handlers
     handlers = [
         start,
         help,
         status,
+        livestatus,
         clockin,
         clockout,
+        hours,
+        leaderboard,
+        bookings,
+        book,
+        unbook,
+        tonight,
+        stats,
     ]
     aliases = {
         "info": help,
@@ -179,7 +676,7 @@ def main() -> None:
         application.add_handler(
             CommandHandler(
                 handler.__name__,
-                handler,
+                timed(handler),
                 filters=filters.UpdateType.MESSAGE | filters.UpdateType.EDITED_MESSAGE
             )
         )
@@ -187,11 +684,17 @@ def main() -> None:
         application.add_handler(
             CommandHandler(
                 handler,
-                aliases[handler],
+                timed(aliases[handler]),
                 filters=filters.UpdateType.MESSAGE | filters.UpdateType.EDITED_MESSAGE
             )
         )
 
+    # Inline keyboards and inline mode
+    application.add_handler(CallbackQueryHandler(timed(clockin_button), pattern=r"^clockin:"))
+    application.add_handler(CallbackQueryHandler(timed(clockout_button), pattern=r"^clockout:"))
+    application.add_handler(CallbackQueryHandler(unknown_button))
+    application.add_handler(InlineQueryHandler(timed(inline_status)))
+
     # must be last
     application.add_handler(
         MessageHandler(
@@ -203,9 +706,96 @@ def main() -> None:
     # Register error handler
     application.add_error_handler(error_handler)
 
+
+def build_application(request: BaseRequest = None, jobs: bool = True) -> Application:
+    """
+    Create the Application with every handler and background job registered.
+
+    Args:
+        request: Transport for the Bot API calls, replacing the default one
+            (used by the benchmarks to run without network access)
+        jobs: Schedule the jobs that must run once per deployment (lab time
+            reconciliation, live status polling, reminders); with several workers only one does
+    """
+    builder = (
+        Application.builder()
+        .token(config.TELEGRAM_BOT_TOKEN)
+        .concurrent_updates(PerUserUpdateProcessor(config.UPDATE_CONCURRENCY))
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+    )
+    if state_store is not None:
+        # Keep user_data, chat_data and conversation states across restarts
+        builder = builder.persistence(StatePersistence(state_store))
+    if request is not None:
+        builder = builder.request(request).get_updates_request(request)
+    application = builder.build()
+    register_handlers(application)
+
+    # Load the user directory in the background, without delaying startup
+    application.job_queue.run_repeating(
+        user_directory.refresh_job,
+        interval=config.DIRECTORY_REFRESH_INTERVAL,
+        first=0,
+        name="user_directory_refresh",
+    )
+    # Every process answers bookings from its own index, so every one keeps it fresh
+    application.job_queue.run_repeating(
+        booking_calendar.sync_job,
+        interval=config.BOOKING_SYNC_INTERVAL,
+        first=5,
+        name="bookings_sync",
+    )
+    if not jobs:
+        return application
+    application.job_queue.run_repeating(
+        reconcile_job,
+        interval=config.LAB_TIME_RECONCILE_INTERVAL,
+        first=10,
+        name="lab_time_reconcile",
+    )
+    application.job_queue.run_repeating(
+        live_status.poll_job,
+        interval=config.LIVE_STATUS_INTERVAL,
+        name="live_status_poll",
+    )
+    if config.REMINDER_USER_HOURS:
+        application.job_queue.run_repeating(
+            reminders.job,
+            interval=config.REMINDER_TICK,
+            first=config.REMINDER_TICK,
+            name="reminders",
+        )
+
+    return application
+
+
+def main() -> None:
+    """Start the bot."""
+    # Validate configuration
+    try:
+        config.validate()
+    except ValueError as e:
+        logger.error(f"Configuration error: {e}")
+        return
+
+    logger.info(f"Modules imported in {STARTUP_IMPORT_SECONDS.value():.3f}s")
+    application = build_application()
+
     # Start the bot
-    logger.info("Starting Grillo Telegram Bot...")
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    if config.BOT_MODE == "webhook":
+        logger.info(f"Starting Grillo Telegram Bot (webhook on {config.WEBHOOK_LISTEN}:{config.WEBHOOK_PORT})...")
+        application.run_webhook(
+            listen=config.WEBHOOK_LISTEN,
+            port=config.WEBHOOK_PORT,
+            url_path=config.WEBHOOK_PATH,
+            secret_token=config.WEBHOOK_SECRET,
+            webhook_url=f"{config.WEBHOOK_URL.rstrip('/')}/{config.WEBHOOK_PATH}",
+            allowed_updates=Update.ALL_TYPES,
+        )
+    else:
+        logger.info("Starting Grillo Telegram Bot...")
+        application.run_polling(allowed_updates=Update.ALL_TYPES)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,222 @@
+"""In-memory caches shared by the Grillo clients and the bot."""
+import asyncio
+import sys
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, Hashable, Optional
+
+import metrics
+
+if TYPE_CHECKING:
+    from state_store import StateStore
+
+CACHE_REQUESTS = metrics.counter(
+    "cache_requests_total",
+    "Cache lookups by cache name and outcome (hit, miss, coalesced)",
+    ["cache", "result"],
+)
+CACHE_EVICTIONS = metrics.counter(
+    "cache_evictions_total",
+    "Entries dropped from a cache by reason (expired, size, invalidated)",
+    ["cache", "reason"],
+)
+CACHE_RESTORED = metrics.counter(
+    "cache_restored_total",
+    "Entries read back from the state store, e.g. after a restart",
+    ["cache"],
+)
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Bounded LRU cache whose entries expire after a time-to-live.
+
+    get_or_load() coalesces concurrent loads of the same key, so a burst of
+    identical requests costs a single upstream call.
+
+    With a store, entries are written through to it and a key missing from
+    memory is looked up there before counting as a miss, so the cache warms
+    up lazily after a restart instead of being reloaded all at once.
+    """
+
+    def __init__(self, name: str, ttl: Optional[float] = None, maxsize: Optional[int] = None,
+                 sliding: bool = False, store: Optional["StateStore"] = None):
+        """
+        Initialize the cache.
+
+        Args:
+            name: Cache name, used as the metrics label
+            ttl: Seconds an entry stays valid (None: never expires, 0: disabled)
+            maxsize: Maximum number of entries before the least recently used is dropped
+            sliding: Restart the TTL on every access, turning it into an idle timeout
+            store: StateStore persisting the entries under the cache name; values
+                must be picklable. Stored entries keep the expiry of their last set().
+        """
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.sliding = sliding
+        self.store = store
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self._lookup(key) is not _MISSING
+
+    def _lookup(self, key: Hashable) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            entry = self._restore(key)
+            if entry is None:
+                return _MISSING
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            CACHE_EVICTIONS.inc(cache=self.name, reason="expired")
+            return _MISSING
+        if self.sliding and expires_at is not None:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        return value
+
+    def _restore(self, key: Hashable) -> Optional[tuple]:
+        """Load key from the store into memory, returning its (expires_at, value) entry."""
+        if self.store is None or self.ttl == 0:
+            return None
+        stored = self.store.get(self.name, key)
+        if stored is None:
+            return None
+        value, expires_at = stored
+        if expires_at is not None:
+            # Stored as wall-clock time, kept in memory as monotonic time
+            expires_at = time.monotonic() + (expires_at - time.time())
+        self._put(key, (expires_at, value))
+        CACHE_RESTORED.inc(cache=self.name)
+        return expires_at, value
+
+    def _put(self, key: Hashable, entry: tuple) -> None:
+        self._data[key] = entry
+        self._data.move_to_end(key)
+        if self.maxsize is not None:
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                CACHE_EVICTIONS.inc(cache=self.name, reason="size")
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value for key, or default if missing or expired."""
+        value = self._lookup(key)
+        CACHE_REQUESTS.inc(cache=self.name, result="miss" if value is _MISSING else "hit")
+        return default if value is _MISSING else value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Store value under key, evicting the least recently used entries if full."""
+        if self.ttl == 0:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        self._put(key, (expires_at, value))
+        if self.store is not None:
+            self.store.set(self.name, key, value, time.time() + self.ttl if self.ttl else None)
+
+    def pop(self, key: Hashable) -> None:
+        """Invalidate key, including a load that is still in flight."""
+        if self._data.pop(key, _MISSING) is not _MISSING:
+            CACHE_EVICTIONS.inc(cache=self.name, reason="invalidated")
+        if self.store is not None:
+            self.store.delete(self.name, key)
+        # A pending load may carry pre-invalidation data: detach it so that
+        # its result is not stored and new callers start a fresh load.
+        self._inflight.pop(key, None)
+
+    def clear(self) -> None:
+        """Drop every entry."""
+        self._data.clear()
+        self._inflight.clear()
+        if self.store is not None:
+            self.store.clear(self.name)
+
+    def expire(self) -> int:
+        """
+        Drop every expired entry now instead of on the next access.
+
+        Returns:
+            Number of entries dropped
+        """
+        now = time.monotonic()
+        expired = [k for k, (expires_at, _) in self._data.items() if expires_at is not None and expires_at <= now]
+        for key in expired:
+            del self._data[key]
+        if expired:
+            CACHE_EVICTIONS.inc(len(expired), cache=self.name, reason="expired")
+        return len(expired)
+
+    def approx_bytes(self) -> int:
+        """Approximate memory held by the cached keys and values, in bytes."""
+        return sys.getsizeof(self._data) + sum(
+            approx_sizeof(key) + approx_sizeof(value) for key, (_, value) in list(self._data.items())
+        )
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]],
+                          cacheable: Optional[Callable[[Any], bool]] = None) -> Any:
+        """
+        Return the cached value for key, loading it with loader() on a miss.
+
+        Concurrent callers asking for the same missing key share one loader
+        call. Exceptions raised by the loader are propagated and not cached.
+
+        Args:
+            key: Cache key
+            loader: Coroutine function returning the value
+            cacheable: Predicate on the loaded value; if false it is returned
+                but not cached, and the next call loads it again
+        """
+        value = self._lookup(key)
+        if value is not _MISSING:
+            CACHE_REQUESTS.inc(cache=self.name, result="hit")
+            return value
+
+        future = self._inflight.get(key)
+        if future is not None:
+            CACHE_REQUESTS.inc(cache=self.name, result="coalesced")
+            return await asyncio.shield(future)
+
+        CACHE_REQUESTS.inc(cache=self.name, result="miss")
+        future = asyncio.ensure_future(loader())
+        self._inflight[key] = future
+
+        def _done(fut: asyncio.Future) -> None:
+            if self._inflight.get(key) is not fut:
+                return  # invalidated while loading
+            del self._inflight[key]
+            if not fut.cancelled() and fut.exception() is None:
+                if cacheable is None or cacheable(fut.result()):
+                    self.set(key, fut.result())
+
+        future.add_done_callback(_done)
+        # Shield the load so that a cancelled caller does not cancel it for
+        # everybody else waiting on the same key.
+        return await asyncio.shield(future)
+
+
+def approx_sizeof(obj: Any, _seen: Optional[set] = None) -> int:
+    """
+    Approximate the memory footprint of obj, following containers and
+    instance attributes. Objects reachable more than once are counted once.
+    """
+    if _seen is None:
+        _seen = set()
+    if id(obj) in _seen:
+        return 0
+    _seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(approx_sizeof(k, _seen) + approx_sizeof(v, _seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(approx_sizeof(item, _seen) for item in obj)
+    elif hasattr(obj, "__dict__"):
+        size += approx_sizeof(vars(obj), _seen)
+    return size
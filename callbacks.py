@@ -0,0 +1,95 @@
+"""Inline keyboard buttons whose data is kept server-side under a compact ID."""
+import secrets
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+from telegram import InlineKeyboardButton
+
+import metrics
+from cache import TTLCache
+from config import config
+from state_store import state_store
+
+if TYPE_CHECKING:
+    from state_store import StateStore
+
+CALLBACK_QUERIES = metrics.counter(
+    "callback_queries_total", "Inline keyboard taps by action and outcome (ok, stale, foreign)", ["action", "result"]
+)
+
+
+class CallbackRegistry:
+    """
+    Data of the inline keyboards currently shown, keyed by a compact ID.
+
+    Telegram allows only 64 bytes of callback data per button, so a keyboard
+    stores what it was rendered from (locations, summary, session start...)
+    here and its buttons carry "<action>:<id>:<choice>". Handling a tap reads
+    that data back instead of asking Grillo again.
+
+    Keyboards are single-use and expire after a TTL: a tap on a keyboard
+    already used, expired or evicted finds nothing, and is reported as stale.
+    With a store, keyboards survive a restart and are shared by workers.
+    """
+
+    def __init__(self, ttl: float, maxsize: int, store: Optional["StateStore"] = None):
+        """
+        Initialize the registry.
+
+        Args:
+            ttl: Seconds a keyboard stays usable
+            maxsize: Maximum number of keyboards kept, the oldest ones are dropped first
+            store: StateStore sharing the keyboards across restarts and workers
+        """
+        self._keyboards = TTLCache("callbacks", ttl=ttl, maxsize=maxsize, store=store)
+
+    def register(self, telegram_id: int, data: Dict[str, Any]) -> str:
+        """
+        Keep data for a keyboard shown to telegram_id (only they may use it).
+
+        Returns:
+            Compact ID to put in the callback data of its buttons
+        """
+        keyboard_id = secrets.token_urlsafe(6)
+        self._keyboards.set(keyboard_id, (telegram_id, data))
+        return keyboard_id
+
+    @staticmethod
+    def button(text: str, action: str, keyboard_id: str, choice: Any = "") -> InlineKeyboardButton:
+        """Button of a registered keyboard."""
+        return InlineKeyboardButton(text, callback_data=f"{action}:{keyboard_id}:{choice}")
+
+    @staticmethod
+    def parse(callback_data: str) -> Tuple[str, str, str]:
+        """Split callback data into action, keyboard ID and choice."""
+        action, keyboard_id, choice = (callback_data.split(":", 2) + ["", ""])[:3]
+        return action, keyboard_id, choice
+
+    def claim(self, callback_data: str, telegram_id: int) -> Tuple[str, Optional[Dict[str, Any]], str]:
+        """
+        Resolve a tap of telegram_id, consuming the keyboard if the tap is valid.
+
+        Returns:
+            Outcome ("ok", "stale" or "foreign"), the keyboard data (None
+            unless "ok") and the choice
+        """
+        action, keyboard_id, choice = self.parse(callback_data)
+        entry = self._keyboards.get(keyboard_id)
+        if entry is None:
+            result, data = "stale", None
+        elif entry[0] != telegram_id:
+            # Somebody else's keyboard, e.g. in a group: leave it to its owner
+            result, data = "foreign", None
+        else:
+            self._keyboards.pop(keyboard_id)
+            result, data = "ok", entry[1]
+        CALLBACK_QUERIES.inc(action=action, result=result)
+        return result, data, choice
+
+
+def keyboard_rows(buttons: List[InlineKeyboardButton], per_row: int = 2) -> List[List[InlineKeyboardButton]]:
+    """Arrange buttons in rows of per_row."""
+    return [buttons[i:i + per_row] for i in range(0, len(buttons), per_row)]
+
+
+# Initialize callback registry
+callbacks = CallbackRegistry(ttl=config.CALLBACK_TTL, maxsize=config.CALLBACK_MAX_KEYBOARDS, store=state_store)
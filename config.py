@@ -12,10 +12,108 @@ class Config:
     # Telegram Bot Configuration
     TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 
+    # How updates are received: "polling" (default) or "webhook"
+    BOT_MODE = os.getenv("BOT_MODE", "polling")
+    WEBHOOK_URL = os.getenv("WEBHOOK_URL")  # Public HTTPS URL Telegram posts updates to
+    WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "127.0.0.1")
+    WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+    WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "telegram")
+    WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+
+    # Prometheus metrics endpoint (http://METRICS_HOST:METRICS_PORT/metrics), 0 disables it
+    METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+    METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+    # Maximum number of updates handled at the same time (each user's updates stay in order)
+    UPDATE_CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", "8"))
+
     # Grillo API Configuration
     GRILLO_API_URL = os.getenv("GRILLO_API_URL", "https://grillo.weeeopen.it/api/v1")
     GRILLO_API_TOKEN = os.getenv("GRILLO_API_TOKEN")
 
+    # Shared HTTP connection pool towards Grillo
+    GRILLO_POOL_SIZE = int(os.getenv("GRILLO_POOL_SIZE", "20"))
+    GRILLO_POOL_KEEPALIVE = int(os.getenv("GRILLO_POOL_KEEPALIVE", "10"))
+    GRILLO_KEEPALIVE_EXPIRY = float(os.getenv("GRILLO_KEEPALIVE_EXPIRY", "30"))
+
+    # Resilience of Grillo requests: timeouts (seconds), retries of idempotent
+    # GETs, and the circuit breaker that fails fast while Grillo is down
+    GRILLO_CONNECT_TIMEOUT = float(os.getenv("GRILLO_CONNECT_TIMEOUT", "3"))
+    GRILLO_READ_TIMEOUT = float(os.getenv("GRILLO_READ_TIMEOUT", "10"))
+    GRILLO_RETRIES = int(os.getenv("GRILLO_RETRIES", "2"))
+    GRILLO_RETRY_BACKOFF = float(os.getenv("GRILLO_RETRY_BACKOFF", "0.3"))
+    GRILLO_BREAKER_THRESHOLD = int(os.getenv("GRILLO_BREAKER_THRESHOLD", "5"))
+    GRILLO_BREAKER_COOLDOWN = float(os.getenv("GRILLO_BREAKER_COOLDOWN", "30"))
+
+    # Seconds a location (people, bookings) is served from cache, 0 disables it
+    LOCATION_CACHE_TTL = float(os.getenv("LOCATION_CACHE_TTL", "15"))
+    # Seconds the list of locations is cached (used by /status all)
+    LOCATION_LIST_CACHE_TTL = float(os.getenv("LOCATION_LIST_CACHE_TTL", "3600"))
+
+    # Closed weeks of audits never change: keep up to this many (week, user) pages in memory
+    AUDIT_CACHE_WEEKS = int(os.getenv("AUDIT_CACHE_WEEKS", "256"))
+
+    # Telegram users not found in LDAP are remembered to avoid repeated lookups
+    UNKNOWN_USER_CACHE_TTL = float(os.getenv("UNKNOWN_USER_CACHE_TTL", "600"))
+    UNKNOWN_USER_CACHE_SIZE = int(os.getenv("UNKNOWN_USER_CACHE_SIZE", "10000"))
+
+    # Telegram <-> LDAP mapping storage: "json" (default) or "sqlite"
+    MAPPING_BACKEND = os.getenv("MAPPING_BACKEND", "json")
+    MAPPING_FILE = os.getenv("MAPPING_FILE", "user_mapping.json")
+    MAPPING_DB = os.getenv("MAPPING_DB", "user_mapping.db")
+
+    # Caches, live status subscriptions and conversation data persisted across
+    # restarts, loaded lazily on first access. Empty disables persistence.
+    STATE_DB = os.getenv("STATE_DB", "bot_state.db")
+
+    # Per-user Grillo clients kept in memory, dropped when idle or when the cache is full
+    CLIENT_CACHE_SIZE = int(os.getenv("CLIENT_CACHE_SIZE", "1000"))
+    CLIENT_CACHE_IDLE = float(os.getenv("CLIENT_CACHE_IDLE", "3600"))
+
+    # Outbound message rate limits (messages per second), see
+    # https://core.telegram.org/bots/faq#my-bot-is-hitting-limits-how-do-i-avoid-this
+    OUTBOX_CHAT_RATE = float(os.getenv("OUTBOX_CHAT_RATE", "1"))
+    OUTBOX_GROUP_RATE = float(os.getenv("OUTBOX_GROUP_RATE", "0.33"))
+    OUTBOX_CHAT_BURST = int(os.getenv("OUTBOX_CHAT_BURST", "3"))
+    OUTBOX_GLOBAL_RATE = float(os.getenv("OUTBOX_GLOBAL_RATE", "25"))
+
+    # Live status messages: seconds between polls of the watched locations, and
+    # edit pacing to stay within Telegram limits
+    LIVE_STATUS_INTERVAL = float(os.getenv("LIVE_STATUS_INTERVAL", "30"))
+    LIVE_STATUS_MIN_EDIT_INTERVAL = float(os.getenv("LIVE_STATUS_MIN_EDIT_INTERVAL", "30"))
+    LIVE_STATUS_MAX_EDITS_PER_SECOND = float(os.getenv("LIVE_STATUS_MAX_EDITS_PER_SECOND", "20"))
+
+    # Maximum number of concurrent Grillo calls made by a batch admin command
+    BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+
+    # Per-user lab time totals, reconciled against the audits every
+    # LAB_TIME_RECONCILE_INTERVAL seconds over the last LAB_TIME_RECONCILE_DAYS days
+    LAB_TIME_DB = os.getenv("LAB_TIME_DB", "lab_time.db")
+    LAB_TIME_RECONCILE_INTERVAL = float(os.getenv("LAB_TIME_RECONCILE_INTERVAL", "3600"))
+    LAB_TIME_RECONCILE_DAYS = int(os.getenv("LAB_TIME_RECONCILE_DAYS", "35"))
+
+    # Seconds between full refreshes of the in-memory LDAP user directory
+    DIRECTORY_REFRESH_INTERVAL = float(os.getenv("DIRECTORY_REFRESH_INTERVAL", "900"))
+
+    # Bookings: seconds before a synced week is fetched again, length of a booking
+    # without an end time, and hour from which /tonight looks
+    BOOKING_SYNC_INTERVAL = float(os.getenv("BOOKING_SYNC_INTERVAL", "300"))
+    BOOKING_DEFAULT_DURATION = float(os.getenv("BOOKING_DEFAULT_DURATION", "10800"))
+    TONIGHT_FROM = int(os.getenv("TONIGHT_FROM", "18"))
+
+    # Forgotten clock-outs: hours after clock-in before the user is reminded (0: never)
+    # and before the admins are told, in REMINDER_ADMIN_CHAT_ID or privately if unset
+    REMINDER_USER_HOURS = float(os.getenv("REMINDER_USER_HOURS", "8"))
+    REMINDER_ADMIN_HOURS = float(os.getenv("REMINDER_ADMIN_HOURS", "24"))
+    REMINDER_ADMIN_CHAT_ID = int(os.getenv("REMINDER_ADMIN_CHAT_ID") or 0) or None
+    # Seconds between two checks of the reminders, and between two reads of the open sessions
+    REMINDER_TICK = float(os.getenv("REMINDER_TICK", "60"))
+    REMINDER_RESYNC_INTERVAL = float(os.getenv("REMINDER_RESYNC_INTERVAL", "300"))
+
+    # Inline keyboards: seconds a keyboard stays usable, and how many are kept at most
+    CALLBACK_TTL = float(os.getenv("CALLBACK_TTL", "900"))
+    CALLBACK_MAX_KEYBOARDS = int(os.getenv("CALLBACK_MAX_KEYBOARDS", "10000"))
+
     @classmethod
     def validate(cls):
         """Validate that all required configuration is present."""
@@ -25,6 +123,18 @@ class Config:
         if not cls.GRILLO_API_TOKEN:
             raise ValueError("GRILLO_API_TOKEN environment variable is required (get it from grillo web UI)")
 
+        if cls.BOT_MODE not in ("polling", "webhook"):
+            raise ValueError("BOT_MODE must be either 'polling' or 'webhook'")
+
+        if cls.BOT_MODE == "webhook":
+            if not cls.WEBHOOK_URL:
+                raise ValueError("WEBHOOK_URL environment variable is required in webhook mode")
+            if not cls.WEBHOOK_SECRET:
+                raise ValueError("WEBHOOK_SECRET environment variable is required in webhook mode")
+
+        if cls.UPDATE_CONCURRENCY < 1:
+            raise ValueError("UPDATE_CONCURRENCY must be at least 1")
+
         return True
 
 
@@ -2,9 +2,18 @@
 """
 Development runner with auto-reload on file changes.
 
-This script watches for file changes and automatically restarts the bot.
+This script watches for file changes and reloads the bot. Changes to the
+handler modules are applied in place, keeping the Telegram session, the
+caches and the user sessions; any other change restarts the bot.
 Use this for development instead of running bot.py directly.
+
+Usage:
+    python dev.py             Reload handlers in place (default)
+    python dev.py --restart   Restart the bot process on every change
 """
+import asyncio
+import importlib
+import os
 import sys
 import time
 import subprocess
@@ -19,6 +28,14 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Modules that can be reloaded in place, in dependency order. The others hold
+# state (configuration, caches, HTTP transports, stores) that would be lost or
+# duplicated by a reload, so changing them restarts the bot.
+RELOADABLE_MODULES = ("utils", "bot")
+
+# Seconds to wait for more changes before reloading, as editors often write a file in several steps
+DEBOUNCE_SECONDS = 0.3
+
 
 class BotRestartHandler(FileSystemEventHandler):
     """Handler that restarts the bot when Python files change."""
@@ -66,8 +83,129 @@ class BotRestartHandler(FileSystemEventHandler):
         return self.bot_process
 
 
+class HotReloadHandler(FileSystemEventHandler):
+    """Handler that passes the names of changed Python modules to the event loop."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, changes: asyncio.Queue):
+        self.loop = loop
+        self.changes = changes
+
+    def on_modified(self, event):
+        """Called when a file is modified (from the watchdog thread)."""
+        if event.is_directory or not event.src_path.endswith('.py'):
+            return
+        self.loop.call_soon_threadsafe(self.changes.put_nowait, Path(event.src_path).stem)
+
+
+def reload_handlers(application) -> float:
+    """
+    Reload the handler modules and swap their handlers on the running application.
+
+    If a module fails to import, the handlers already registered stay in place.
+
+    Returns:
+        Seconds taken by the reload
+    """
+    start = time.perf_counter()
+    modules = [importlib.reload(sys.modules[name]) for name in RELOADABLE_MODULES]
+    bot = modules[-1]
+
+    for group, handlers in list(application.handlers.items()):
+        for handler in list(handlers):
+            application.remove_handler(handler, group)
+    for callback in list(application.error_handlers):
+        application.remove_error_handler(callback)
+    bot.register_handlers(application)
+    return time.perf_counter() - start
+
+
+async def _collect_changes(changes: asyncio.Queue) -> set:
+    """Wait for a change, then for the burst of changes following it to end."""
+    modules = {await changes.get()}
+    while True:
+        try:
+            modules.add(await asyncio.wait_for(changes.get(), DEBOUNCE_SECONDS))
+        except asyncio.TimeoutError:
+            return modules
+
+
+async def run_in_process() -> bool:
+    """
+    Run the bot in this process, reloading handlers on changes.
+
+    Returns:
+        True if a change needs a full restart
+    """
+    import bot
+    from telegram import Update
+
+    try:
+        bot.config.validate()
+    except ValueError as e:
+        logger.error(f"Configuration error: {e}")
+        return False
+    application = bot.build_application()
+    changes: asyncio.Queue = asyncio.Queue()
+
+    observer = Observer()
+    watch_path = Path(__file__).parent
+    observer.schedule(HotReloadHandler(asyncio.get_running_loop(), changes), str(watch_path), recursive=False)
+    observer.start()
+    logger.info(f"👀 Watching for changes in {watch_path}")
+    logger.info("Press Ctrl+C to stop")
+
+    try:
+        async with application:
+            if application.post_init:
+                await application.post_init(application)
+            await application.start()
+            await application.updater.start_polling(allowed_updates=Update.ALL_TYPES)
+            try:
+                while True:
+                    # Modules not loaded by the bot (e.g. bench.py) do not affect it
+                    changed = {
+                        name for name in await _collect_changes(changes)
+                        if name in sys.modules or name == Path(__file__).stem
+                    }
+                    if not changed:
+                        continue
+                    logger.info(f"Detected change in {', '.join(sorted(changed))}")
+                    if not changed.issubset(RELOADABLE_MODULES):
+                        return True
+                    try:
+                        elapsed = reload_handlers(application)
+                    except Exception:
+                        logger.exception("Reload failed, keeping the previous handlers")
+                        continue
+                    logger.info(f"Reloaded {', '.join(RELOADABLE_MODULES)} in {elapsed * 1000:.0f} ms")
+            finally:
+                await application.updater.stop()
+                await application.stop()
+                if application.post_shutdown:
+                    await application.post_shutdown(application)
+    finally:
+        observer.stop()
+        observer.join()
+
+
 def main():
     """Run the bot with auto-reload."""
+    if "--restart" in sys.argv:
+        return main_restart()
+
+    logger.info("🦗 Starting Grillo Bot in development mode with hot reload...")
+    try:
+        restart = asyncio.run(run_in_process())
+    except KeyboardInterrupt:
+        logger.info("Shutting down...")
+        return
+    if restart:
+        logger.info("Core module changed, restarting...")
+        os.execv(sys.executable, [sys.executable] + sys.argv)
+
+
+def main_restart():
+    """Run the bot in a subprocess, restarting it on every change."""
     logger.info("🦗 Starting Grillo Bot in development mode with auto-reload...")
 
     # Start the bot initially
@@ -1,8 +1,296 @@
 """Grillo API client for interacting with the WEEE-Open/grillo API."""
 from token import OP
-import requests
-from typing import Dict, List, Optional, Any
+import asyncio
+import logging
+import random
+import time
+import httpx
+from datetime import date, timedelta
+from typing import TYPE_CHECKING, AsyncIterator, Dict, Iterator, List, Optional, Any
 from config import config
+from cache import TTLCache
+from state_store import state_store
+import metrics
+
+if TYPE_CHECKING:
+    # Only the blocking GrilloClient needs requests: it is imported on first use
+    import requests
+
+logger = logging.getLogger(__name__)
+
+REQUEST_SECONDS = metrics.histogram(
+    "grillo_request_duration_seconds",
+    "Latency of Grillo API requests by endpoint and HTTP method",
+    ["endpoint", "method"],
+)
+REQUEST_ERRORS = metrics.counter(
+    "grillo_request_errors_total",
+    "Failed Grillo API requests by endpoint, HTTP method and status code (or 'network')",
+    ["endpoint", "method", "status"],
+)
+REQUESTS_IN_FLIGHT = metrics.gauge(
+    "grillo_requests_in_flight", "Grillo API requests currently waiting for a response"
+)
+BREAKER_OPEN = metrics.gauge(
+    "grillo_circuit_open", "1 while the circuit breaker rejects requests to Grillo, 0 otherwise"
+)
+POOL_REQUESTS = metrics.counter(
+    "grillo_pool_requests_total",
+    "Requests to Grillo by connection pool outcome (hit: reused keep-alive connection, miss: opened a new one)",
+    ["result"],
+)
+POOL_CONNECTIONS = metrics.counter(
+    "grillo_pool_connections_total", "New TCP connections opened towards Grillo"
+)
+POOL_TLS_HANDSHAKES = metrics.counter(
+    "grillo_pool_tls_handshakes_total", "TLS handshakes performed towards Grillo"
+)
+
+# Read timeouts overriding GRILLO_READ_TIMEOUT, by endpoint label
+ENDPOINT_READ_TIMEOUTS = {
+    "/users": 30.0,  # whole LDAP directory, fetched in the background
+}
+
+# Responses worth retrying: the upstream is restarting or overloaded
+RETRY_STATUSES = {502, 503, 504}
+
+
+class GrilloUnavailableError(Exception):
+    """Grillo could not be reached, or the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Fail fast while Grillo is down.
+
+    After failure_threshold consecutive failures the circuit opens and every
+    request is rejected immediately. Once reset_timeout has elapsed a single
+    probe request is let through: success closes the circuit, failure opens
+    it again for another reset_timeout.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probe_started: Optional[float] = None
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def before_request(self) -> None:
+        """
+        Check whether a request may be sent.
+
+        Raises:
+            GrilloUnavailableError: If the circuit is open
+        """
+        if self.opened_at is None:
+            return
+        now = time.monotonic()
+        probing = self._probe_started is not None and now - self._probe_started < self.reset_timeout
+        if now - self.opened_at < self.reset_timeout or probing:
+            raise GrilloUnavailableError("Grillo is not responding, please try again in a few minutes.")
+        self._probe_started = now
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._probe_started = None
+        BREAKER_OPEN.set(0)
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._probe_started is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                logger.warning("Grillo is failing, opening the circuit breaker")
+            self.opened_at = time.monotonic()
+            self._probe_started = None
+            BREAKER_OPEN.set(1)
+
+
+# Shared by every client: they all talk to the same Grillo server
+breaker = CircuitBreaker(config.GRILLO_BREAKER_THRESHOLD, config.GRILLO_BREAKER_COOLDOWN)
+
+
+def _read_timeout(label: str) -> float:
+    return ENDPOINT_READ_TIMEOUTS.get(label, config.GRILLO_READ_TIMEOUT)
+
+
+def _backoff(attempt: int) -> float:
+    """Seconds to wait before retry number attempt + 1: exponential, with full jitter."""
+    return random.uniform(0, config.GRILLO_RETRY_BACKOFF * 2 ** attempt)
+
+
+# Location objects shared by every client, keyed by location ID. Clock-ins and
+# clock-outs made through this bot evict the affected entries.
+location_cache = TTLCache("locations", ttl=config.LOCATION_CACHE_TTL, maxsize=64, store=state_store)
+
+
+# The list of locations changes only when an admin adds or removes a lab, so it
+# is kept much longer than the occupancy of each location
+location_list_cache = TTLCache("location_list", ttl=config.LOCATION_LIST_CACHE_TTL, maxsize=1, store=state_store)
+
+
+def invalidate_location(*location_ids: Optional[str]) -> None:
+    """
+    Evict locations from the cache after a change in occupancy.
+
+    The "default" alias is always evicted too, since it may resolve to any
+    of the given locations.
+    """
+    for location_id in {*location_ids, "default"}:
+        if location_id:
+            location_cache.pop(location_id)
+
+
+# Audit pages of closed weeks, keyed by (week start, user). Once every session
+# in them has ended they never change, so they are kept without expiry; the
+# current week, and a closed one with a session still open, are always
+# refetched. Weeks dropped from memory stay in the state store and are read
+# back from there.
+audit_cache = TTLCache("audit_weeks", maxsize=config.AUDIT_CACHE_WEEKS, store=state_store)
+
+
+def week_start(day: date) -> date:
+    """Monday of the week containing day."""
+    return day - timedelta(days=day.weekday())
+
+
+def _audit_weeks(since: date, until: Optional[date]) -> Iterator[date]:
+    """Start of every week from the one containing since to the one containing until (default: today)."""
+    week = week_start(since)
+    last = week_start(until or date.today())
+    while week <= last:
+        yield week
+        week += timedelta(days=7)
+
+
+def _audit_cache_key(date_string: Optional[str], user: Optional[str]) -> Optional[tuple]:
+    """Cache key for an audit page, or None if its week is not closed yet."""
+    week = week_start(date.fromisoformat(date_string) if date_string else date.today())
+    if week + timedelta(days=7) > date.today():
+        return None
+    return week.isoformat(), user
+
+
+def _audits_finished(audits: Any) -> bool:
+    """Whether every session on an audit page has ended, so that the page can be cached."""
+    return isinstance(audits, list) and all(audit.get("endTime") is not None for audit in audits)
+
+
+def _audit_params(date_string: Optional[str], user: Optional[str]) -> Dict[str, str]:
+    params = {}
+    if date_string:
+        params["date"] = date_string
+    if user:
+        params["user"] = user
+    return params
+
+
+def _booking_data(user: Optional[Dict[str, Any]], start_time: int, end_time: Optional[int],
+                  location: Optional[str]) -> Dict[str, Any]:
+    data = {"startTime": start_time}
+    if user:
+        data["user"] = user["id"]
+    if end_time:
+        data["endTime"] = end_time
+    if location:
+        data["location"] = location
+    return data
+
+
+# Process-wide transports. Every client (admin or per-user) shares them, so
+# the number of sockets towards Grillo is bounded by GRILLO_POOL_SIZE no
+# matter how many Telegram users are active.
+_session: Optional["requests.Session"] = None
+_async_http: Optional[httpx.AsyncClient] = None
+
+
+def _get_session() -> "requests.Session":
+    """Return the process-wide blocking HTTP session, creating it if needed."""
+    global _session
+    if _session is None:
+        import requests
+        from requests.adapters import HTTPAdapter
+        _session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=config.GRILLO_POOL_SIZE, pool_block=True)
+        _session.mount("http://", adapter)
+        _session.mount("https://", adapter)
+    return _session
+
+
+def _get_async_http() -> httpx.AsyncClient:
+    """
+    Return the process-wide async HTTP client, creating it if needed.
+
+    It is created on first use so that it binds to the running event loop.
+    """
+    global _async_http
+    if _async_http is None or _async_http.is_closed:
+        _async_http = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=config.GRILLO_POOL_SIZE,
+                max_keepalive_connections=config.GRILLO_POOL_KEEPALIVE,
+                keepalive_expiry=config.GRILLO_KEEPALIVE_EXPIRY,
+            )
+        )
+    return _async_http
+
+
+def use_transport(transport: httpx.AsyncBaseTransport) -> None:
+    """
+    Send every async request through transport instead of the network, e.g.
+    to a grillo_sim.GrilloSimulator.
+    """
+    global _async_http
+    _async_http = httpx.AsyncClient(transport=transport)
+
+
+async def aclose() -> None:
+    """Close the shared HTTP transports (call on application shutdown)."""
+    global _async_http, _session
+    if _async_http is not None:
+        await _async_http.aclose()
+        _async_http = None
+    if _session is not None:
+        _session.close()
+        _session = None
+
+
+def _endpoint_label(endpoint: str) -> str:
+    """
+    Collapse an endpoint to a low-cardinality metrics label: the query string
+    is dropped and path segments after the collection name become {id}.
+    """
+    parts = endpoint.split("?", 1)[0].strip("/").split("/")
+    return "/" + "/".join(parts[:1] + ["{id}"] * (len(parts) - 1))
+
+
+def _auth_headers(api_token: Optional[str]) -> Dict[str, str]:
+    """Per-client request headers; the shared transports carry none."""
+    headers = {"Content-Type": "application/json"}
+    if api_token:
+        headers["Authorization"] = f"Bearer {api_token}"
+    return headers
+
+
+class _PoolTrace:
+    """httpx trace hook recording whether a request had to open a connection."""
+
+    __slots__ = ("opened",)
+
+    def __init__(self):
+        self.opened = False
+
+    async def __call__(self, event_name: str, info: Dict[str, Any]) -> None:
+        if event_name == "connection.connect_tcp.complete":
+            self.opened = True
+            POOL_CONNECTIONS.inc()
+        elif event_name == "connection.start_tls.complete":
+            POOL_TLS_HANDSHAKES.inc()
 
 class GrilloClient:
     """Client for interacting with the Grillo API."""
@@ -18,7 +306,7 @@ class GrilloClient:
         """
         self.api_url = api_url or config.GRILLO_API_URL
         self.api_token = api_token or config.GRILLO_API_TOKEN
-        self.session = requests.Session()
+        self.headers = _auth_headers(self.api_token)
         self.user = user
         self.user_id = user.get('uid') if user else None
         if not user and user_id:
@@ -27,15 +315,12 @@ class GrilloClient:
             if 'error' in self.user:
                 raise ValueError(f"User with UID '{user_id}' not found.")
 
-        # Set up headers for API token auth
-        if self.api_token:
-            self.session.headers.update({
-                "Authorization": f"Bearer {self.api_token}",
-                "Content-Type": "application/json"
-            })
+    @property
+    def session(self) -> "requests.Session":
+        """The shared HTTP session (kept for backwards compatibility)."""
+        return _get_session()
 
-
-    def _make_request(self, method: str, endpoint: str, **kwargs) -> Dict[str, Any]:
+    def _make_request(self, method: str, endpoint: str, **kwargs) -> "requests.Response":
         """
         Make an HTTP request to the Grillo API.
 
@@ -45,20 +330,44 @@ class GrilloClient:
             **kwargs: Additional arguments to pass to requests
 
         Returns:
-            JSON response as dictionary
+            The HTTP response
 
         Raises:
-            requests.exceptions.RequestException: If the request fails
+            GrilloUnavailableError: If Grillo cannot be reached (after retrying GETs)
         """
-        url = f"{self.api_url}{endpoint}"
-        try:
-            response = self.session.request(method, url, **kwargs)
-        except requests.exceptions.RequestException as e:
-            print(f"Error making request to {url}: {e}")
-        # print("RESPONSE: ", response.json())
-        # response.raise_for_status()
+        import requests
 
-        return response
+        url = f"{self.api_url}{endpoint}"
+        label = _endpoint_label(endpoint)
+        timeout = (config.GRILLO_CONNECT_TIMEOUT, _read_timeout(label))
+        attempts = 1 + (config.GRILLO_RETRIES if method == "GET" else 0)
+        for attempt in range(attempts):
+            breaker.before_request()
+            start = time.perf_counter()
+            try:
+                response = _get_session().request(method, url, headers=self.headers, timeout=timeout, **kwargs)
+            except requests.exceptions.RequestException as e:
+                breaker.record_failure()
+                status = "timeout" if isinstance(e, requests.exceptions.Timeout) else "network"
+                REQUEST_ERRORS.inc(endpoint=label, method=method, status=status)
+                logger.error(f"Error making request to {url} (attempt {attempt + 1}/{attempts}): {e}")
+                if attempt + 1 < attempts:
+                    time.sleep(_backoff(attempt))
+                    continue
+                raise GrilloUnavailableError("Grillo is not responding, please try again later.") from e
+            finally:
+                REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=label, method=method)
+
+            if response.status_code >= 500:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            if response.status_code >= 400:
+                REQUEST_ERRORS.inc(endpoint=label, method=method, status=response.status_code)
+            if response.status_code in RETRY_STATUSES and attempt + 1 < attempts:
+                time.sleep(_backoff(attempt))
+                continue
+            return response
 
     def is_admin(self) -> bool:
         return True if self.user and 'soviet' in self.user.get('groups') else False
@@ -102,8 +411,20 @@ class GrilloClient:
 
     # Location endpoints
     def get_locations(self) -> List[Dict[str, Any]]:
-        """Get all locations."""
-        raise NotImplementedError("get_locations method not implemented yet.")
+        """
+        Get all locations.
+
+        Returns:
+            List of location objects (id, name, ...); use get_location() for
+            their current occupancy
+        """
+        res = location_list_cache.get("all")
+        if res is None:
+            res = self._make_request("GET", "/locations").json()
+            if isinstance(res, dict) and 'error' in res:
+                raise ValueError(res['error'])
+            location_list_cache.set("all", res)
+        return res
 
     def ring_location(self, location_id: str = "default") -> bool:
         """
@@ -125,8 +446,36 @@ class GrilloClient:
         Args:
             date_string: ISO date string (defaults to current week)
             user: User ID to filter by
+
+        Returns:
+            List of audit entries (startTime, endTime, user, location, ...)
+        """
+        key = _audit_cache_key(date_string, user)
+        if key is not None:
+            res = audit_cache.get(key)
+            if res is not None:
+                return res
+        res = self._make_request("GET", "/audits", params=_audit_params(date_string, user)).json()
+        if isinstance(res, dict) and 'error' in res:
+            raise ValueError(res['error'])
+        if key is not None and _audits_finished(res):
+            audit_cache.set(key, res)
+        return res
+
+    def iter_audits(self, since: date, until: Optional[date] = None, user: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Lazily yield audit entries week by week, from since to until (default: today).
+
+        Only one week is held in memory at a time, and closed weeks are
+        served from the local cache.
+
+        Args:
+            since: First day of the range
+            until: Last day of the range
+            user: User ID to filter by
         """
-        raise NotImplementedError("get_audits method not implemented yet.")
+        for week in _audit_weeks(since, until):
+            yield from self.get_audits(week.isoformat(), user)
 
     def clockin(self, location: Optional[str] = None) -> Dict[str, Any]:
         """
@@ -144,6 +493,8 @@ class GrilloClient:
         if 'error' in res:
             if res['error'] == 'Must provide summary when switching location':
                 raise ValueError("Already clocked in. Please clock out before switching locations.")
+        else:
+            invalidate_location(location, res.get("location"))
 
         return res
 
@@ -165,6 +516,7 @@ class GrilloClient:
             if res['error'] == 'No active audit found for user':
                 raise ValueError("No active session to clock out from.")
 
+        invalidate_location(res[0].get("location"))
         return res[0] # Patch returns a list, but we only edit one at a time
 
     ### Location endpoints
@@ -178,43 +530,65 @@ class GrilloClient:
         Returns:
             Location object
         """
-        res = self._make_request("GET", f"/locations/{location_id}").json()
-        if 'error' in res:
-            if res['error'] == 'Location not found':
-                raise ValueError(f"Location '{location_id}' not found.")
+        res = location_cache.get(location_id)
+        if res is None:
+            res = self._make_request("GET", f"/locations/{location_id}").json()
+            if 'error' in res:
+                if res['error'] == 'Location not found':
+                    raise ValueError(f"Location '{location_id}' not found.")
+                return res
+            location_cache.set(location_id, res)
         return res
 
     # Booking endpoints
-    # def get_bookings(self) -> List[Dict[str, Any]]:
-    #     """Get bookings for the current week."""
-    #     return self._make_request("GET", "/bookings")
+    def get_bookings(self, date_string: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Get the bookings of a week.
 
-    # def create_booking(self, start_time: int, end_time: Optional[int] = None) -> Dict[str, Any]:
-    #     """
-    #     Create a new booking.
+        Args:
+            date_string: ISO date string of a day in the week (defaults to current week)
 
-    #     Args:
-    #         start_time: Unix timestamp for booking start
-    #         end_time: Unix timestamp for booking end (optional)
-    #     """
-    #     data = {"startTime": start_time}
-    #     if end_time:
-    #         data["endTime"] = end_time
+        Returns:
+            List of bookings (id, user, startTime, endTime, location, ...)
+        """
+        params = {"date": date_string} if date_string else None
+        res = self._make_request("GET", "/bookings", params=params).json()
+        if isinstance(res, dict) and 'error' in res:
+            raise ValueError(res['error'])
+        return res
 
-    #     return self._make_request("POST", "/bookings", json=data)
+    def create_booking(self, start_time: int, end_time: Optional[int] = None,
+                       location: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Create a new booking.
 
-    # def delete_booking(self, booking_id: int) -> bool:
-    #     """
-    #     Delete a booking.
+        Args:
+            start_time: Unix timestamp for booking start
+            end_time: Unix timestamp for booking end (optional)
+            location: Location ID (defaults to default location)
+        """
+        data = _booking_data(self.user, start_time, end_time, location)
+        res = self._make_request("POST", "/bookings", json=data).json()
+        if 'error' in res:
+            raise ValueError(res['error'])
+        invalidate_location(location, res.get("location"))
+        return res
 
-    #     Args:
-    #         booking_id: ID of the booking to delete
-    #     """
-    #     try:
-    #         self._make_request("DELETE", f"/bookings/{booking_id}")
-    #         return True
-    #     except Exception:
-    #         return False
+    def delete_booking(self, booking_id: int) -> bool:
+        """
+        Delete a booking.
+
+        Args:
+            booking_id: ID of the booking to delete
+        """
+        try:
+            response = self._make_request("DELETE", f"/bookings/{booking_id}")
+        except GrilloUnavailableError:
+            return False
+        if response.status_code >= 400:
+            return False
+        invalidate_location()
+        return True
 
     # # Event endpoints
     # def get_events(self) -> List[Dict[str, Any]]:
@@ -237,10 +611,345 @@ class GrilloClient:
     #     return self._make_request("POST", "/codes")
 
 
-# Initialize Grillo API client with admin token for user management
-api_admin_grillo = GrilloClient()
+class AsyncGrilloClient:
+    """
+    Async client for the Grillo API, safe to await from bot handlers.
+
+    Instances are lightweight views carrying only the user identity and
+    credentials; all of them share one bounded connection pool.
+    """
+
+    def __init__(self, api_url: str = None, api_token: str = None, user: dict = None):
+        """
+        Initialize the async Grillo API client.
+
+        Unlike GrilloClient, the constructor never performs network calls:
+        use AsyncGrilloClient.from_uid() to build a client for an LDAP uid.
+
+        Args:
+            api_url: Base URL for the Grillo API
+            api_token: API token for authentication (get from grillo web UI)
+            user: LDAP user object the client acts on behalf of
+        """
+        self.api_url = api_url or config.GRILLO_API_URL
+        self.api_token = api_token or config.GRILLO_API_TOKEN
+        self.user = user
+        self.user_id = user.get('uid') if user else None
+        self.headers = _auth_headers(self.api_token)
+
+    @classmethod
+    async def from_uid(cls, user_id: str, api_url: str = None, api_token: str = None) -> "AsyncGrilloClient":
+        """
+        Build a client acting on behalf of the LDAP user with the given uid.
+
+        Raises:
+            ValueError: If the user does not exist
+        """
+        client = cls(api_url=api_url, api_token=api_token)
+        user = await client.get_user_by_uid(user_id)
+        if not user or 'error' in user:
+            raise ValueError(f"User with UID '{user_id}' not found.")
+        client.user = user
+        client.user_id = user_id
+        return client
+
+    async def _make_request(self, method: str, endpoint: str, **kwargs) -> httpx.Response:
+        """
+        Make an HTTP request to the Grillo API.
+
+        Args:
+            method: HTTP method (GET, POST, DELETE, etc.)
+            endpoint: API endpoint (without base URL)
+            **kwargs: Additional arguments to pass to httpx
+
+        Returns:
+            The HTTP response
+
+        Raises:
+            GrilloUnavailableError: If Grillo cannot be reached (after retrying GETs)
+        """
+        url = f"{self.api_url}{endpoint}"
+        label = _endpoint_label(endpoint)
+        timeout = httpx.Timeout(
+            config.GRILLO_READ_TIMEOUT, connect=config.GRILLO_CONNECT_TIMEOUT, read=_read_timeout(label)
+        )
+        # Only idempotent requests are retried: a POST may have been applied
+        # even if its response was lost
+        attempts = 1 + (config.GRILLO_RETRIES if method == "GET" else 0)
+        for attempt in range(attempts):
+            breaker.before_request()
+            trace = _PoolTrace()
+            REQUESTS_IN_FLIGHT.inc()
+            start = time.perf_counter()
+            try:
+                response = await _get_async_http().request(
+                    method, url, headers=self.headers, timeout=timeout, extensions={"trace": trace}, **kwargs
+                )
+            except httpx.TransportError as e:
+                breaker.record_failure()
+                status = "timeout" if isinstance(e, httpx.TimeoutException) else "network"
+                REQUEST_ERRORS.inc(endpoint=label, method=method, status=status)
+                logger.error(f"Error making request to {url} (attempt {attempt + 1}/{attempts}): {e!r}")
+                if attempt + 1 < attempts:
+                    await asyncio.sleep(_backoff(attempt))
+                    continue
+                raise GrilloUnavailableError("Grillo is not responding, please try again later.") from e
+            finally:
+                REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=label, method=method)
+                REQUESTS_IN_FLIGHT.dec()
+
+            POOL_REQUESTS.inc(result="miss" if trace.opened else "hit")
+            if response.status_code >= 500:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            if response.status_code >= 400:
+                REQUEST_ERRORS.inc(endpoint=label, method=method, status=response.status_code)
+            if response.status_code in RETRY_STATUSES and attempt + 1 < attempts:
+                await asyncio.sleep(_backoff(attempt))
+                continue
+            return response
+
+    def is_admin(self) -> bool:
+        return True if self.user and 'soviet' in self.user.get('groups') else False
+
+    async def get_ldap_users(self) -> List[Dict[str, Any]]:
+        """
+        Get all users from LDAP (requires admin API token).
+
+        Returns:
+            List of user objects with id, username, name, etc.
+        """
+        return (await self._make_request("GET", "/users")).json()
+
+    async def get_user_by_uid(self, user_id: str) -> Dict[str, Any]:
+        """
+        Get LDAP user by user ID (requires admin API token).
+
+        Args:
+            user_id: LDAP user ID
+
+        Returns:
+            User object
+        """
+        return (await self._make_request("GET", "/user", params={"uid": user_id})).json()
+
+    async def get_user_by_telegram_id(self, telegram_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Get LDAP user by Telegram ID (requires admin API token).
+
+        Args:
+            telegram_id: Telegram user ID
+
+        Returns:
+            User object or None if not found
+        """
+        try:
+            user = (await self._make_request("GET", "/user", params={"telegram_id": telegram_id})).json()
+            return user
+        except Exception:
+            return None
+
+    # Location endpoints
+    async def get_locations(self) -> List[Dict[str, Any]]:
+        """
+        Get all locations.
+
+        Returns:
+            List of location objects (id, name, ...); use get_location() for
+            their current occupancy
+        """
+        return await location_list_cache.get_or_load("all", self._fetch_locations)
+
+    async def _fetch_locations(self) -> List[Dict[str, Any]]:
+        res = (await self._make_request("GET", "/locations")).json()
+        if isinstance(res, dict) and 'error' in res:
+            raise ValueError(res['error'])
+        return res
+
+    # Audit (lab time tracking) endpoints
+    async def get_audits(self, date_string: Optional[str] = None, user: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Get audit entries for a week.
+
+        Args:
+            date_string: ISO date string (defaults to current week)
+            user: User ID to filter by
+
+        Returns:
+            List of audit entries (startTime, endTime, user, location, ...)
+        """
+        key = _audit_cache_key(date_string, user)
+        if key is None:
+            return await self._fetch_audits(date_string, user)
+        return await audit_cache.get_or_load(
+            key, lambda: self._fetch_audits(date_string, user), cacheable=_audits_finished
+        )
+
+    async def _fetch_audits(self, date_string: Optional[str], user: Optional[str]) -> List[Dict[str, Any]]:
+        res = (await self._make_request("GET", "/audits", params=_audit_params(date_string, user))).json()
+        if isinstance(res, dict) and 'error' in res:
+            raise ValueError(res['error'])
+        return res
+
+    async def iter_audits(self, since: date, until: Optional[date] = None,
+                          user: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Lazily yield audit entries week by week, from since to until (default: today).
+
+        Only one week is held in memory at a time, and closed weeks are
+        served from the local cache.
+
+        Args:
+            since: First day of the range
+            until: Last day of the range
+            user: User ID to filter by
+        """
+        for week in _audit_weeks(since, until):
+            for entry in await self.get_audits(week.isoformat(), user):
+                yield entry
+
+    async def clockin(self, location: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Clock in to the lab.
+
+        Args:
+            location: Location ID (defaults to default location)
+        """
+        data = {"login": True, "user": self.user["id"]}
+        if location:
+            data["location"] = location
+
+        res = (await self._make_request("POST", "/audits", json=data)).json()
+
+        if 'error' in res:
+            if res['error'] == 'Must provide summary when switching location':
+                raise ValueError("Already clocked in. Please clock out before switching locations.")
+        else:
+            invalidate_location(location, res.get("location"))
+
+        return res
+
+    async def clockout(self, summary: str) -> Dict[str, Any]:
+        """
+        Clock out from the lab.
+
+        Args:
+            summary: Summary of work done during the session
+        """
+        data = {
+            "logout": True,
+            "summary": summary,
+            "user": self.user["id"],
+            "approved": self.is_admin()
+        }
+        res = (await self._make_request("PATCH", "/audits", json=data)).json()
+        if 'error' in res:
+            if res['error'] == 'No active audit found for user':
+                raise ValueError("No active session to clock out from.")
+
+        invalidate_location(res[0].get("location"))
+        return res[0] # Patch returns a list, but we only edit one at a time
+
+    # Booking endpoints
+    async def get_bookings(self, date_string: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Get the bookings of a week.
+
+        Args:
+            date_string: ISO date string of a day in the week (defaults to current week)
+
+        Returns:
+            List of bookings (id, user, startTime, endTime, location, ...)
+        """
+        params = {"date": date_string} if date_string else None
+        res = (await self._make_request("GET", "/bookings", params=params)).json()
+        if isinstance(res, dict) and 'error' in res:
+            raise ValueError(res['error'])
+        return res
+
+    async def create_booking(self, start_time: int, end_time: Optional[int] = None,
+                             location: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Create a new booking.
+
+        Args:
+            start_time: Unix timestamp for booking start
+            end_time: Unix timestamp for booking end (optional)
+            location: Location ID (defaults to default location)
+        """
+        data = _booking_data(self.user, start_time, end_time, location)
+        res = (await self._make_request("POST", "/bookings", json=data)).json()
+        if 'error' in res:
+            raise ValueError(res['error'])
+        invalidate_location(location, res.get("location"))
+        return res
+
+    async def delete_booking(self, booking_id: int) -> bool:
+        """
+        Delete a booking.
+
+        Args:
+            booking_id: ID of the booking to delete
+        """
+        try:
+            response = await self._make_request("DELETE", f"/bookings/{booking_id}")
+        except GrilloUnavailableError:
+            return False
+        if response.status_code >= 400:
+            return False
+        # The booking's location is not known here: the "default" alias is evicted,
+        # other locations catch up within LOCATION_CACHE_TTL
+        invalidate_location()
+        return True
+
+    ### Location endpoints
+    async def get_location(self, location_id: str = "default") -> Dict[str, Any]:
+        """
+        Get details of a specific location.
+
+        Args:
+            location_id: Location ID or "default" for the default location
+
+        Returns:
+            Location object
+        """
+        return await location_cache.get_or_load(location_id, lambda: self._fetch_location(location_id))
+
+    async def _fetch_location(self, location_id: str) -> Dict[str, Any]:
+        res = (await self._make_request("GET", f"/locations/{location_id}")).json()
+        if 'error' in res:
+            if res['error'] == 'Location not found':
+                raise ValueError(f"Location '{location_id}' not found.")
+            # Do not cache other API errors
+            raise ValueError(res['error'])
+        return res
+
+
+# Blocking admin client, created on first access of api_admin_grillo (see
+# __getattr__) so that processes using only the async client never load requests
+_api_admin_grillo: Optional[GrilloClient] = None
+
+
+def get_api_admin_grillo() -> GrilloClient:
+    """Return the blocking Grillo client with the admin token, creating it if needed."""
+    global _api_admin_grillo
+    if _api_admin_grillo is None:
+        _api_admin_grillo = GrilloClient()
+    return _api_admin_grillo
+
+
+def __getattr__(name: str) -> Any:
+    if name == "api_admin_grillo":
+        return get_api_admin_grillo()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Async counterpart of api_admin_grillo, used by the bot handlers. Creating it
+# opens nothing: the shared HTTP client is created on the first request.
+async_admin_grillo = AsyncGrilloClient()
 
-def get_user_client_by_telegram(telegram_id: int) -> GrilloClient:
+async def get_user_client_by_telegram(telegram_id: int) -> AsyncGrilloClient:
     """
     Get a Grillo client for a specific Telegram user.
     Falls back to admin client with user_id if user is not mapped.
@@ -249,12 +958,12 @@ def get_user_client_by_telegram(telegram_id: int) -> GrilloClient:
         telegram_id: Telegram user ID
 
     Returns:
-        GrilloClient instance
+        AsyncGrilloClient instance
     """
     from user_mapper import user_mapper
-    user_client = user_mapper.get_client_for_user(telegram_id)
+    user_client = await user_mapper.get_client_for_user(telegram_id)
     if user_client:
         return user_client
 
     # Fall back to plain admin client for read-only operations
-    return api_admin_grillo
+    return async_admin_grillo
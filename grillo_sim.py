@@ -0,0 +1,257 @@
+"""
+In-process simulator of the Grillo API, for benchmarks and local runs without Grillo.
+
+It answers the endpoints used by AsyncGrilloClient (/users, /user, /audits,
+/bookings, /locations) from in-memory data, with configurable latency and error rate:
+
+    sim = GrilloSimulator(users=100, latency=0.02, error_rate=0.01)
+    grillo_client.use_transport(sim.transport())
+
+serve_http() exposes the same simulator on a local port, for clients that
+do not go through httpx (the blocking GrilloClient) or that must see real
+sockets and timeouts.
+"""
+import asyncio
+import json
+import random
+import threading
+import time
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import httpx
+
+from config import config
+
+
+class GrilloSimulator:
+    """
+    Fake Grillo server state plus an httpx transport serving it.
+
+    Users are user0, user1, ... with Telegram IDs 1000, 1001, ...; the first
+    `admins` of them are in the "soviet" group. Locations are "lab" (also
+    the default) and "office". Clock-ins and clock-outs create and close
+    audits, which the location status and /audits reflect; bookings show up
+    in /bookings and in the status of their location.
+    """
+
+    def __init__(self, users: int = 50, admins: int = 1, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, seed: Optional[int] = None, api_url: str = None):
+        """
+        Initialize the simulator.
+
+        Args:
+            users: Number of LDAP users
+            admins: How many of them are admins
+            latency: Seconds every response is delayed by
+            jitter: Extra random delay, uniform between 0 and jitter seconds
+            error_rate: Probability of answering 503 instead of handling a request
+            seed: Seed of the random generator, for reproducible runs
+            api_url: Base URL the client uses (defaults to GRILLO_API_URL)
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.base_path = urlparse(api_url or config.GRILLO_API_URL).path.rstrip("/")
+        self.users: List[Dict[str, Any]] = [
+            {
+                "id": str(n),
+                "uid": f"user{n}",
+                "cn": f"User {n}",
+                "groups": ["soviet"] if n < admins else ["members"],
+                "telegramId": str(1000 + n),
+            }
+            for n in range(users)
+        ]
+        self.locations: Dict[str, Dict[str, Any]] = {
+            "lab": {"id": "lab", "name": "Lab"},
+            "office": {"id": "office", "name": "Office"},
+        }
+        self.default_location = "lab"
+        self.audits: List[Dict[str, Any]] = []
+        self.bookings: List[Dict[str, Any]] = []
+        self.requests = 0
+
+    def transport(self) -> httpx.MockTransport:
+        """httpx transport answering requests from this simulator."""
+        return httpx.MockTransport(self.handle)
+
+    def serve_http(self, host: str = "127.0.0.1", port: int = 0) -> Tuple[ThreadingHTTPServer, str]:
+        """
+        Serve the simulator over HTTP from a background thread.
+
+        Every request runs in its own thread, so the simulated latency overlaps
+        as it would on a real server. Call shutdown() on the server when done.
+
+        Returns:
+            The server and the API base URL to give to the clients
+        """
+        simulator = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, as the clients pool connections
+            disable_nagle_algorithm = True  # headers and body are written separately
+
+            def _answer(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                request = httpx.Request(
+                    self.command, f"http://{host}{self.path}",
+                    headers=dict(self.headers), content=self.rfile.read(length),
+                )
+                response = asyncio.run(simulator.handle(request))
+                self.send_response(response.status_code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(response.content)))
+                self.end_headers()
+                self.wfile.write(response.content)
+
+            do_GET = do_POST = do_PATCH = do_DELETE = _answer
+
+            def log_message(self, format, *args):
+                pass
+
+        class Server(ThreadingHTTPServer):
+            daemon_threads = True
+            request_queue_size = 128  # the default of 5 drops bursts of new connections
+
+        server = Server((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server, f"http://{host}:{server.server_address[1]}{self.base_path}"
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        """Answer one request, after the simulated latency."""
+        self.requests += 1
+        delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            await asyncio.sleep(delay)
+        if self.error_rate and self.random.random() < self.error_rate:
+            return httpx.Response(503, json={"error": "Simulated failure"})
+
+        path = request.url.path
+        if path.startswith(self.base_path):
+            path = path[len(self.base_path):]
+        params = dict(request.url.params)
+        body = json.loads(request.content) if request.content else {}
+
+        if request.method == "GET" and path == "/users":
+            return httpx.Response(200, json=self.users)
+        if request.method == "GET" and path == "/user":
+            return self._get_user(params)
+        if path == "/audits":
+            if request.method == "GET":
+                return httpx.Response(200, json=self._get_audits(params))
+            if request.method == "POST":
+                return self._clockin(body)
+            if request.method == "PATCH":
+                return self._clockout(body)
+        if path == "/bookings":
+            if request.method == "GET":
+                return httpx.Response(200, json=self._week(self.bookings, params.get("date")))
+            if request.method == "POST":
+                return self._book(body)
+        if request.method == "DELETE" and path.startswith("/bookings/"):
+            return self._unbook(path.split("/", 2)[2])
+        if request.method == "GET" and path == "/locations":
+            return httpx.Response(200, json=[self._location(location_id) for location_id in self.locations])
+        if request.method == "GET" and path.startswith("/locations/"):
+            location_id = path.split("/", 2)[2]
+            if location_id == "default":
+                location_id = self.default_location
+            if location_id not in self.locations:
+                return httpx.Response(404, json={"error": "Location not found"})
+            return httpx.Response(200, json=self._location(location_id))
+        return httpx.Response(404, json={"error": "Not found"})
+
+    def _get_user(self, params: Dict[str, str]) -> httpx.Response:
+        for user in self.users:
+            if params.get("uid") == user["uid"] or params.get("telegram_id") == user["telegramId"]:
+                return httpx.Response(200, json=user)
+        return httpx.Response(404, json={"error": "User not found"})
+
+    def _open_audit(self, user_id: str) -> Optional[Dict[str, Any]]:
+        return next((a for a in self.audits if a["user"] == user_id and a["endTime"] is None), None)
+
+    def _location(self, location_id: str) -> Dict[str, Any]:
+        names = {user["id"]: user["cn"] for user in self.users}
+        people = [
+            {"id": audit["user"], "name": names.get(audit["user"], "Unknown")}
+            for audit in self.audits
+            if audit["endTime"] is None and audit["location"] == location_id
+        ]
+        now = time.time()
+        bookings = sorted(
+            (b for b in self.bookings if b["location"] == location_id and (b["endTime"] or b["startTime"]) > now),
+            key=lambda b: b["startTime"],
+        )
+        return dict(self.locations[location_id], people=people, bookings=bookings)
+
+    @staticmethod
+    def _week(entries: List[Dict[str, Any]], date_string: Optional[str]) -> List[Dict[str, Any]]:
+        """Entries starting in the week of date_string (default: this week)."""
+        day = date.fromisoformat(date_string) if date_string else date.today()
+        week = day - timedelta(days=day.weekday())
+        start = datetime.combine(week, datetime.min.time()).timestamp()
+        end = datetime.combine(week + timedelta(days=7), datetime.min.time()).timestamp()
+        return [entry for entry in entries if start <= entry["startTime"] < end]
+
+    def _get_audits(self, params: Dict[str, str]) -> List[Dict[str, Any]]:
+        return [
+            audit for audit in self._week(self.audits, params.get("date"))
+            if params.get("user") in (None, audit["user"])
+        ]
+
+    def _book(self, body: Dict[str, Any]) -> httpx.Response:
+        location = body.get("location") or self.default_location
+        if location not in self.locations:
+            return httpx.Response(404, json={"error": "Location not found"})
+        if not body.get("startTime"):
+            return httpx.Response(400, json={"error": "Missing startTime"})
+        names = {user["id"]: user["cn"] for user in self.users}
+        booking = {
+            "id": max((b["id"] for b in self.bookings), default=0) + 1,
+            "user": body.get("user"),
+            "userName": names.get(body.get("user"), "Unknown"),
+            "location": location,
+            "startTime": int(body["startTime"]),
+            "endTime": int(body["endTime"]) if body.get("endTime") else None,
+        }
+        self.bookings.append(booking)
+        return httpx.Response(200, json=booking)
+
+    def _unbook(self, booking_id: str) -> httpx.Response:
+        for booking in self.bookings:
+            if str(booking["id"]) == booking_id:
+                self.bookings.remove(booking)
+                return httpx.Response(200, json={})
+        return httpx.Response(404, json={"error": "Booking not found"})
+
+    def _clockin(self, body: Dict[str, Any]) -> httpx.Response:
+        location = body.get("location") or self.default_location
+        if location not in self.locations:
+            return httpx.Response(404, json={"error": "Location not found"})
+        audit = self._open_audit(body.get("user"))
+        if audit is not None:
+            if audit["location"] != location:
+                return httpx.Response(400, json={"error": "Must provide summary when switching location"})
+            return httpx.Response(200, json=audit)
+        audit = {
+            "id": len(self.audits) + 1,
+            "user": body.get("user"),
+            "location": location,
+            "startTime": int(time.time()),
+            "endTime": None,
+            "summary": None,
+            "approved": False,
+        }
+        self.audits.append(audit)
+        return httpx.Response(200, json=audit)
+
+    def _clockout(self, body: Dict[str, Any]) -> httpx.Response:
+        audit = self._open_audit(body.get("user"))
+        if audit is None:
+            return httpx.Response(404, json={"error": "No active audit found for user"})
+        audit.update(endTime=int(time.time()), summary=body.get("summary"), approved=bool(body.get("approved")))
+        return httpx.Response(200, json=[audit])
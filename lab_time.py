@@ -0,0 +1,262 @@
+"""Per-user running totals of lab time, by day, week and month."""
+import logging
+import sqlite3
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from telegram.ext import ContextTypes
+
+from config import config
+from grillo_client import AsyncGrilloClient, async_admin_grillo, week_start
+
+logger = logging.getLogger(__name__)
+
+PERIODS = ("day", "week", "month")
+
+
+def bucket_for(period: str, day: date) -> str:
+    """Name of the bucket of period containing day, e.g. "2024-05-13" or "2024-05"."""
+    if period == "day":
+        return day.isoformat()
+    if period == "week":
+        return week_start(day).isoformat()
+    if period == "month":
+        return day.strftime("%Y-%m")
+    raise ValueError(f"Unknown period '{period}' (expected one of {', '.join(PERIODS)})")
+
+
+def _bucket_start(period: str, day: date) -> float:
+    """Unix timestamp at which the bucket of period containing day begins."""
+    if period == "week":
+        day = week_start(day)
+    elif period == "month":
+        day = day.replace(day=1)
+    return datetime.combine(day, datetime.min.time()).timestamp()
+
+
+def split_by_day(start: int, end: int) -> Iterator[Tuple[date, int]]:
+    """Split the interval [start, end) in local days, yielding (day, seconds) pairs."""
+    while start < end:
+        day = datetime.fromtimestamp(start).date()
+        midnight = datetime.combine(day + timedelta(days=1), datetime.min.time()).timestamp()
+        chunk_end = min(end, int(midnight))
+        yield day, chunk_end - start
+        start = chunk_end
+
+
+class LabTimeStore:
+    """
+    Running totals of closed lab sessions per user, plus currently open sessions.
+
+    Totals are kept for every day, week and month bucket, so reading a user's
+    total is a primary key lookup and a leaderboard is an index scan over the
+    users of one bucket; raw audits are only needed to reconcile drift.
+
+    The time of each user's last clock-in or clock-out is kept too, so that a
+    reconcile does not overwrite changes made while it was reading audits.
+    """
+
+    def __init__(self, path: str):
+        """
+        Initialize the store; the database is opened on first access.
+
+        Args:
+            path: SQLite database file, ":memory:" for a throwaway store
+        """
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """Connection to the database, opened and set up on first use."""
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(
+                "CREATE TABLE IF NOT EXISTS totals ("
+                "user TEXT NOT NULL, period TEXT NOT NULL, bucket TEXT NOT NULL, seconds INTEGER NOT NULL, "
+                "PRIMARY KEY (user, period, bucket));"
+                "CREATE INDEX IF NOT EXISTS totals_by_bucket ON totals (period, bucket, seconds);"
+                "CREATE TABLE IF NOT EXISTS open_sessions ("
+                "user TEXT PRIMARY KEY, start INTEGER NOT NULL);"
+                "CREATE TABLE IF NOT EXISTS changes ("
+                "user TEXT PRIMARY KEY, at REAL NOT NULL);"
+            )
+            self._conn = conn
+        return self._conn
+
+    def _add(self, user: str, day: date, seconds: int):
+        for period in PERIODS:
+            self.conn.execute(
+                "INSERT INTO totals (user, period, bucket, seconds) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(user, period, bucket) DO UPDATE SET seconds = seconds + excluded.seconds",
+                (user, period, bucket_for(period, day), seconds),
+            )
+
+    def _touch(self, user: str):
+        self.conn.execute("INSERT OR REPLACE INTO changes (user, at) VALUES (?, ?)", (user, time.time()))
+
+    def record_clockin(self, user: str, start: Optional[int] = None):
+        """Remember that user has an open session since start (default: now)."""
+        with self.conn:
+            self.conn.execute("BEGIN")
+            self.conn.execute(
+                "INSERT OR REPLACE INTO open_sessions (user, start) VALUES (?, ?)",
+                (user, int(start or time.time())),
+            )
+            self._touch(user)
+
+    def record_session(self, user: str, start: int, end: int):
+        """Add a closed session to the user's totals and forget the open one."""
+        with self.conn:
+            self.conn.execute("BEGIN")
+            for day, seconds in split_by_day(int(start), int(end)):
+                self._add(user, day, seconds)
+            self.conn.execute("DELETE FROM open_sessions WHERE user = ?", (user,))
+            self._touch(user)
+
+    def total(self, user: str, period: str, day: Optional[date] = None, include_open: bool = True) -> int:
+        """Seconds spent in the lab by user in the period containing day (default: today)."""
+        day = day or date.today()
+        row = self.conn.execute(
+            "SELECT seconds FROM totals WHERE user = ? AND period = ? AND bucket = ?",
+            (user, period, bucket_for(period, day)),
+        ).fetchone()
+        seconds = row[0] if row else 0
+        if include_open and day == date.today():
+            seconds += self._open_seconds(period, day).get(user, 0)
+        return seconds
+
+    def top(self, period: str, day: Optional[date] = None, limit: Optional[int] = None,
+            include_open: bool = True) -> List[Tuple[str, int]]:
+        """Users ranked by time spent in the lab in the period containing day (default: today)."""
+        day = day or date.today()
+        totals = dict(self.conn.execute(
+            "SELECT user, seconds FROM totals WHERE period = ? AND bucket = ?",
+            (period, bucket_for(period, day)),
+        ))
+        if include_open and day == date.today():
+            for user, seconds in self._open_seconds(period, day).items():
+                totals[user] = totals.get(user, 0) + seconds
+        ranking = sorted(totals.items(), key=lambda item: item[1], reverse=True)
+        return ranking[:limit] if limit else ranking
+
+    def open_session(self, user: str) -> Optional[int]:
+        """Start time of the open session of user, if any."""
+        row = self.conn.execute("SELECT start FROM open_sessions WHERE user = ?", (user,)).fetchone()
+        return row[0] if row else None
+
+    def open_sessions(self) -> Dict[str, int]:
+        """Start time of every open session, per user."""
+        return dict(self.conn.execute("SELECT user, start FROM open_sessions"))
+
+    def _open_seconds(self, period: str, day: date) -> Dict[str, int]:
+        """Time accumulated so far by open sessions within the current bucket of period."""
+        now = time.time()
+        bucket_start = _bucket_start(period, day)
+        return {
+            user: int(now - max(start, bucket_start))
+            for user, start in self.conn.execute("SELECT user, start FROM open_sessions")
+            if now > max(start, bucket_start)
+        }
+
+    def reconcile(self, first: date, last: date, days: Dict[Tuple[str, date], int],
+                  open_sessions: Dict[str, int], since: Optional[float] = None):
+        """
+        Replace the day totals and open sessions between first and last with authoritative values.
+
+        The difference between stored and authoritative day totals is applied
+        to the week and month buckets too, so buckets partially outside the
+        range stay consistent. Open sessions started before first are left
+        alone, since the audits of the range do not tell whether they ended.
+
+        Args:
+            first: First day of the reconciled range
+            last: Last day of the reconciled range
+            days: Seconds per (user, day), computed from the audits of the range
+            open_sessions: Start time of the sessions open in the range, per user
+            since: When the audits started being read: users who clocked in or
+                out since then are skipped, as their audits may be out of date
+
+        Returns:
+            Total drift repaired, in seconds
+        """
+        first_ts = int(_bucket_start("day", first))
+        with self.conn:
+            self.conn.execute("BEGIN")
+            skipped = set() if since is None else {
+                user for user, in self.conn.execute("SELECT user FROM changes WHERE at >= ?", (since,))
+            }
+            stored = {
+                (user, date.fromisoformat(bucket)): seconds
+                for user, bucket, seconds in self.conn.execute(
+                    "SELECT user, bucket, seconds FROM totals WHERE period = 'day' AND bucket BETWEEN ? AND ?",
+                    (first.isoformat(), last.isoformat()),
+                )
+            }
+            drift = 0
+            for key in stored.keys() | days.keys():
+                if key[0] in skipped:
+                    continue
+                delta = days.get(key, 0) - stored.get(key, 0)
+                if delta:
+                    drift += abs(delta)
+                    self._add(key[0], key[1], delta)
+            self.conn.execute("DELETE FROM totals WHERE seconds = 0")
+            stale = [
+                (user,) for user, in self.conn.execute("SELECT user FROM open_sessions WHERE start >= ?", (first_ts,))
+                if user not in open_sessions and user not in skipped
+            ]
+            self.conn.executemany("DELETE FROM open_sessions WHERE user = ?", stale)
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO open_sessions (user, start) VALUES (?, ?)",
+                [(user, start) for user, start in open_sessions.items() if user not in skipped],
+            )
+        return drift
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+async def reconcile(store: LabTimeStore, grillo: AsyncGrilloClient, days: int) -> int:
+    """
+    Recompute the last days of totals from the audits and repair the store.
+
+    Returns:
+        Total drift repaired, in seconds
+    """
+    started = time.time()
+    last = date.today()
+    first = last - timedelta(days=days - 1)
+    per_day: Dict[Tuple[str, date], int] = {}
+    open_sessions: Dict[str, int] = {}
+    first_ts = _bucket_start("day", first)
+    async for entry in grillo.iter_audits(first):
+        user, start, end = entry.get("user"), entry.get("startTime"), entry.get("endTime")
+        if user is None or not start:
+            continue
+        if not end:
+            open_sessions[str(user)] = int(start)
+            continue
+        for day, seconds in split_by_day(max(int(start), int(first_ts)), int(end)):
+            if first <= day <= last:
+                per_day[(str(user), day)] = per_day.get((str(user), day), 0) + seconds
+    return store.reconcile(first, last, per_day, open_sessions, since=started)
+
+
+async def reconcile_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """JobQueue callback reconciling the lab time totals against the API."""
+    try:
+        drift = await reconcile(lab_time, async_admin_grillo, config.LAB_TIME_RECONCILE_DAYS)
+        if drift:
+            logger.info(f"Reconciled lab time totals, repaired {drift}s of drift")
+    except Exception as e:
+        logger.error(f"Error reconciling lab time totals: {e}")
+
+
+# Initialize lab time store
+lab_time = LabTimeStore(config.LAB_TIME_DB)
@@ -0,0 +1,164 @@
+"""Live status messages: one pinned message per chat, edited when occupancy changes."""
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+from telegram.error import BadRequest, Forbidden, RetryAfter
+from telegram.ext import ContextTypes
+
+import metrics
+from config import config
+from grillo_client import AsyncGrilloClient, async_admin_grillo
+from outbox import retry_after_seconds
+from state_store import state_store
+from utils import format_location_status
+
+if TYPE_CHECKING:
+    from state_store import StateStore
+
+logger = logging.getLogger(__name__)
+
+LIVE_EDITS = metrics.counter(
+    "live_status_edits_total", "Live status message edits by outcome", ["result"]
+)
+
+
+class LiveStatusBoard:
+    """
+    Keep one status message per chat up to date.
+
+    Chats subscribe to a location; a single polling round fetches every
+    watched location once, however many chats watch it, and edits only the
+    messages whose content changed. Edits are paced to stay within Telegram's
+    rate limits: at most one per chat every min_edit_interval seconds and at
+    most max_edits_per_second overall.
+
+    With a store, the store holds the subscriptions and each polling round
+    reads them back: they survive a restart, and subscriptions made by other
+    worker processes are picked up. Restored messages are refreshed on the
+    next round.
+    """
+
+    def __init__(self, grillo_client: AsyncGrilloClient, min_edit_interval: float, max_edits_per_second: float,
+                 store: Optional["StateStore"] = None):
+        """
+        Initialize the board.
+
+        Args:
+            grillo_client: AsyncGrilloClient used to poll the locations
+            min_edit_interval: Minimum seconds between two edits in the same chat
+            max_edits_per_second: Maximum edits per second across all chats
+            store: StateStore keeping the subscriptions across restarts
+        """
+        self.grillo = grillo_client
+        self.min_edit_interval = min_edit_interval
+        self.max_edits_per_second = max_edits_per_second
+        # chat_id -> (location_id, message_id)
+        self.subscriptions: Dict[int, Tuple[str, int]] = {}
+        # chat_id -> content currently shown, and when it was last edited
+        self._shown: Dict[int, str] = {}
+        self._next_edit: Dict[int, float] = {}
+        self._lock = asyncio.Lock()
+        self.store = store
+
+    def subscribe(self, chat_id: int, message_id: int, location_id: str, content: str):
+        """Start keeping message_id in chat_id up to date with location_id."""
+        self.subscriptions[chat_id] = (location_id, message_id)
+        if self.store is not None:
+            self.store.set("live_status", chat_id, (location_id, message_id))
+        self._shown[chat_id] = content
+        self._next_edit[chat_id] = time.monotonic() + self.min_edit_interval
+
+    def unsubscribe(self, chat_id: int) -> Optional[int]:
+        """
+        Stop updating the live message of a chat.
+
+        Returns:
+            ID of the message that was being updated, or None
+        """
+        if self.store is not None:
+            self.store.delete("live_status", chat_id)
+        self._shown.pop(chat_id, None)
+        self._next_edit.pop(chat_id, None)
+        subscription = self.subscriptions.pop(chat_id, None)
+        return subscription[1] if subscription else None
+
+    @staticmethod
+    def render(content: str) -> str:
+        """Live message text: the status plus when it last changed."""
+        return f"{content}\n🔴 <i>Live, updated {datetime.now().strftime('%H:%M')}</i>"
+
+    async def poll(self, bot) -> None:
+        """Fetch each watched location once and edit the messages that are out of date."""
+        if self.store is not None:
+            self.subscriptions = self.store.items("live_status")
+        if not self.subscriptions:
+            return
+        # A slow round must not overlap with the next one
+        if self._lock.locked():
+            return
+        async with self._lock:
+            location_ids = sorted({location_id for location_id, _ in self.subscriptions.values()})
+            locations = await asyncio.gather(
+                *(self.grillo.get_location(location_id) for location_id in location_ids),
+                return_exceptions=True,
+            )
+            contents = {}
+            for location_id, location in zip(location_ids, locations):
+                if isinstance(location, BaseException):
+                    logger.error(f"Error polling location {location_id} for live status: {location}")
+                    continue
+                contents[location_id] = format_location_status(location)
+
+            for chat_id, (location_id, message_id) in list(self.subscriptions.items()):
+                content = contents.get(location_id)
+                if content is None or self._shown.get(chat_id) == content:
+                    continue
+                if time.monotonic() < self._next_edit.get(chat_id, 0):
+                    continue  # edited too recently, retried on the next round
+                await self._edit(bot, chat_id, message_id, content)
+                await asyncio.sleep(1 / self.max_edits_per_second)
+
+    async def _edit(self, bot, chat_id: int, message_id: int, content: str) -> None:
+        try:
+            await bot.edit_message_text(self.render(content), chat_id=chat_id, message_id=message_id, parse_mode="HTML")
+        except RetryAfter as e:
+            LIVE_EDITS.inc(result="rate_limited")
+            self._next_edit[chat_id] = time.monotonic() + retry_after_seconds(e)
+            return
+        except BadRequest as e:
+            if "not modified" not in str(e).lower():
+                # The message was deleted: nothing left to keep up to date
+                LIVE_EDITS.inc(result="gone")
+                self.unsubscribe(chat_id)
+                return
+        except Forbidden:
+            # The bot was removed from the chat
+            LIVE_EDITS.inc(result="gone")
+            self.unsubscribe(chat_id)
+            return
+        LIVE_EDITS.inc(result="ok")
+        self._shown[chat_id] = content
+        self._next_edit[chat_id] = time.monotonic() + self.min_edit_interval
+
+    async def poll_job(self, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """JobQueue callback running one polling round."""
+        try:
+            await self.poll(context.bot)
+        except Exception as e:
+            logger.error(f"Error updating live status messages: {e}")
+
+
+# Initialize live status board
+live_status = LiveStatusBoard(
+    async_admin_grillo,
+    min_edit_interval=config.LIVE_STATUS_MIN_EDIT_INTERVAL,
+    max_edits_per_second=config.LIVE_STATUS_MAX_EDITS_PER_SECOND,
+    store=state_store,
+)
+
+metrics.gauge(
+    "live_status_chats", "Chats with a live status message"
+).set_function(lambda: len(live_status.subscriptions))
@@ -0,0 +1,191 @@
+"""
+Storage backends for the Telegram ID -> LDAP user mappings.
+
+Usage:
+    python mapping_store.py migrate [json_file] [db_file]
+    python mapping_store.py bench [count]
+"""
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterator
+
+
+class JsonMappingStore(MutableMapping):
+    """
+    Mappings kept in memory and persisted to a JSON file.
+
+    Every write rewrites the whole file, atomically: a crash leaves either
+    the old or the new content, never a truncated file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._data: Dict[int, Dict[str, Any]] = {}
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                # Convert string keys back to ints
+                self._data = {int(k): v for k, v in json.load(f).items()}
+
+    def _save(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".mapping-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self._data, f, separators=(",", ":"))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def __getitem__(self, telegram_id: int) -> Dict[str, Any]:
+        return self._data[telegram_id]
+
+    def __setitem__(self, telegram_id: int, user: Dict[str, Any]):
+        self._data[telegram_id] = user
+        self._save()
+
+    def __delitem__(self, telegram_id: int):
+        del self._data[telegram_id]
+        self._save()
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(list(self._data))
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def close(self):
+        pass
+
+
+class SqliteMappingStore(MutableMapping):
+    """
+    Mappings stored in an indexed SQLite table in WAL mode.
+
+    Each write is a single-row transactional upsert, independent of how many
+    users are mapped.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS mappings ("
+            "telegram_id INTEGER PRIMARY KEY, "
+            "user TEXT NOT NULL)"
+        )
+
+    def __getitem__(self, telegram_id: int) -> Dict[str, Any]:
+        row = self._conn.execute(
+            "SELECT user FROM mappings WHERE telegram_id = ?", (telegram_id,)
+        ).fetchone()
+        if row is None:
+            raise KeyError(telegram_id)
+        return json.loads(row[0])
+
+    def __setitem__(self, telegram_id: int, user: Dict[str, Any]):
+        self._conn.execute(
+            "INSERT INTO mappings (telegram_id, user) VALUES (?, ?) "
+            "ON CONFLICT(telegram_id) DO UPDATE SET user = excluded.user",
+            (telegram_id, json.dumps(user, separators=(",", ":"))),
+        )
+
+    def __delitem__(self, telegram_id: int):
+        cursor = self._conn.execute("DELETE FROM mappings WHERE telegram_id = ?", (telegram_id,))
+        if cursor.rowcount == 0:
+            raise KeyError(telegram_id)
+
+    def __contains__(self, telegram_id: object) -> bool:
+        return self._conn.execute(
+            "SELECT 1 FROM mappings WHERE telegram_id = ?", (telegram_id,)
+        ).fetchone() is not None
+
+    def __iter__(self) -> Iterator[int]:
+        return iter([row[0] for row in self._conn.execute("SELECT telegram_id FROM mappings")])
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM mappings").fetchone()[0]
+
+    def update_many(self, mappings: Dict[int, Dict[str, Any]]):
+        """Upsert many mappings in a single transaction."""
+        with self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT INTO mappings (telegram_id, user) VALUES (?, ?) "
+                "ON CONFLICT(telegram_id) DO UPDATE SET user = excluded.user",
+                [(k, json.dumps(v, separators=(",", ":"))) for k, v in mappings.items()],
+            )
+
+    def close(self):
+        self._conn.close()
+
+
+def migrate_json_to_sqlite(json_file: str, db_file: str) -> int:
+    """
+    Copy every mapping from a JSON mapping file into a SQLite store.
+
+    The JSON file is left untouched, so the migration can be rolled back by
+    switching MAPPING_BACKEND back to json.
+
+    Returns:
+        Number of mappings migrated
+    """
+    source = JsonMappingStore(json_file)
+    target = SqliteMappingStore(db_file)
+    try:
+        target.update_many(dict(source.items()))
+        return len(source)
+    finally:
+        target.close()
+
+
+def open_store(backend: str, json_file: str, db_file: str) -> MutableMapping:
+    """
+    Open the configured mapping backend.
+
+    When the SQLite database is created for the first time and a JSON
+    mapping file exists, its content is migrated automatically.
+    """
+    if backend == "json":
+        return JsonMappingStore(json_file)
+    if backend == "sqlite":
+        if not os.path.exists(db_file) and os.path.exists(json_file):
+            migrate_json_to_sqlite(json_file, db_file)
+        return SqliteMappingStore(db_file)
+    raise ValueError(f"Unknown mapping backend '{backend}' (expected 'json' or 'sqlite')")
+
+
+def _bench(count: int):
+    """Time count single-mapping upserts against each backend."""
+    user = {"id": "x", "uid": "user", "cn": "Some User", "groups": ["members"], "telegramId": 0}
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend in ("sqlite", "json"):
+            store = open_store(backend, os.path.join(tmp, "bench.json"), os.path.join(tmp, "bench.db"))
+            start = time.perf_counter()
+            for telegram_id in range(count):
+                store[telegram_id] = dict(user, uid=f"user{telegram_id}", telegramId=telegram_id)
+            elapsed = time.perf_counter() - start
+            store.close()
+            print(f"{backend:>6}: {count} mappings in {elapsed:.2f}s ({elapsed / count * 1e6:.0f} µs/mapping)")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "migrate":
+        from config import config
+        json_file = sys.argv[2] if len(sys.argv) > 2 else config.MAPPING_FILE
+        db_file = sys.argv[3] if len(sys.argv) > 3 else config.MAPPING_DB
+        print(f"Migrated {migrate_json_to_sqlite(json_file, db_file)} mappings from {json_file} to {db_file}")
+    elif len(sys.argv) >= 2 and sys.argv[1] == "bench":
+        _bench(int(sys.argv[2]) if len(sys.argv) > 2 else 10000)
+    else:
+        print(__doc__)
+        sys.exit(1)
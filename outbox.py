@@ -0,0 +1,238 @@
+"""Central outbound message queue with Telegram rate limiting and coalescing."""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from telegram import Message
+from telegram.constants import MessageLimit
+from telegram.error import RetryAfter
+
+import metrics
+from config import config
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_SENDS = metrics.counter(
+    "outbox_sends_total", "Telegram send attempts by outcome", ["result"]
+)
+OUTBOX_COALESCED = metrics.counter(
+    "outbox_coalesced_total", "Messages merged into another message to the same chat"
+)
+OUTBOX_LATENCY = metrics.histogram(
+    "outbox_send_duration_seconds", "Time from enqueueing a message to its delivery"
+)
+
+
+def retry_after_seconds(error: RetryAfter) -> float:
+    """Delay requested by a RetryAfter, in seconds (a timedelta in newer python-telegram-bot)."""
+    retry_after = error.retry_after
+    return retry_after.total_seconds() if hasattr(retry_after, "total_seconds") else retry_after
+
+
+class TokenBucket:
+    """Token bucket refilled at rate tokens per second, holding at most capacity tokens."""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self) -> float:
+        """Seconds until a token is available (0 if one is available now)."""
+        self._refill()
+        return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def consume(self):
+        self._refill()
+        self.tokens -= 1
+
+    @property
+    def full(self) -> bool:
+        self._refill()
+        return self.tokens >= self.capacity
+
+
+class _Pending:
+    """A message waiting in a chat queue."""
+
+    __slots__ = ("text", "parse_mode", "reply_to", "coalesce", "kwargs", "future", "enqueued_at")
+
+    def __init__(self, text: str, parse_mode: Optional[str], reply_to: Optional[int], coalesce: bool,
+                 kwargs: Dict[str, Any], future: asyncio.Future):
+        self.text = text
+        self.parse_mode = parse_mode
+        self.reply_to = reply_to
+        self.coalesce = coalesce
+        self.kwargs = kwargs
+        self.future = future
+        self.enqueued_at = time.perf_counter()
+
+
+class Outbox:
+    """
+    Send every outgoing message through per-chat queues.
+
+    Each chat has its own token bucket (slower for groups, as Telegram
+    requires) and all chats share a global one. Messages that pile up for the
+    same chat while it is throttled are merged into a single message, and
+    sends rejected with RetryAfter are retried after the requested delay.
+    """
+
+    def __init__(self, chat_rate: float, group_rate: float, chat_burst: int, global_rate: float,
+                 max_retries: int = 3):
+        """
+        Initialize the outbox.
+
+        Args:
+            chat_rate: Messages per second to a private chat
+            group_rate: Messages per second to a group chat
+            chat_burst: Messages that can be sent to a chat back to back
+            global_rate: Messages per second across all chats
+            max_retries: Attempts after a RetryAfter before giving up on a message
+        """
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self._global = TokenBucket(global_rate, global_rate)
+        self._buckets: Dict[int, TokenBucket] = {}
+        self._queues: Dict[int, Deque[_Pending]] = {}
+        self._workers: Dict[int, asyncio.Task] = {}
+
+    def depth(self) -> int:
+        """Messages waiting to be sent, across all chats."""
+        return sum(len(queue) for queue in self._queues.values())
+
+    def _bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            if len(self._buckets) > 1000:
+                # Forget idle chats: a full bucket carries no information
+                self._buckets = {k: v for k, v in self._buckets.items() if not v.full}
+            # Group and channel IDs are negative
+            rate = self.group_rate if chat_id < 0 else self.chat_rate
+            bucket = self._buckets[chat_id] = TokenBucket(rate, self.chat_burst)
+        return bucket
+
+    async def throttle(self, chat_id: int) -> None:
+        """Wait until a message may be sent to chat_id, then take the tokens."""
+        bucket = self._bucket(chat_id)
+        while True:
+            wait = max(bucket.wait_time(), self._global.wait_time())
+            if wait <= 0:
+                bucket.consume()
+                self._global.consume()
+                return
+            await asyncio.sleep(wait)
+
+    async def send(self, bot, chat_id: int, text: str, parse_mode: Optional[str] = None,
+                   reply_to_message_id: Optional[int] = None, coalesce: bool = True, **kwargs) -> Message:
+        """
+        Queue a message and wait for its delivery.
+
+        Args:
+            bot: Bot used to send the message
+            chat_id: Destination chat
+            text: Message text
+            parse_mode: Telegram parse mode, e.g. "HTML"
+            reply_to_message_id: Message to reply to (only honoured if the message is not merged)
+            coalesce: Whether the message may be merged with other pending messages
+            **kwargs: Additional arguments for bot.send_message; they prevent merging
+
+        Returns:
+            The sent message (shared by all the messages merged into it)
+        """
+        future = asyncio.get_running_loop().create_future()
+        queue = self._queues.setdefault(chat_id, deque())
+        queue.append(_Pending(text, parse_mode, reply_to_message_id, coalesce and not kwargs, kwargs, future))
+        if chat_id not in self._workers:
+            self._workers[chat_id] = asyncio.create_task(self._worker(bot, chat_id))
+        return await future
+
+    def _take_batch(self, queue: Deque[_Pending]) -> List[_Pending]:
+        """Pop the next message, together with the following ones it can be merged with."""
+        batch = [queue.popleft()]
+        if not batch[0].coalesce:
+            return batch
+        length = len(batch[0].text)
+        while queue and queue[0].coalesce and queue[0].parse_mode == batch[0].parse_mode:
+            length += len(queue[0].text) + 2
+            if length > MessageLimit.MAX_TEXT_LENGTH:
+                break
+            batch.append(queue.popleft())
+        return batch
+
+    async def _worker(self, bot, chat_id: int) -> None:
+        queue = self._queues[chat_id]
+        try:
+            while queue:
+                await self.throttle(chat_id)
+                await self._deliver(bot, chat_id, self._take_batch(queue))
+        finally:
+            del self._workers[chat_id]
+            if not queue:
+                del self._queues[chat_id]
+
+    async def _deliver(self, bot, chat_id: int, batch: List[_Pending]) -> None:
+        first = batch[0]
+        text = "\n\n".join(pending.text for pending in batch)
+        reply_to = first.reply_to if len(batch) == 1 else None
+        if len(batch) > 1:
+            OUTBOX_COALESCED.inc(len(batch) - 1)
+        error: Exception = RuntimeError("Message not sent")
+        for attempt in range(self.max_retries + 1):
+            try:
+                message = await bot.send_message(
+                    chat_id,
+                    text,
+                    parse_mode=first.parse_mode,
+                    reply_to_message_id=reply_to,
+                    allow_sending_without_reply=True if reply_to else None,
+                    **first.kwargs,
+                )
+            except RetryAfter as e:
+                OUTBOX_SENDS.inc(result="retry_after")
+                retry_after = retry_after_seconds(e)
+                logger.warning(f"Rate limited by Telegram in chat {chat_id}, retrying in {retry_after}s")
+                error = e
+                await asyncio.sleep(retry_after)
+                continue
+            except Exception as e:
+                OUTBOX_SENDS.inc(result="error")
+                error = e
+                break
+            OUTBOX_SENDS.inc(result="ok")
+            now = time.perf_counter()
+            for pending in batch:
+                OUTBOX_LATENCY.observe(now - pending.enqueued_at)
+                if not pending.future.done():
+                    pending.future.set_result(message)
+            return
+
+        logger.error(f"Error sending message to chat {chat_id}: {error}")
+        for pending in batch:
+            if not pending.future.done():
+                pending.future.set_exception(error)
+
+
+# Initialize outbox
+outbox = Outbox(
+    chat_rate=config.OUTBOX_CHAT_RATE,
+    group_rate=config.OUTBOX_GROUP_RATE,
+    chat_burst=config.OUTBOX_CHAT_BURST,
+    global_rate=config.OUTBOX_GLOBAL_RATE,
+)
+
+metrics.gauge(
+    "outbox_queue_depth", "Messages waiting in the outbound queue"
+).set_function(outbox.depth)
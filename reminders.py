@@ -0,0 +1,318 @@
+"""Reminders about forgotten clock-outs, scheduled on a single timer wheel."""
+import asyncio
+import html
+import logging
+import time
+from datetime import date
+from typing import TYPE_CHECKING, Any, Dict, Hashable, List, Optional, Set, Tuple
+
+from telegram.constants import ParseMode
+from telegram.ext import ContextTypes
+
+import metrics
+from config import config
+from grillo_client import AsyncGrilloClient, async_admin_grillo, week_start
+from lab_time import LabTimeStore, lab_time
+from outbox import outbox
+from state_store import state_store
+from user_directory import UserDirectory, user_directory
+from utils import format_duration, user_display_name
+
+if TYPE_CHECKING:
+    from state_store import StateStore
+
+logger = logging.getLogger(__name__)
+
+REMINDERS_SENT = metrics.counter(
+    "reminders_sent_total", "Forgotten clock-out reminders, by recipient and outcome", ["to", "result"]
+)
+
+# Reminder stages of an open session: the user is reminded first, then the admins
+USER_STAGE, ADMIN_STAGE = 0, 1
+
+
+def _chat_id(user: Optional[Dict[str, Any]]) -> Optional[int]:
+    """Private chat of an LDAP user with the bot, i.e. their Telegram ID, if known."""
+    telegram_id = user and (user.get("telegramId") or user.get("telegram_id"))
+    try:
+        return int(telegram_id) if telegram_id else None
+    except (TypeError, ValueError):
+        return None
+
+
+class TimerWheel:
+    """
+    Hashed timing wheel: timers in a ring of slots, one slot per tick.
+
+    Scheduling and cancelling are O(1), and advancing looks only at the slots
+    of the elapsed ticks, so thousands of timers cost one dictionary per slot
+    instead of one task each. A timer due after more than a full turn waits
+    in its slot until the turn it is due in.
+    """
+
+    def __init__(self, tick: float, slots: int, now: Optional[float] = None):
+        """
+        Initialize an empty wheel.
+
+        Args:
+            tick: Seconds covered by each slot, i.e. the timer resolution
+            slots: Number of slots in the ring
+            now: Current Unix time (default: time.time())
+        """
+        self.tick = tick
+        self._slots: List[Dict[Hashable, float]] = [{} for _ in range(slots)]
+        self._slot_of: Dict[Hashable, int] = {}
+        self._cursor = int((time.time() if now is None else now) // tick)
+
+    def __len__(self) -> int:
+        return len(self._slot_of)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._slot_of
+
+    def schedule(self, key: Hashable, due: float):
+        """Fire key at the Unix time due, replacing its previous timer; past times fire on the next advance."""
+        self.cancel(key)
+        slot = max(int(due // self.tick), self._cursor) % len(self._slots)
+        self._slots[slot][key] = due
+        self._slot_of[key] = slot
+
+    def cancel(self, key: Hashable):
+        """Drop the timer of key, if any."""
+        slot = self._slot_of.pop(key, None)
+        if slot is not None:
+            del self._slots[slot][key]
+
+    def advance(self, now: Optional[float] = None) -> List[Tuple[Hashable, float]]:
+        """
+        Move the wheel to now and remove the timers that are due.
+
+        Returns:
+            (key, due) of every expired timer
+        """
+        now = time.time() if now is None else now
+        target = int(now // self.tick)
+        # After a long pause every slot is visited once, not once per missed tick
+        if target - self._cursor < len(self._slots):
+            ticks = range(self._cursor, target + 1)
+        else:
+            ticks = range(len(self._slots))
+        expired = []
+        for tick in ticks:
+            slot = self._slots[tick % len(self._slots)]
+            for key, due in list(slot.items()):
+                if due <= now:
+                    del slot[key]
+                    del self._slot_of[key]
+                    expired.append((key, due))
+        # The current slot is visited again next time, for its timers due later in this tick
+        self._cursor = target
+        return expired
+
+
+class ReminderEngine:
+    """
+    Remind users who forgot to clock out, then the admins.
+
+    Every open session has one timer on a TimerWheel: it fires REMINDER_USER_HOURS
+    after clock-in to message the user, then REMINDER_ADMIN_HOURS after clock-in
+    to report the session to the admins. A single JobQueue job advances the
+    wheel; the sessions whose timers fired are checked in one batch against
+    the open audits of the weeks they started in, so sessions closed
+    elsewhere (e.g. on the website) are dismissed without reminding anybody.
+    A dismissed session stays followed, with no timer, until it leaves the
+    open sessions of the lab time store, so resyncs do not schedule it again.
+
+    Sessions are learnt from the clock-ins handled by the bot and from the
+    open sessions of the lab time store, re-read every resync_interval. With a
+    store, each session's reminder stage is kept there, so nobody is reminded
+    twice across a restart.
+    """
+
+    def __init__(self, grillo_client: AsyncGrilloClient, sessions: LabTimeStore, directory: UserDirectory,
+                 user_after: float, admin_after: float, tick: float, resync_interval: float,
+                 admin_chat_id: Optional[int] = None, store: Optional["StateStore"] = None):
+        """
+        Initialize the engine.
+
+        Args:
+            grillo_client: AsyncGrilloClient with the admin token, used for the batched checks
+            sessions: LabTimeStore whose open sessions are tracked
+            directory: UserDirectory mapping Grillo users to Telegram IDs
+            user_after: Seconds after clock-in before the user is reminded
+            admin_after: Seconds after clock-in before the admins are told
+            tick: Resolution of the timer wheel, i.e. seconds between two job runs
+            resync_interval: Seconds between two reads of the open sessions
+            admin_chat_id: Chat receiving the admin reminders (default: each admin privately)
+            store: StateStore keeping the reminder stages across restarts
+        """
+        self.grillo = grillo_client
+        self.sessions = sessions
+        self.directory = directory
+        self.delays = (user_after, admin_after)
+        self.resync_interval = resync_interval
+        self.admin_chat_id = admin_chat_id
+        self.store = store
+        # Enough slots for one turn to cover the user reminder delay
+        self.wheel = TimerWheel(tick, slots=max(1, int(user_after // tick) + 1))
+        # user_id -> (session start, next reminder stage)
+        self.tracked: Dict[str, Tuple[int, int]] = {}
+        self._next_resync = 0.0
+        self._restored = store is None
+
+    def _restore(self):
+        if self._restored:
+            return
+        self._restored = True
+        for user_id, (start, stage) in self.store.items("reminders").items():
+            self._schedule(user_id, start, stage)
+
+    def _schedule(self, user_id: str, start: int, stage: int):
+        self.tracked[user_id] = (start, stage)
+        if stage < len(self.delays):
+            self.wheel.schedule(user_id, start + self.delays[stage])
+        else:
+            self.wheel.cancel(user_id)
+
+    def track(self, user_id: str, start: int, stage: int = USER_STAGE):
+        """Start following the session of user_id opened at start, unless already followed."""
+        self._restore()
+        user_id = str(user_id)
+        if self.tracked.get(user_id, (None,))[0] == int(start):
+            return
+        self._schedule(user_id, int(start), stage)
+        if self.store is not None:
+            self.store.set("reminders", user_id, (int(start), stage))
+
+    def forget(self, user_id: str):
+        """Stop following the session of user_id, e.g. when they clock out."""
+        self._restore()
+        user_id = str(user_id)
+        self.wheel.cancel(user_id)
+        if self.tracked.pop(user_id, None) is not None and self.store is not None:
+            self.store.delete("reminders", user_id)
+
+    def _set_stage(self, user_id: str, stage: int):
+        start = self.tracked[user_id][0]
+        self._schedule(user_id, start, stage)
+        if self.store is not None:
+            self.store.set("reminders", user_id, (start, stage))
+
+    def resync(self):
+        """Align the followed sessions with the open sessions of the lab time store."""
+        self._restore()
+        open_sessions = self.sessions.open_sessions()
+        for user_id in set(self.tracked) - set(open_sessions):
+            self.forget(user_id)
+        for user_id, start in open_sessions.items():
+            self.track(user_id, start)
+
+    async def _still_open(self, user_ids: List[str]) -> Optional[Set[str]]:
+        """Which of user_ids still have an open audit, or None if an audit page could not be read."""
+        weeks = {week_start(date.fromtimestamp(self.tracked[user_id][0])) for user_id in user_ids}
+        pages = await asyncio.gather(
+            *(self.grillo.get_audits(week.isoformat()) for week in weeks),
+            return_exceptions=True,
+        )
+        still_open = set()
+        for week, page in zip(weeks, pages):
+            if isinstance(page, BaseException):
+                logger.error(f"Error checking open audits of week {week}: {page}")
+                return None
+            still_open.update(str(audit.get("user")) for audit in page if audit.get("endTime") is None)
+        return still_open & set(user_ids)
+
+    async def run(self, bot) -> None:
+        """Resync if due, advance the wheel and send the reminders whose time has come."""
+        self._restore()
+        now = time.time()
+        if now >= self._next_resync:
+            self.resync()
+            self._next_resync = now + self.resync_interval
+        due = [user_id for user_id, _ in self.wheel.advance(now)]
+        if not due:
+            return
+
+        try:
+            still_open = await self._still_open(due)
+        except Exception as e:
+            logger.error(f"Error checking open sessions: {e}")
+            still_open = None
+        if still_open is None:
+            # Check again on the next tick
+            for user_id in due:
+                self._schedule(user_id, *self.tracked[user_id])
+            return
+
+        users, admins = [], []
+        for user_id in due:
+            stage = self.tracked[user_id][1]
+            if user_id not in still_open:
+                # Closed elsewhere: no reminders for it, even after a resync
+                self._set_stage(user_id, len(self.delays))
+                continue
+            (users if stage == USER_STAGE else admins).append(user_id)
+            self._set_stage(user_id, stage + 1)
+        await asyncio.gather(
+            *(self._remind_user(bot, user_id, now) for user_id in users),
+            self._remind_admins(bot, admins, now),
+        )
+
+    async def _send(self, bot, chat_id: int, text: str, to: str) -> None:
+        try:
+            await outbox.send(bot, chat_id, text, parse_mode=ParseMode.HTML, coalesce=False)
+            REMINDERS_SENT.inc(to=to, result="ok")
+        except Exception as e:
+            # Typically the user never started the bot, or blocked it
+            REMINDERS_SENT.inc(to=to, result="error")
+            logger.error(f"Error sending reminder to {chat_id}: {e}")
+
+    async def _remind_user(self, bot, user_id: str, now: float) -> None:
+        chat_id = _chat_id(self.directory.get_by_id(user_id))
+        if chat_id is None:
+            REMINDERS_SENT.inc(to="user", result="unreachable")
+            return
+        start = self.tracked[user_id][0]
+        await self._send(bot, chat_id,
+            f"⏰ You clocked in {format_duration(int(now - start))} ago and are still in the lab.\n"
+            "Did you forget to /clockout?",
+            to="user",
+        )
+
+    async def _remind_admins(self, bot, user_ids: List[str], now: float) -> None:
+        if not user_ids:
+            return
+        text = "⏰ <b>Sessions open for a long time:</b>\n"
+        for user_id in sorted(user_ids, key=lambda user_id: self.tracked[user_id][0]):
+            name = user_display_name(self.directory.get_by_id(user_id), fallback=user_id)
+            text += f"  • {html.escape(name)}: {format_duration(int(now - self.tracked[user_id][0]))}\n"
+        if self.admin_chat_id:
+            chats = [self.admin_chat_id]
+        else:
+            chats = [chat_id for chat_id in map(_chat_id, self.directory.members_of("soviet")) if chat_id]
+        await asyncio.gather(*(self._send(bot, chat_id, text, to="admins") for chat_id in chats))
+
+    async def job(self, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """JobQueue callback running one tick of the engine."""
+        try:
+            await self.run(context.bot)
+        except Exception as e:
+            logger.error(f"Error sending reminders: {e}")
+
+
+# Initialize reminder engine
+reminders = ReminderEngine(
+    async_admin_grillo,
+    lab_time,
+    user_directory,
+    user_after=config.REMINDER_USER_HOURS * 3600,
+    admin_after=config.REMINDER_ADMIN_HOURS * 3600,
+    tick=config.REMINDER_TICK,
+    resync_interval=config.REMINDER_RESYNC_INTERVAL,
+    admin_chat_id=config.REMINDER_ADMIN_CHAT_ID,
+    store=state_store,
+)
+
+metrics.gauge(
+    "reminders_tracked_sessions", "Open sessions followed by the reminder engine"
+).set_function(lambda: len(reminders.tracked))
@@ -0,0 +1,192 @@
+"""Crash-safe SQLite store for bot state that should survive a restart."""
+import json
+import logging
+import pickle
+import sqlite3
+import time
+from copy import deepcopy
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+
+def _encode_key(key: Hashable) -> str:
+    return json.dumps(key)
+
+
+def _decode_key(key: str) -> Hashable:
+    value = json.loads(key)
+    # JSON has no tuples: composite keys come back as lists
+    return tuple(value) if isinstance(value, list) else value
+
+
+class StateStore:
+    """
+    Namespaced key-value store backed by SQLite.
+
+    The database is opened on first access, so importing the modules that
+    use it costs nothing at startup. Every write is its own transaction in
+    WAL mode: a crash loses at most the write in progress, never the file.
+    Values are pickled, keys are stored as JSON.
+    """
+
+    def __init__(self, path: str):
+        """
+        Initialize the store.
+
+        Args:
+            path: SQLite database file, ":memory:" for a throwaway store
+        """
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """Connection to the database, opened and purged of expired entries on first use."""
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS state ("
+                " namespace TEXT NOT NULL,"
+                " key TEXT NOT NULL,"
+                " value BLOB NOT NULL,"
+                " expires_at REAL,"
+                " PRIMARY KEY (namespace, key))"
+            )
+            purged = conn.execute(
+                "DELETE FROM state WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),)
+            ).rowcount
+            if purged:
+                logger.info(f"Purged {purged} expired entries from {self.path}")
+            self._conn = conn
+        return self._conn
+
+    def get(self, namespace: str, key: Hashable) -> Optional[Tuple[Any, Optional[float]]]:
+        """
+        Read one entry.
+
+        Returns:
+            (value, expires_at) with expires_at a Unix timestamp or None,
+            or None if the entry is missing or expired
+        """
+        row = self.conn.execute(
+            "SELECT value, expires_at FROM state WHERE namespace = ? AND key = ?",
+            (namespace, _encode_key(key)),
+        ).fetchone()
+        if row is None or (row[1] is not None and row[1] <= time.time()):
+            return None
+        return pickle.loads(row[0]), row[1]
+
+    def set(self, namespace: str, key: Hashable, value: Any, expires_at: Optional[float] = None):
+        """Write one entry, expiring at the Unix timestamp expires_at (None: never)."""
+        self.conn.execute(
+            "INSERT INTO state (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)"
+            " ON CONFLICT (namespace, key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at",
+            (namespace, _encode_key(key), pickle.dumps(value), expires_at),
+        )
+
+    def delete(self, namespace: str, key: Hashable):
+        """Remove one entry, if present."""
+        self.conn.execute("DELETE FROM state WHERE namespace = ? AND key = ?", (namespace, _encode_key(key)))
+
+    def clear(self, namespace: str):
+        """Remove every entry of a namespace."""
+        self.conn.execute("DELETE FROM state WHERE namespace = ?", (namespace,))
+
+    def items(self, namespace: str) -> Dict[Hashable, Any]:
+        """All live entries of a namespace."""
+        rows = self.conn.execute(
+            "SELECT key, value FROM state WHERE namespace = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (namespace, time.time()),
+        )
+        return {_decode_key(key): pickle.loads(value) for key, value in rows}
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class StatePersistence(BasePersistence):
+    """
+    python-telegram-bot persistence on top of a StateStore.
+
+    Keeps user_data, chat_data, conversation states and callback data, so
+    that multi-step flows survive a restart. bot_data is not persisted: it
+    holds runtime objects such as the metrics server.
+    """
+
+    def __init__(self, store: StateStore, update_interval: float = 60):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False),
+            update_interval=update_interval,
+        )
+        self.store = store
+
+    async def get_user_data(self) -> Dict[int, Dict[Any, Any]]:
+        return self.store.items("user_data")
+
+    async def get_chat_data(self) -> Dict[int, Dict[Any, Any]]:
+        return self.store.items("chat_data")
+
+    async def get_bot_data(self) -> Dict[Any, Any]:
+        return {}
+
+    async def get_callback_data(self):
+        entry = self.store.get("callback_data", "data")
+        return entry[0] if entry else None
+
+    async def get_conversations(self, name: str) -> Dict[tuple, object]:
+        return self.store.items(f"conversation:{name}")
+
+    async def update_conversation(self, name: str, key: tuple, new_state: Optional[object]) -> None:
+        if new_state is None:
+            self.store.delete(f"conversation:{name}", key)
+        else:
+            self.store.set(f"conversation:{name}", key, new_state)
+
+    async def update_user_data(self, user_id: int, data: Dict[Any, Any]) -> None:
+        if data:
+            self.store.set("user_data", user_id, data)
+        else:
+            self.store.delete("user_data", user_id)
+
+    async def update_chat_data(self, chat_id: int, data: Dict[Any, Any]) -> None:
+        if data:
+            self.store.set("chat_data", chat_id, data)
+        else:
+            self.store.delete("chat_data", chat_id)
+
+    async def update_bot_data(self, data: Dict[Any, Any]) -> None:
+        pass
+
+    async def update_callback_data(self, data) -> None:
+        self.store.set("callback_data", "data", deepcopy(data))
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self.store.delete("user_data", user_id)
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        self.store.delete("chat_data", chat_id)
+
+    async def refresh_user_data(self, user_id: int, user_data: Dict[Any, Any]) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Dict[Any, Any]) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: Dict[Any, Any]) -> None:
+        pass
+
+    async def flush(self) -> None:
+        self.store.close()
+
+
+# Shared state store, None when STATE_DB is empty (persistence disabled)
+state_store = StateStore(config.STATE_DB) if config.STATE_DB else None
@@ -0,0 +1,27 @@
+"""
+Test settings: fake tokens, Grillo unreachable unless a test provides a
+simulator, state kept in memory, no Telegram rate limits.
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench import BENCH_ENV  # noqa: E402 (bench does not import the configuration)
+
+# Set before the tests import the configuration, so not a tmp_path fixture
+_tmp_dir = tempfile.mkdtemp(prefix="grillo-bot-tests-")
+
+os.environ.update(
+    BENCH_ENV,
+    MAPPING_FILE=os.path.join(_tmp_dir, "mapping.json"),
+    OUTBOX_CHAT_RATE="1000000",
+    OUTBOX_GROUP_RATE="1000000",
+    OUTBOX_GLOBAL_RATE="1000000",
+)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(_tmp_dir, ignore_errors=True)
@@ -0,0 +1,75 @@
+"""Caching of audit pages, against the Grillo simulator."""
+import asyncio
+from datetime import date, datetime, time as dt_time, timedelta
+
+import pytest
+
+import grillo_client
+from grillo_client import AsyncGrilloClient, GrilloClient, audit_cache, week_start
+from grillo_sim import GrilloSimulator
+
+
+@pytest.fixture
+def sim(monkeypatch):
+    sim = GrilloSimulator(users=2)
+    monkeypatch.setattr(grillo_client, "_async_http", None)
+    grillo_client.use_transport(sim.transport())
+    audit_cache.clear()
+    yield sim
+    audit_cache.clear()
+    asyncio.run(grillo_client.aclose())
+
+
+def last_sunday_night() -> int:
+    """23:00 on the Sunday ending last week."""
+    sunday = week_start(date.today()) - timedelta(days=1)
+    return int(datetime.combine(sunday, dt_time(23)).timestamp())
+
+
+def open_session(sim: GrilloSimulator, user: str, start: int):
+    sim.audits.append({
+        "id": len(sim.audits) + 1, "user": user, "location": "lab",
+        "startTime": start, "endTime": None, "summary": None, "approved": False,
+    })
+
+
+def last_week() -> str:
+    return (week_start(date.today()) - timedelta(days=7)).isoformat()
+
+
+def test_closed_week_with_open_session_is_refetched(sim):
+    open_session(sim, "0", last_sunday_night())
+    client = AsyncGrilloClient(user=sim.users[0])
+
+    async def main():
+        [audit] = await client.get_audits(last_week())
+        assert audit["endTime"] is None
+        assert len(audit_cache) == 0
+
+        await client.clockout("Done")
+        [audit] = await client.get_audits(last_week())
+        assert audit["endTime"] is not None
+        assert len(audit_cache) == 1
+
+        # Finished weeks are served from the cache from then on
+        requests = sim.requests
+        assert await client.get_audits(last_week()) == [audit]
+        assert sim.requests == requests
+
+    asyncio.run(main())
+
+
+def test_blocking_client_caches_only_finished_weeks(sim):
+    open_session(sim, "0", last_sunday_night())
+    server, api_url = sim.serve_http()
+    try:
+        client = GrilloClient(api_url=api_url, user=sim.users[0])
+        assert client.get_audits(last_week())[0]["endTime"] is None
+        assert len(audit_cache) == 0
+
+        sim.audits[0]["endTime"] = last_sunday_night() + 3600
+        assert client.get_audits(last_week())[0]["endTime"] is not None
+        assert len(audit_cache) == 1
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,105 @@
+"""BookingIndex: range queries by binary search over start times."""
+from bookings import BookingIndex
+
+
+def booking(booking_id, start, end=None, location="lab", user="1"):
+    return {"id": booking_id, "startTime": start, "endTime": end, "location": location, "user": user}
+
+
+def ids(bookings):
+    return [b["id"] for b in bookings]
+
+
+def test_between_finds_overlaps_with_half_open_edges():
+    index = BookingIndex(default_duration=100)
+    index.add(booking(1, 1000, 1100))
+    index.add(booking(2, 1100, 1200))
+    index.add(booking(3, 1300, 1400))
+
+    assert ids(index.between(1000, 1100)) == [1]
+    # Ends are exclusive: a booking ending at start does not overlap
+    assert ids(index.between(1100, 1150)) == [2]
+    assert ids(index.between(1050, 1101)) == [1, 2]
+    assert ids(index.between(1200, 1300)) == []
+    assert ids(index.between(0, 5000)) == [1, 2, 3]
+
+
+def test_long_booking_started_before_the_range_is_found():
+    index = BookingIndex(default_duration=100)
+    index.add(booking(1, 1000, 9000))
+    index.add(booking(2, 5000, 5100))
+
+    assert ids(index.between(6000, 6100)) == [1]
+    assert ids(index.between(5050, 5060)) == [1, 2]
+
+
+def test_default_duration_for_bookings_without_end():
+    index = BookingIndex(default_duration=100)
+    index.add(booking(1, 1000))
+
+    assert ids(index.between(1099, 1200)) == [1]
+    assert ids(index.between(1100, 1200)) == []
+
+
+def test_location_filter_and_sorting():
+    index = BookingIndex(default_duration=100)
+    index.add(booking(1, 1200, location="office"))
+    index.add(booking(2, 1000))
+    index.add(booking(3, 1100))
+
+    assert ids(index.between(0, 5000)) == [2, 3, 1]
+    assert ids(index.between(0, 5000, location="lab")) == [2, 3]
+
+
+def test_bookings_with_the_same_start():
+    index = BookingIndex(default_duration=100)
+    for booking_id in range(1, 5):
+        index.add(booking(booking_id, 1000, 1100))
+
+    assert index.remove(3)["id"] == 3
+    assert ids(index.between(1000, 1001)) == [1, 2, 4]
+    assert len(index) == 3
+
+
+def test_add_replaces_and_remove():
+    index = BookingIndex(default_duration=100)
+    index.add(booking(1, 1000, 1100))
+    index.add(booking(1, 2000, 2100))
+
+    assert len(index) == 1
+    assert ids(index.between(1000, 1100)) == []
+    assert ids(index.between(2000, 2100)) == [1]
+    # IDs match whether given as int or string
+    assert "1" in index and index.get("1")["startTime"] == 2000
+    assert index.remove("1") is not None
+    assert index.remove(1) is None
+    assert len(index) == 0
+
+
+def test_replace_range_touches_only_differences():
+    index = BookingIndex(default_duration=100)
+    kept = booking(1, 1000, 1100)
+    index.add(kept)
+    index.add(booking(2, 1200, 1300))
+    index.add(booking(3, 1400, 1500))
+    index.add(booking(4, 5000, 5100))  # outside the range
+
+    changed, removed = index.replace_range(1000, 2000, [
+        dict(kept),
+        booking(2, 1250, 1300),
+        booking(5, 1600, 1700),
+    ])
+
+    assert (changed, removed) == (2, 1)
+    assert index.get(1) is kept
+    assert ids(index.between(0, 10000)) == [1, 2, 5, 4]
+    assert index.get(2)["startTime"] == 1250
+
+
+def test_replace_range_end_is_exclusive():
+    index = BookingIndex(default_duration=100)
+    index.add(booking(1, 1000, 1100))
+    index.add(booking(2, 2000, 2100))
+
+    assert index.replace_range(1000, 2000, []) == (0, 1)
+    assert ids(index.between(0, 10000)) == [2]
@@ -0,0 +1,79 @@
+"""Cancelling bookings through the calendar, against the Grillo simulator."""
+import asyncio
+import time
+
+import pytest
+
+import grillo_client
+from bookings import BookingCalendar
+from grillo_client import AsyncGrilloClient
+from grillo_sim import GrilloSimulator
+
+
+@pytest.fixture
+def sim(monkeypatch):
+    sim = GrilloSimulator(users=3, admins=1)
+    monkeypatch.setattr(grillo_client, "_async_http", None)
+    grillo_client.use_transport(sim.transport())
+    yield sim
+    asyncio.run(grillo_client.aclose())
+
+
+def calendar() -> BookingCalendar:
+    """A calendar as in a freshly started worker, with nothing indexed."""
+    return BookingCalendar(AsyncGrilloClient(), max_age=300, default_duration=3600)
+
+
+def client(sim: GrilloSimulator, n: int) -> AsyncGrilloClient:
+    return AsyncGrilloClient(user=sim.users[n])
+
+
+def test_cannot_cancel_somebody_elses_unindexed_booking(sim):
+    async def main():
+        start = int(time.time()) + 3600
+        booking = await calendar().book(client(sim, 1), start, start + 3600)
+        # The ID as typed in /unbook
+        booking_id = str(booking["id"])
+
+        assert not await calendar().unbook(client(sim, 2), booking_id)
+        assert [b["id"] for b in sim.bookings] == [booking["id"]]
+
+        other_worker = calendar()
+        assert await other_worker.unbook(client(sim, 1), booking_id)
+        assert sim.bookings == []
+        assert booking_id not in other_worker.index
+
+    asyncio.run(main())
+
+
+def test_cannot_cancel_unknown_booking(sim):
+    async def main():
+        assert not await calendar().unbook(client(sim, 1), "42")
+        assert not await calendar().unbook(AsyncGrilloClient(), "42")
+
+    asyncio.run(main())
+
+
+def test_finds_booking_made_after_the_last_sync(sim):
+    async def main():
+        now = int(time.time())
+        worker = calendar()
+        assert await worker.between(now, now + 7 * 86400) == []
+        # Booked through another worker while this one's copy is still fresh
+        booking = await calendar().book(client(sim, 1), now + 3600, now + 7200)
+
+        assert await worker.unbook(client(sim, 1), str(booking["id"]))
+        assert sim.bookings == []
+
+    asyncio.run(main())
+
+
+def test_admin_cancels_anybodys_booking(sim):
+    async def main():
+        start = int(time.time()) + 3600
+        booking = await calendar().book(client(sim, 1), start, start + 3600)
+
+        assert await calendar().unbook(client(sim, 0), str(booking["id"]))
+        assert sim.bookings == []
+
+    asyncio.run(main())
@@ -0,0 +1,192 @@
+"""TTLCache: expiry, LRU bound and coalesced, cancel-safe loading."""
+import asyncio
+import time
+
+import pytest
+
+from cache import TTLCache
+from state_store import StateStore
+
+
+class Loader:
+    """Counts calls; each call waits for release, then returns or raises."""
+
+    def __init__(self, result="value"):
+        self.result = result
+        self.calls = 0
+        self.release = None
+
+    async def __call__(self):
+        self.calls += 1
+        call = self.calls
+        if self.release is not None:
+            await self.release.wait()
+        if isinstance(self.result, Exception):
+            raise self.result
+        return f"{self.result} {call}"
+
+
+def test_entry_expires_after_ttl():
+    cache = TTLCache("test", ttl=0.05)
+    cache.set("key", "value")
+    assert cache.get("key") == "value"
+    time.sleep(0.06)
+    assert cache.get("key") is None
+    assert len(cache) == 0
+
+
+def test_expire_drops_every_expired_entry():
+    cache = TTLCache("test", ttl=0.05)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    time.sleep(0.06)
+    cache.set("c", 3)
+
+    assert cache.expire() == 2
+    assert len(cache) == 1
+
+
+def test_sliding_ttl_restarts_on_access():
+    cache = TTLCache("test", ttl=0.1, sliding=True)
+    cache.set("key", "value")
+    for _ in range(3):
+        time.sleep(0.05)
+        assert cache.get("key") == "value"
+
+
+def test_least_recently_used_entry_is_dropped():
+    cache = TTLCache("test", maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert "a" in cache and "c" in cache and "b" not in cache
+
+
+def test_disabled_cache_stores_nothing():
+    cache = TTLCache("test", ttl=0)
+    cache.set("key", "value")
+    assert cache.get("key") is None
+
+
+def test_concurrent_callers_share_one_load():
+    cache = TTLCache("test", ttl=60)
+    loader = Loader()
+
+    async def main():
+        loader.release = asyncio.Event()
+        callers = [asyncio.create_task(cache.get_or_load("key", loader)) for _ in range(10)]
+        await asyncio.sleep(0)
+        loader.release.set()
+        return await asyncio.gather(*callers)
+
+    assert asyncio.run(main()) == ["value 1"] * 10
+    assert loader.calls == 1
+    assert asyncio.run(cache.get_or_load("key", loader)) == "value 1"
+    assert loader.calls == 1
+
+
+def test_failed_load_is_not_cached():
+    cache = TTLCache("test", ttl=60)
+    loader = Loader(ValueError("Grillo is down"))
+
+    async def main():
+        loader.release = asyncio.Event()
+        callers = [asyncio.create_task(cache.get_or_load("key", loader)) for _ in range(3)]
+        await asyncio.sleep(0)
+        loader.release.set()
+        return await asyncio.gather(*callers, return_exceptions=True)
+
+    assert all(isinstance(result, ValueError) for result in asyncio.run(main()))
+    assert loader.calls == 1
+    assert "key" not in cache
+
+    loader.result = "value"
+    loader.release = None
+    assert asyncio.run(cache.get_or_load("key", loader)) == "value 2"
+
+
+def test_uncacheable_value_is_loaded_again():
+    cache = TTLCache("test", ttl=60)
+    loader = Loader()
+
+    async def main():
+        first = await cache.get_or_load("key", loader, cacheable=lambda value: False)
+        second = await cache.get_or_load("key", loader, cacheable=lambda value: True)
+        third = await cache.get_or_load("key", loader)
+        return first, second, third
+
+    assert asyncio.run(main()) == ("value 1", "value 2", "value 2")
+
+
+def test_cancelled_caller_does_not_cancel_the_load():
+    cache = TTLCache("test", ttl=60)
+    loader = Loader()
+
+    async def main():
+        loader.release = asyncio.Event()
+        impatient = asyncio.create_task(cache.get_or_load("key", loader))
+        patient = asyncio.create_task(cache.get_or_load("key", loader))
+        await asyncio.sleep(0)
+        impatient.cancel()
+        await asyncio.sleep(0)
+        loader.release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await impatient
+        return await patient
+
+    assert asyncio.run(main()) == "value 1"
+    assert cache.get("key") == "value 1"
+    assert loader.calls == 1
+
+
+def test_pop_during_load_detaches_it():
+    cache = TTLCache("test", ttl=60)
+    loader = Loader()
+
+    async def main():
+        loader.release = asyncio.Event()
+        stale = asyncio.create_task(cache.get_or_load("key", loader))
+        await asyncio.sleep(0)
+        # Invalidated while loading: the pending result may predate the change
+        cache.pop("key")
+        fresh = asyncio.create_task(cache.get_or_load("key", loader))
+        await asyncio.sleep(0)
+        loader.release.set()
+        return await stale, await fresh
+
+    stale, fresh = asyncio.run(main())
+    assert (stale, fresh) == ("value 1", "value 2")
+    assert loader.calls == 2
+    # Only the load started after the invalidation is cached
+    assert cache.get("key") == "value 2"
+
+
+def test_pop_during_load_without_new_callers_caches_nothing():
+    cache = TTLCache("test", ttl=60)
+    loader = Loader()
+
+    async def main():
+        loader.release = asyncio.Event()
+        task = asyncio.create_task(cache.get_or_load("key", loader))
+        await asyncio.sleep(0)
+        cache.pop("key")
+        loader.release.set()
+        return await task
+
+    assert asyncio.run(main()) == "value 1"
+    assert "key" not in cache
+
+
+def test_entries_are_read_back_from_the_store(tmp_path):
+    path = str(tmp_path / "state.db")
+    TTLCache("test", ttl=60, store=StateStore(path)).set("key", "value")
+    TTLCache("test", ttl=0.05, store=StateStore(path)).set("short", "value")
+    time.sleep(0.06)
+
+    restarted = TTLCache("test", ttl=60, store=StateStore(path))
+    assert restarted.get("key") == "value"
+    assert restarted.get("short") is None
+    restarted.pop("key")
+    assert TTLCache("test", ttl=60, store=StateStore(path)).get("key") is None
@@ -0,0 +1,211 @@
+"""Inline keyboards: the callback registry and the clock-in/out button handlers."""
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import bot
+import grillo_client
+from callbacks import CallbackRegistry
+from grillo_client import AsyncGrilloClient
+from grillo_sim import GrilloSimulator
+
+
+def test_keyboard_is_single_use():
+    registry = CallbackRegistry(ttl=60, maxsize=10)
+    keyboard_id = registry.register(1, {"summary": "Fixed PCs"})
+    data = registry.button("✅", "clockout", keyboard_id, "yes").callback_data
+
+    assert registry.parse(data) == ("clockout", keyboard_id, "yes")
+    assert registry.claim(data, 1) == ("ok", {"summary": "Fixed PCs"}, "yes")
+    assert registry.claim(data, 1) == ("stale", None, "yes")
+
+
+def test_keyboard_of_somebody_else_is_left_to_its_owner():
+    registry = CallbackRegistry(ttl=60, maxsize=10)
+    data = registry.button("Lab", "clockin", registry.register(1, {"locations": []}), 0).callback_data
+
+    assert registry.claim(data, 2) == ("foreign", None, "0")
+    assert registry.claim(data, 1)[0] == "ok"
+
+
+def test_keyboard_expires():
+    registry = CallbackRegistry(ttl=0.05, maxsize=10)
+    data = registry.button("Lab", "clockin", registry.register(1, {}), 0).callback_data
+    time.sleep(0.1)
+
+    assert registry.claim(data, 1)[0] == "stale"
+
+
+def test_oldest_keyboards_are_dropped():
+    registry = CallbackRegistry(ttl=60, maxsize=2)
+    first, _, third = (registry.register(1, {"n": n}) for n in range(3))
+
+    assert registry.claim(f"x:{first}:", 1)[0] == "stale"
+    assert registry.claim(f"x:{third}:", 1)[0] == "ok"
+
+
+def test_callback_data_fits_telegram_limit():
+    registry = CallbackRegistry(ttl=60, maxsize=10)
+    button = registry.button("Lab", "clockout", registry.register(1, {"summary": "x" * 1000}), "yes")
+
+    assert len(button.callback_data.encode()) <= 64
+
+
+class FakeQuery:
+    def __init__(self, data: str):
+        self.data = data
+        self.answers = []
+        self.text = None
+        self.markup_removed = False
+
+    async def answer(self, text=None, show_alert=False):
+        self.answers.append(text)
+
+    async def edit_message_text(self, text, **kwargs):
+        self.text = text
+
+    async def edit_message_reply_markup(self, reply_markup=None):
+        self.markup_removed = reply_markup is None
+
+
+@pytest.fixture
+def sim(monkeypatch):
+    sim = GrilloSimulator(users=3, admins=1)
+    monkeypatch.setattr(grillo_client, "_async_http", None)
+    grillo_client.use_transport(sim.transport())
+    yield sim
+    asyncio.run(grillo_client.aclose())
+
+
+@pytest.fixture
+def chat(monkeypatch, sim):
+    """Replies sent by the handlers, with users mapped to the simulator's by Telegram ID."""
+    sent = []
+
+    async def send(telegram_bot, chat_id, text, **kwargs):
+        sent.append((text, kwargs.get("reply_markup")))
+
+    async def client_of(telegram_id):
+        user = next((user for user in sim.users if user["telegramId"] == str(telegram_id)), None)
+        return AsyncGrilloClient(user=user)
+
+    monkeypatch.setattr(bot.outbox, "send", send)
+    monkeypatch.setattr(bot, "get_user_client_by_telegram", client_of)
+    return sent
+
+
+def command(telegram_id: int, *args):
+    update = SimpleNamespace(
+        effective_user=SimpleNamespace(id=telegram_id),
+        effective_chat=SimpleNamespace(id=telegram_id, type="private"),
+        effective_message=SimpleNamespace(message_id=1),
+    )
+    return update, SimpleNamespace(bot=None, args=list(args))
+
+
+def tap(telegram_id: int, data: str):
+    query = FakeQuery(data)
+    return query, SimpleNamespace(effective_user=SimpleNamespace(id=telegram_id), callback_query=query)
+
+
+def buttons(markup):
+    return [button.callback_data for row in markup.inline_keyboard for button in row]
+
+
+def open_audits(sim):
+    return [(audit["user"], audit["location"]) for audit in sim.audits if audit["endTime"] is None]
+
+
+def test_clockin_picks_location_with_a_button(sim, chat):
+    asyncio.run(bot.clockin(*command(1001)))
+    [(text, markup)] = chat
+    office = buttons(markup)[1]
+
+    # Another user's tap does nothing
+    query, update = tap(1002, office)
+    asyncio.run(bot.clockin_button(update, None))
+    assert query.answers == ["This button is not for you."]
+    assert open_audits(sim) == []
+
+    query, update = tap(1001, office)
+    asyncio.run(bot.clockin_button(update, None))
+    assert query.text == "✅ Clocked in to Office!"
+    assert open_audits(sim) == [("1", "office")]
+
+    # Used keyboards are removed
+    query, update = tap(1001, office)
+    asyncio.run(bot.clockin_button(update, None))
+    assert query.markup_removed and query.text is None
+
+
+def test_clockin_falls_back_to_default_location(sim, chat, monkeypatch):
+    async def broken(self):
+        raise ValueError("Internal server error")
+
+    monkeypatch.setattr(AsyncGrilloClient, "get_locations", broken)
+    asyncio.run(bot.clockin(*command(1001)))
+
+    assert chat == [("✅ Clocked in to lab!", None)]
+    assert open_audits(sim) == [("1", "lab")]
+
+
+def test_unlinked_user_is_told_before_calling_grillo(sim, chat):
+    asyncio.run(bot.clockin(*command(42)))
+    asyncio.run(bot.clockout(*command(42, "Fixed", "PCs")))
+
+    assert [text for text, _ in chat] == ["❌ Your Telegram account is not linked to a Grillo user."] * 2
+    assert sim.requests == 0
+
+
+@pytest.mark.parametrize("choice, clocked_out", [("yes", True), ("no", False)])
+def test_clockout_asks_for_confirmation(sim, chat, choice, clocked_out):
+    asyncio.run(bot.clockin(*command(1001, "@lab")))
+    asyncio.run(bot.clockout(*command(1001, "Fixed", "PCs")))
+    text, markup = chat[-1]
+    assert "Fixed PCs" in text
+    assert open_audits(sim) == [("1", "lab")]
+
+    query, update = tap(1001, next(data for data in buttons(markup) if data.endswith(choice)))
+    asyncio.run(bot.clockout_button(update, None))
+
+    assert (open_audits(sim) == []) is clocked_out
+    assert query.text.startswith("✅ Clocked out" if clocked_out else "Clock-out cancelled")
+
+
+def test_unknown_button_removes_keyboard():
+    query, update = tap(1001, "gone:abc:1")
+    asyncio.run(bot.unknown_button(update, None))
+
+    assert query.markup_removed
+    assert "expired" in query.answers[0]
+
+
+def test_inline_status_with_numeric_location_ids(sim, monkeypatch):
+    sim.locations = {1: {"id": 1, "name": "Lab"}, 2: {"id": 2, "name": "Office"}}
+    answered = []
+
+    async def locations(self):
+        return list(sim.locations.values())
+
+    async def location(self, location_id):
+        return dict(sim.locations[location_id], people=[])
+
+    async def client_of(telegram_id):
+        return AsyncGrilloClient()
+
+    monkeypatch.setattr(AsyncGrilloClient, "get_locations", locations)
+    monkeypatch.setattr(AsyncGrilloClient, "get_location", location)
+    monkeypatch.setattr(bot, "get_user_client_by_telegram", client_of)
+
+    async def answer(results, cache_time=None):
+        answered.append([result.title for result in results])
+
+    update = SimpleNamespace(
+        effective_user=SimpleNamespace(id=1001),
+        inline_query=SimpleNamespace(query="off", answer=answer),
+    )
+    asyncio.run(bot.inline_status(update, None))
+
+    assert answered == [["Who's in Office"]]
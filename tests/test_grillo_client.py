@@ -0,0 +1,298 @@
+"""Timeouts, retries and circuit breaker of the Grillo clients, against a local stub server."""
+import asyncio
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+import grillo_client
+from config import config
+from grillo_client import AsyncGrilloClient, CircuitBreaker, GrilloClient, GrilloUnavailableError
+
+
+class StubGrillo(ThreadingHTTPServer):
+    """
+    HTTP server answering from a script of (status, delay) actions, one per request.
+
+    A status of None drops the connection without answering. Once the script
+    is over every request gets the default action.
+    """
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.script = []
+        self.default = (200, 0)
+        self.requests = []
+        self.lock = threading.Lock()
+
+    @property
+    def api_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def next_action(self, method: str, path: str):
+        with self.lock:
+            self.requests.append((method, path))
+            return self.script.pop(0) if self.script else self.default
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _answer(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        status, delay = self.server.next_action(self.command, self.path)
+        time.sleep(delay)
+        if status is None:
+            self.close_connection = True
+            return
+        body = json.dumps({"ok": status < 400}).encode()
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except OSError:
+            # The client gave up waiting
+            self.close_connection = True
+
+    do_GET = do_POST = do_PATCH = do_DELETE = _answer
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    server = StubGrillo()
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True)
+    thread.start()
+    monkeypatch.setattr(config, "GRILLO_RETRIES", 2)
+    monkeypatch.setattr(config, "GRILLO_RETRY_BACKOFF", 0)
+    monkeypatch.setattr(config, "GRILLO_CONNECT_TIMEOUT", 0.5)
+    monkeypatch.setattr(config, "GRILLO_READ_TIMEOUT", 0.5)
+    monkeypatch.setattr(grillo_client, "breaker", CircuitBreaker(failure_threshold=100, reset_timeout=60))
+    monkeypatch.setattr(grillo_client, "_async_http", None)
+    monkeypatch.setattr(grillo_client, "_session", None)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def request(kind: str, api_url: str, method: str, endpoint: str = "/locations"):
+    """One request through the async or the blocking client, returning its status code."""
+    if kind == "blocking":
+        try:
+            return GrilloClient(api_url=api_url, api_token="test", user={"uid": "test"})._make_request(
+                method, endpoint
+            ).status_code
+        finally:
+            asyncio.run(grillo_client.aclose())
+
+    async def main():
+        try:
+            return (await AsyncGrilloClient(api_url=api_url, api_token="test")._make_request(method, endpoint)).status_code
+        finally:
+            await grillo_client.aclose()
+
+    return asyncio.run(main())
+
+
+CLIENTS = ["async", "blocking"]
+
+
+@pytest.mark.parametrize("kind", CLIENTS)
+def test_read_timeout_raises_unavailable(stub, kind, monkeypatch):
+    monkeypatch.setattr(config, "GRILLO_RETRIES", 0)
+    stub.default = (200, 1.0)
+
+    start = time.monotonic()
+    with pytest.raises(GrilloUnavailableError):
+        request(kind, stub.api_url, "GET")
+    assert time.monotonic() - start < 1.0
+    assert len(stub.requests) == 1
+
+
+def _unanswered_address():
+    """
+    Address of a socket whose accept queue is full, where connecting hangs.
+
+    Returns:
+        The listening socket and the connections filling its queue (both
+        closed by the caller), and its URL
+    """
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(0)
+    fillers = []
+    # Fill the accept queue until a SYN is dropped
+    for _ in range(16):
+        filler = socket.socket()
+        filler.settimeout(0.2)
+        try:
+            filler.connect(listener.getsockname())
+        except socket.timeout:
+            filler.close()
+            break
+        fillers.append(filler)
+    else:
+        pytest.skip("the accept queue never filled up")
+    return listener, fillers, f"http://127.0.0.1:{listener.getsockname()[1]}"
+
+
+@pytest.mark.parametrize("kind", CLIENTS)
+def test_connect_timeout_raises_unavailable(stub, kind, monkeypatch):
+    monkeypatch.setattr(config, "GRILLO_RETRIES", 0)
+    monkeypatch.setattr(config, "GRILLO_CONNECT_TIMEOUT", 0.3)
+    monkeypatch.setattr(config, "GRILLO_READ_TIMEOUT", 5)
+    listener, fillers, api_url = _unanswered_address()
+    try:
+        start = time.monotonic()
+        with pytest.raises(GrilloUnavailableError) as error:
+            request(kind, api_url, "GET")
+        assert time.monotonic() - start < 2
+    finally:
+        for filler in fillers:
+            filler.close()
+        listener.close()
+    if kind == "async":
+        assert isinstance(error.value.__cause__, httpx.ConnectTimeout)
+
+
+@pytest.mark.parametrize("kind", CLIENTS)
+@pytest.mark.parametrize("status", [502, 503, 504, None])
+def test_get_retried_exactly_grillo_retries_times(stub, kind, status):
+    stub.default = (status, 0)
+
+    if status is None:
+        with pytest.raises(GrilloUnavailableError):
+            request(kind, stub.api_url, "GET")
+    else:
+        assert request(kind, stub.api_url, "GET") == status
+    assert len(stub.requests) == 1 + config.GRILLO_RETRIES
+
+
+@pytest.mark.parametrize("kind", CLIENTS)
+def test_get_retry_succeeds(stub, kind):
+    stub.script = [(503, 0), (None, 0)]
+
+    assert request(kind, stub.api_url, "GET") == 200
+    assert len(stub.requests) == 3
+
+
+@pytest.mark.parametrize("kind", CLIENTS)
+def test_get_not_retried_on_other_errors(stub, kind):
+    stub.default = (500, 0)
+
+    assert request(kind, stub.api_url, "GET") == 500
+    assert len(stub.requests) == 1
+
+
+@pytest.mark.parametrize("kind", CLIENTS)
+@pytest.mark.parametrize("method", ["POST", "PATCH"])
+@pytest.mark.parametrize("status", [502, 503, 504, None])
+def test_writes_never_retried(stub, kind, method, status):
+    stub.default = (status, 0)
+
+    if status is None:
+        with pytest.raises(GrilloUnavailableError):
+            request(kind, stub.api_url, method, "/audits")
+    else:
+        assert request(kind, stub.api_url, method, "/audits") == status
+    assert stub.requests == [(method, "/audits")]
+
+
+@pytest.mark.parametrize("kind", CLIENTS)
+def test_write_timeout_not_retried(stub, kind):
+    stub.default = (200, 1.0)
+
+    with pytest.raises(GrilloUnavailableError):
+        request(kind, stub.api_url, "POST", "/audits")
+    assert len(stub.requests) == 1
+
+
+def _open_breaker(stub, monkeypatch, threshold=3, cooldown=0.3):
+    monkeypatch.setattr(config, "GRILLO_RETRIES", 0)
+    breaker = CircuitBreaker(failure_threshold=threshold, reset_timeout=cooldown)
+    monkeypatch.setattr(grillo_client, "breaker", breaker)
+    stub.default = (503, 0)
+    for _ in range(threshold - 1):
+        request("async", stub.api_url, "GET")
+        assert not breaker.is_open
+    request("async", stub.api_url, "GET")
+    assert breaker.is_open
+    return breaker
+
+
+def test_breaker_opens_at_threshold(stub, monkeypatch):
+    _open_breaker(stub, monkeypatch, threshold=3)
+    assert len(stub.requests) == 3
+
+    # Rejected without reaching Grillo
+    with pytest.raises(GrilloUnavailableError):
+        request("async", stub.api_url, "GET")
+    with pytest.raises(GrilloUnavailableError):
+        request("blocking", stub.api_url, "GET")
+    assert len(stub.requests) == 3
+
+
+def test_breaker_success_resets_failure_count(stub, monkeypatch):
+    monkeypatch.setattr(config, "GRILLO_RETRIES", 0)
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    monkeypatch.setattr(grillo_client, "breaker", breaker)
+    stub.script = [(503, 0), (503, 0), (200, 0), (503, 0), (503, 0)]
+
+    for _ in range(5):
+        request("async", stub.api_url, "GET")
+    assert not breaker.is_open
+
+
+def _concurrent_gets(api_url: str, count: int):
+    """count concurrent GETs, returning their status codes or exceptions."""
+    async def main():
+        client = AsyncGrilloClient(api_url=api_url, api_token="test")
+        try:
+            responses = await asyncio.gather(
+                *(client._make_request("GET", "/locations") for _ in range(count)), return_exceptions=True
+            )
+        finally:
+            await grillo_client.aclose()
+        return [r if isinstance(r, BaseException) else r.status_code for r in responses]
+
+    return asyncio.run(main())
+
+
+@pytest.mark.parametrize("probe_status, closes", [(200, True), (503, False)])
+def test_breaker_lets_one_probe_through_after_cooldown(stub, monkeypatch, probe_status, closes):
+    breaker = _open_breaker(stub, monkeypatch, threshold=3, cooldown=0.3)
+    time.sleep(0.35)
+    stub.default = (probe_status, 0.2)
+
+    results = _concurrent_gets(stub.api_url, 5)
+
+    # Exactly one request reached Grillo, the others were rejected while it was in flight
+    assert len(stub.requests) == 4
+    assert results.count(probe_status) == 1
+    assert sum(isinstance(r, GrilloUnavailableError) for r in results) == 4
+    assert breaker.is_open is not closes
+
+    stub.default = (200, 0)
+    if closes:
+        assert request("async", stub.api_url, "GET") == 200
+        assert len(stub.requests) == 5
+    else:
+        # Open for another cooldown, then probed again
+        with pytest.raises(GrilloUnavailableError):
+            request("async", stub.api_url, "GET")
+        assert len(stub.requests) == 4
+        time.sleep(0.35)
+        assert request("async", stub.api_url, "GET") == 200
+        assert not breaker.is_open
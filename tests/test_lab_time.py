@@ -0,0 +1,186 @@
+"""Lab time totals, open sessions and their reconciliation with the audits."""
+import asyncio
+import time
+from datetime import date, datetime, time as dt_time, timedelta
+
+import pytest
+
+import grillo_client
+from grillo_client import AsyncGrilloClient, audit_cache, week_start
+from grillo_sim import GrilloSimulator
+from lab_time import LabTimeStore, reconcile, split_by_day
+
+
+def ts(day: str, hour: int, minute: int = 0) -> int:
+    return int(datetime.combine(date.fromisoformat(day), dt_time(hour, minute)).timestamp())
+
+
+@pytest.fixture
+def store():
+    store = LabTimeStore(":memory:")
+    yield store
+    store.close()
+
+
+def test_totals_by_day_week_and_month(store):
+    store.record_session("u", ts("2024-05-15", 10), ts("2024-05-15", 12))
+    store.record_session("u", ts("2024-05-16", 9), ts("2024-05-16", 10))
+    store.record_session("v", ts("2024-05-15", 14), ts("2024-05-15", 14, 30))
+
+    def total(period, day):
+        return store.total("u", period, date.fromisoformat(day), include_open=False)
+
+    assert total("day", "2024-05-15") == 7200
+    assert total("day", "2024-05-16") == 3600
+    assert total("day", "2024-05-17") == 0
+    assert total("week", "2024-05-19") == 10800
+    assert total("week", "2024-05-20") == 0
+    assert total("month", "2024-05-01") == 10800
+    assert store.top("day", date(2024, 5, 15), include_open=False) == [("u", 7200), ("v", 1800)]
+
+
+def test_session_across_midnight_is_split(store):
+    # Friday 31 May to Saturday 1 June: two days and two months, one week
+    store.record_session("u", ts("2024-05-31", 23), ts("2024-06-01", 1))
+
+    def total(period, day):
+        return store.total("u", period, date.fromisoformat(day), include_open=False)
+
+    assert total("day", "2024-05-31") == total("day", "2024-06-01") == 3600
+    assert total("month", "2024-05-31") == total("month", "2024-06-01") == 3600
+    assert total("week", "2024-05-27") == 7200
+
+
+def test_open_sessions(store):
+    start = int(time.time()) - 600
+    store.record_clockin("u", start)
+
+    assert store.open_session("u") == start
+    assert store.open_sessions() == {"u": start}
+    # Counted in today's totals while open, within the current bucket
+    assert 0 < store.total("u", "week") <= 601
+    assert store.total("u", "week", include_open=False) == 0
+    assert store.top("week")[0][0] == "u"
+
+    store.record_session("u", start, start + 300)
+    assert store.open_sessions() == {}
+    assert store.total("u", "week", day=date.fromtimestamp(start), include_open=False) == 300
+
+
+def test_reconcile_repairs_drift(store):
+    store.record_session("u", ts("2024-05-15", 10), ts("2024-05-15", 12))
+    store.record_session("u", ts("2024-05-20", 10), ts("2024-05-20", 11))
+    store.record_session("v", ts("2024-05-16", 10), ts("2024-05-16", 11))
+
+    drift = store.reconcile(
+        date(2024, 5, 15), date(2024, 5, 16),
+        {("u", date(2024, 5, 15)): 3600, ("w", date(2024, 5, 16)): 600},
+        {},
+    )
+
+    assert drift == 3600 + 3600 + 600
+    assert store.total("u", "day", date(2024, 5, 15), include_open=False) == 3600
+    assert store.total("v", "day", date(2024, 5, 16), include_open=False) == 0
+    assert store.total("w", "week", date(2024, 5, 16), include_open=False) == 600
+    # Outside the range: untouched, and the month follows the days
+    assert store.total("u", "day", date(2024, 5, 20), include_open=False) == 3600
+    assert store.total("u", "month", date(2024, 5, 1), include_open=False) == 7200
+    assert store.top("day", date(2024, 5, 16), include_open=False) == [("w", 600)]
+
+
+def test_reconcile_open_sessions_only_within_range(store):
+    store.record_clockin("before", ts("2024-05-10", 9))
+    store.record_clockin("closed", ts("2024-05-15", 9))
+    store.record_clockin("moved", ts("2024-05-15", 10))
+
+    store.reconcile(date(2024, 5, 15), date(2024, 5, 16), {}, {
+        "moved": ts("2024-05-15", 11),
+        "new": ts("2024-05-16", 8),
+    })
+
+    assert store.open_sessions() == {
+        "before": ts("2024-05-10", 9),
+        "moved": ts("2024-05-15", 11),
+        "new": ts("2024-05-16", 8),
+    }
+
+
+def test_reconcile_skips_users_changed_since(store):
+    since = time.time()
+    store.record_session("u", ts("2024-05-15", 10), ts("2024-05-15", 12))
+
+    drift = store.reconcile(
+        date(2024, 5, 15), date(2024, 5, 15), {("v", date(2024, 5, 15)): 60}, {"u": ts("2024-05-15", 10)}, since
+    )
+
+    assert drift == 60
+    assert store.total("u", "day", date(2024, 5, 15), include_open=False) == 7200
+    assert store.open_sessions() == {}
+
+
+class FakeAuditsClient:
+    """Serves audits to reconcile, running during() halfway through."""
+
+    def __init__(self, audits, during=None):
+        self.audits = audits
+        self.during = during
+
+    async def iter_audits(self, since, until=None, user=None):
+        for n, audit in enumerate(self.audits):
+            if n == len(self.audits) // 2 and self.during:
+                self.during()
+            yield audit
+
+
+def test_reconcile_keeps_changes_made_while_reading(store):
+    now = int(time.time())
+    start = now - 3600
+    audits = [
+        {"user": "u", "startTime": start, "endTime": None},
+        {"user": "v", "startTime": start, "endTime": start + 600},
+    ]
+    # u clocks out while the audits, which still show the session open, are read
+    client = FakeAuditsClient(audits, during=lambda: store.record_session("u", start, now))
+
+    asyncio.run(reconcile(store, client, days=2))
+
+    assert store.open_sessions() == {}
+    assert store.total("u", "day", date.fromtimestamp(start), include_open=False) == next(split_by_day(start, now))[1]
+    assert store.total("v", "day", date.fromtimestamp(start), include_open=False) == 600
+
+
+@pytest.fixture
+def sim(monkeypatch):
+    sim = GrilloSimulator(users=2)
+    monkeypatch.setattr(grillo_client, "_async_http", None)
+    grillo_client.use_transport(sim.transport())
+    audit_cache.clear()
+    yield sim
+    audit_cache.clear()
+    asyncio.run(grillo_client.aclose())
+
+
+def test_session_open_across_weeks_is_closed_by_reconcile(sim, store):
+    sunday_night = int(datetime.combine(week_start(date.today()) - timedelta(days=1), dt_time(23)).timestamp())
+    sim.audits.append({
+        "id": 1, "user": "0", "location": "lab",
+        "startTime": sunday_night, "endTime": None, "summary": None, "approved": False,
+    })
+    admin = AsyncGrilloClient()
+
+    async def main():
+        await reconcile(store, admin, days=14)
+        assert store.open_sessions() == {"0": sunday_night}
+
+        await AsyncGrilloClient(user=sim.users[0]).clockout("Done")
+        store.record_session("0", sunday_night, sim.audits[0]["endTime"])
+        await reconcile(store, admin, days=14)
+
+    asyncio.run(main())
+
+    assert store.open_sessions() == {}
+    this_week = sum(
+        seconds for day, seconds in split_by_day(sunday_night, sim.audits[0]["endTime"])
+        if day >= week_start(date.today())
+    )
+    assert store.total("0", "week") == this_week
@@ -0,0 +1,170 @@
+"""Outbound queue: token buckets, merging queued messages and retrying after RetryAfter."""
+import asyncio
+import time
+
+import pytest
+from telegram.constants import MessageLimit
+from telegram.error import BadRequest, RetryAfter
+
+from outbox import Outbox, TokenBucket, retry_after_seconds
+
+
+class FakeBot:
+    """Records sent messages; raises the queued errors first."""
+
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.sent = []
+        self.attempts = 0
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.attempts += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        self.sent.append((time.monotonic(), chat_id, text, kwargs))
+        return len(self.sent)
+
+
+def fast_outbox(**kwargs) -> Outbox:
+    options = dict(chat_rate=1000, group_rate=1000, chat_burst=1, global_rate=1000)
+    options.update(kwargs)
+    return Outbox(**options)
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=10, capacity=3)
+    assert bucket.full
+    for _ in range(3):
+        assert bucket.wait_time() == 0
+        bucket.consume()
+    assert 0.09 < bucket.wait_time() <= 0.1
+    time.sleep(0.1)
+    assert bucket.wait_time() == 0
+    assert not bucket.full
+
+
+def test_chat_rate_is_respected():
+    bot = FakeBot()
+    outbox = fast_outbox(chat_rate=20, chat_burst=2)
+
+    async def main():
+        # Awaited one by one: nothing to merge
+        for n in range(6):
+            await outbox.send(bot, 1, f"message {n}")
+
+    start = time.monotonic()
+    asyncio.run(main())
+
+    assert [text for _, _, text, _ in bot.sent] == [f"message {n}" for n in range(6)]
+    # A burst of 2, then one message every 50 ms
+    assert time.monotonic() - start >= 4 * 0.05 * 0.9
+
+
+def test_groups_are_slower_and_rates_are_per_chat():
+    bot = FakeBot()
+    outbox = fast_outbox(chat_rate=100, group_rate=10, chat_burst=1)
+
+    async def main():
+        await asyncio.gather(*(
+            outbox.send(bot, chat_id, f"message {n}", coalesce=False) for n in range(3) for chat_id in (-100, 1)
+        ))
+
+    asyncio.run(main())
+    group = [at for at, chat_id, _, _ in bot.sent if chat_id == -100]
+    private = [at for at, chat_id, _, _ in bot.sent if chat_id == 1]
+    assert group[-1] - group[0] >= 2 * 0.1 * 0.9
+    # Private messages are not held back by the slower group
+    assert private[-1] - private[0] < 2 * 0.1 * 0.9
+
+
+def test_global_rate_is_shared_by_chats():
+    bot = FakeBot()
+    outbox = fast_outbox(chat_rate=1000, global_rate=20)
+    # Drain the initial global burst
+    outbox._global.tokens = 0
+
+    async def main():
+        await asyncio.gather(*(outbox.send(bot, chat_id, "hi") for chat_id in range(1, 5)))
+
+    start = time.monotonic()
+    asyncio.run(main())
+    assert len(bot.sent) == 4
+    assert time.monotonic() - start >= 4 * 0.05 * 0.9
+
+
+def test_queued_messages_to_one_chat_are_merged():
+    bot = FakeBot()
+    outbox = fast_outbox(chat_rate=10)
+
+    async def main():
+        first = await outbox.send(bot, 1, "a")
+        # The chat is now throttled: these pile up and go out as one message
+        return [first, *await asyncio.gather(*(outbox.send(bot, 1, text) for text in "bcd"))]
+
+    messages = asyncio.run(main())
+
+    assert [text for _, _, text, _ in bot.sent] == ["a", "b\n\nc\n\nd"]
+    assert messages == [1, 2, 2, 2]
+
+
+def test_messages_that_cannot_be_merged():
+    bot = FakeBot()
+    outbox = fast_outbox(chat_rate=10)
+    long_text = "x" * (MessageLimit.MAX_TEXT_LENGTH - 10)
+
+    async def main():
+        await asyncio.gather(
+            outbox.send(bot, 1, "first"),
+            outbox.send(bot, 1, "html", parse_mode="HTML"),
+            outbox.send(bot, 1, "plain"),
+            outbox.send(bot, 1, "with keyboard", reply_markup="markup"),
+            outbox.send(bot, 1, "not merged", coalesce=False),
+            outbox.send(bot, 1, long_text),
+            outbox.send(bot, 1, "too long to join"),
+        )
+
+    asyncio.run(main())
+    assert [text for _, _, text, _ in bot.sent] == [
+        "first", "html", "plain", "with keyboard", "not merged", long_text, "too long to join",
+    ]
+
+
+def test_retried_after_retry_after():
+    bot = FakeBot(errors=[RetryAfter(0), RetryAfter(0)])
+
+    async def main():
+        return await fast_outbox().send(bot, 1, "hello")
+
+    assert asyncio.run(main()) == 1
+    assert bot.attempts == 3
+    assert [text for _, _, text, _ in bot.sent] == ["hello"]
+
+
+def test_gives_up_after_max_retries():
+    bot = FakeBot(errors=[RetryAfter(0)] * 3)
+
+    async def main():
+        return await fast_outbox(max_retries=2).send(bot, 1, "hello")
+
+    with pytest.raises(RetryAfter):
+        asyncio.run(main())
+    assert bot.attempts == 3
+
+
+def test_other_errors_are_not_retried():
+    bot = FakeBot(errors=[BadRequest("Chat not found")])
+    outbox = fast_outbox()
+
+    async def main():
+        with pytest.raises(BadRequest):
+            await outbox.send(bot, 1, "hello")
+        # The chat keeps working afterwards
+        return await outbox.send(bot, 1, "again")
+
+    assert asyncio.run(main()) == 1
+    assert bot.attempts == 2
+    assert outbox.depth() == 0
+
+
+def test_retry_after_seconds():
+    assert retry_after_seconds(RetryAfter(3)) == 3
@@ -0,0 +1,183 @@
+"""Timer wheel and forgotten clock-out reminders, against the Grillo simulator."""
+import asyncio
+import time
+
+import pytest
+
+import grillo_client
+import reminders
+from grillo_client import AsyncGrilloClient, audit_cache
+from grillo_sim import GrilloSimulator
+from lab_time import LabTimeStore
+from reminders import ADMIN_STAGE, USER_STAGE, ReminderEngine, TimerWheel
+from state_store import StateStore
+from user_directory import UserDirectory
+
+HOUR = 3600
+
+
+def test_wheel_fires_due_timers_only():
+    wheel = TimerWheel(tick=10, slots=8, now=1000)
+    wheel.schedule("a", 1015)
+    wheel.schedule("b", 1035)
+
+    assert wheel.advance(1014) == []
+    assert wheel.advance(1015) == [("a", 1015)]
+    assert "a" not in wheel and "b" in wheel
+    assert wheel.advance(1040) == [("b", 1035)]
+    assert len(wheel) == 0
+
+
+def test_wheel_cancel_and_reschedule():
+    wheel = TimerWheel(tick=10, slots=8, now=1000)
+    wheel.schedule("a", 1015)
+    wheel.schedule("b", 1015)
+    wheel.cancel("a")
+    wheel.cancel("missing")
+    # Rescheduling replaces the previous timer
+    wheel.schedule("b", 1050)
+
+    assert wheel.advance(1030) == []
+    assert wheel.advance(1050) == [("b", 1050)]
+
+
+def test_wheel_past_timer_fires_on_next_advance():
+    wheel = TimerWheel(tick=10, slots=8, now=1000)
+    wheel.schedule("a", 900)
+
+    assert wheel.advance(1001) == [("a", 900)]
+
+
+def test_wheel_wraps_around():
+    # 8 slots of 10 s: a timer due in 200 s lands in a slot visited twice before it is due
+    wheel = TimerWheel(tick=10, slots=8, now=1000)
+    wheel.schedule("far", 1200)
+    wheel.schedule("near", 1030)
+
+    assert wheel.advance(1040) == [("near", 1030)]
+    assert wheel.advance(1120) == []
+    assert wheel.advance(1199) == []
+    assert wheel.advance(1200) == [("far", 1200)]
+
+
+def test_wheel_long_pause_visits_every_slot():
+    wheel = TimerWheel(tick=10, slots=8, now=1000)
+    for n in range(8):
+        wheel.schedule(n, 1000 + n * 10)
+
+    assert sorted(key for key, _ in wheel.advance(5000)) == list(range(8))
+
+
+@pytest.fixture
+def sim(monkeypatch):
+    sim = GrilloSimulator(users=3, admins=1)
+    monkeypatch.setattr(grillo_client, "_async_http", None)
+    grillo_client.use_transport(sim.transport())
+    audit_cache.clear()
+    yield sim
+    audit_cache.clear()
+    asyncio.run(grillo_client.aclose())
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    sent = []
+
+    async def send(bot, chat_id, text, **kwargs):
+        sent.append((chat_id, text))
+
+    monkeypatch.setattr(reminders.outbox, "send", send)
+    return sent
+
+
+def engine(sim, sessions, store=None) -> ReminderEngine:
+    directory = UserDirectory(AsyncGrilloClient())
+    directory.load(sim.users)
+    return ReminderEngine(
+        AsyncGrilloClient(), sessions, directory,
+        user_after=2 * HOUR, admin_after=4 * HOUR, tick=60, resync_interval=300, store=store,
+    )
+
+
+def open_session(sim, sessions, user: str, start: int):
+    sim.audits.append({
+        "id": len(sim.audits) + 1, "user": user, "location": "lab",
+        "startTime": start, "endTime": None, "summary": None, "approved": False,
+    })
+    sessions.record_clockin(user, start)
+
+
+def test_user_then_admins_are_reminded(sim, sent):
+    sessions = LabTimeStore(":memory:")
+    reminder = engine(sim, sessions)
+    open_session(sim, sessions, "1", int(time.time()) - 4 * HOUR - 60)
+    open_session(sim, sessions, "2", int(time.time()) - 60)
+
+    asyncio.run(reminder.run(None))
+    assert [chat_id for chat_id, _ in sent] == [1001]
+    assert reminder.tracked["1"][1] == ADMIN_STAGE
+    assert reminder.tracked["2"][1] == USER_STAGE
+
+    # The admin reminder was already due: it fires on the next tick, to the admins
+    asyncio.run(reminder.run(None))
+    assert [chat_id for chat_id, _ in sent] == [1001, 1000]
+    assert "User 1" in sent[1][1]
+    assert "1" not in reminder.wheel
+
+    asyncio.run(reminder.run(None))
+    assert len(sent) == 2
+
+
+def test_session_closed_elsewhere_is_dismissed_once(sim, sent):
+    sessions = LabTimeStore(":memory:")
+    reminder = engine(sim, sessions)
+    open_session(sim, sessions, "1", int(time.time()) - 3 * HOUR)
+    # Closed on the website: still open in the lab time store until the next reconcile
+    sim.audits[0]["endTime"] = int(time.time()) - HOUR
+
+    asyncio.run(reminder.run(None))
+    assert sent == []
+    requests = sim.requests
+
+    # Resyncs keep it dismissed instead of scheduling it again
+    reminder._next_resync = 0
+    asyncio.run(reminder.run(None))
+    assert "1" in reminder.tracked and "1" not in reminder.wheel
+    assert sim.requests == requests
+
+    # Forgotten once it leaves the open sessions
+    sessions.record_session("1", sim.audits[0]["startTime"], sim.audits[0]["endTime"])
+    reminder._next_resync = 0
+    asyncio.run(reminder.run(None))
+    assert reminder.tracked == {}
+
+
+def test_unreadable_audits_retry_on_next_tick(sim, sent):
+    sessions = LabTimeStore(":memory:")
+    reminder = engine(sim, sessions)
+    open_session(sim, sessions, "1", int(time.time()) - 3 * HOUR)
+
+    sim.error_rate = 1
+    asyncio.run(reminder.run(None))
+    assert sent == [] and "1" in reminder.wheel
+
+    sim.error_rate = 0
+    asyncio.run(reminder.run(None))
+    assert [chat_id for chat_id, _ in sent] == [1001]
+
+
+def test_stages_restored_from_store(sim, sent, tmp_path):
+    sessions = LabTimeStore(":memory:")
+    store = StateStore(str(tmp_path / "state.db"))
+    open_session(sim, sessions, "1", int(time.time()) - 3 * HOUR)
+    open_session(sim, sessions, "2", int(time.time()) - 60)
+    asyncio.run(engine(sim, sessions, store).run(None))
+    assert len(sent) == 1
+
+    # After a restart: user 1 is not reminded again, user 2 still will be
+    restarted = engine(sim, sessions, StateStore(str(tmp_path / "state.db")))
+    asyncio.run(restarted.run(None))
+    assert len(sent) == 1
+    assert restarted.tracked["1"][1] == ADMIN_STAGE
+    assert restarted.tracked["2"][1] == USER_STAGE
+    assert "1" in restarted.wheel and "2" in restarted.wheel
@@ -0,0 +1,40 @@
+"""Importing the bot must stay cheap: no files, databases or blocking clients until they are used."""
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import json, sys
+import bot, grillo_client, lab_time, state_store, user_mapper
+print(json.dumps({
+    "lab_time_db_open": lab_time.lab_time._conn is not None,
+    "state_db_open": state_store.state_store._conn is not None,
+    "mappings_loaded": user_mapper.user_mapper._mappings is not None,
+    "admin_client_built": grillo_client._api_admin_grillo is not None,
+    "requests_imported": "requests" in sys.modules,
+}))
+"""
+
+
+def test_import_creates_nothing(tmp_path):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    # The default, file-backed state in the working directory
+    for name in ("STATE_DB", "LAB_TIME_DB", "MAPPING_FILE", "MAPPING_DB"):
+        env.pop(name, None)
+
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=tmp_path, env=env, capture_output=True, text=True, timeout=60
+    )
+
+    assert result.returncode == 0, result.stderr
+    assert json.loads(result.stdout) == {
+        "lab_time_db_open": False,
+        "state_db_open": False,
+        "mappings_loaded": False,
+        "admin_client_built": False,
+        "requests_imported": False,
+    }
+    assert list(tmp_path.iterdir()) == []
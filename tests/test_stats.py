@@ -0,0 +1,61 @@
+"""The /stats command must fit in a Telegram message however many metrics there are."""
+import asyncio
+from types import SimpleNamespace
+
+from telegram.constants import MessageLimit
+
+import bot
+import metrics
+
+
+class FakeMessage:
+    message_id = 1
+
+    def __init__(self):
+        self.documents = []
+
+    async def reply_document(self, document, filename=None, **kwargs):
+        self.documents.append((filename, document.read()))
+
+
+def _run_stats(monkeypatch, args):
+    sent = []
+
+    async def send(telegram_bot, chat_id, text, **kwargs):
+        sent.append(text)
+
+    async def admin_client(telegram_id):
+        return SimpleNamespace(is_admin=lambda: True)
+
+    monkeypatch.setattr(bot.outbox, "send", send)
+    monkeypatch.setattr(bot, "get_user_client_by_telegram", admin_client)
+    message = FakeMessage()
+    update = SimpleNamespace(
+        effective_user=SimpleNamespace(id=1),
+        effective_chat=SimpleNamespace(id=1, type="private"),
+        effective_message=message,
+    )
+    asyncio.run(bot.stats(update, SimpleNamespace(bot=None, args=args)))
+    return sent, message.documents
+
+
+def test_summary_fits_in_a_message(monkeypatch):
+    # Plenty of labelled samples, as after a long uptime
+    for n in range(50):
+        bot.HANDLER_SECONDS.observe(0.01, command=f"command_{n}")
+
+    sent, documents = _run_stats(monkeypatch, [])
+
+    assert len(sent) == 1 and not documents
+    assert len(sent[0]) < MessageLimit.MAX_TEXT_LENGTH
+    assert "Grillo circuit" in sent[0]
+    assert len(metrics.render()) > MessageLimit.MAX_TEXT_LENGTH
+
+
+def test_full_metrics_sent_as_file(monkeypatch):
+    sent, documents = _run_stats(monkeypatch, ["full"])
+
+    assert not sent
+    [(filename, content)] = documents
+    assert filename == "metrics.txt"
+    assert b"grillo_requests_in_flight" in content
@@ -0,0 +1,78 @@
+"""Stress test of PerUserUpdateProcessor with many interleaved updates per user."""
+import asyncio
+import random
+import time
+
+from telegram import Update
+from telegram.ext import Application, MessageHandler, filters
+
+from bench import FakeTelegramRequest, command_update, percentile
+from update_processor import PerUserUpdateProcessor
+
+USERS = 40
+UPDATES_PER_USER = 25
+MAX_CONCURRENT = 8
+
+
+def test_per_user_order_and_concurrency():
+    rng = random.Random(8)
+    # Round-robin over the users, so every user's updates are interleaved with everybody else's
+    arrivals = [(n, 1000 + n % USERS) for n in range(USERS * UPDATES_PER_USER)]
+    enqueued_at = {}
+    handled_at = {}
+    handled = {}  # user -> update_ids in handling order
+    running = set()
+    overlaps = []
+    concurrency = {"now": 0, "max": 0}
+
+    async def handler(update: Update, context) -> None:
+        user = update.effective_user.id
+        if user in running:
+            overlaps.append(update.update_id)
+        running.add(user)
+        concurrency["now"] += 1
+        concurrency["max"] = max(concurrency["max"], concurrency["now"])
+        try:
+            await asyncio.sleep(rng.uniform(0, 0.004))
+            handled.setdefault(user, []).append(update.update_id)
+        finally:
+            concurrency["now"] -= 1
+            running.discard(user)
+            handled_at[update.update_id] = time.perf_counter()
+
+    async def run():
+        application = (
+            Application.builder()
+            .token("123456:test")
+            .request(FakeTelegramRequest())
+            .concurrent_updates(PerUserUpdateProcessor(MAX_CONCURRENT))
+            .build()
+        )
+        application.add_handler(MessageHandler(filters.ALL, handler))
+        async with application:
+            await application.start()
+            start = time.perf_counter()
+            for update_id, user in arrivals:
+                enqueued_at[update_id] = time.perf_counter()
+                await application.update_queue.put(Update.de_json(command_update(update_id, user, "/x"), application.bot))
+            while len(handled_at) < len(arrivals):
+                await asyncio.sleep(0.01)
+            elapsed = time.perf_counter() - start
+            await application.stop()
+        return elapsed
+
+    elapsed = asyncio.run(run())
+
+    assert overlaps == []
+    for user, update_ids in handled.items():
+        assert update_ids == sorted(update_ids), f"updates of user {user} handled out of order"
+        assert len(update_ids) == UPDATES_PER_USER
+    assert 1 < concurrency["max"] <= MAX_CONCURRENT
+
+    latencies = [handled_at[n] - enqueued_at[n] for n, _ in arrivals]
+    print(
+        f"\n{len(arrivals)} updates from {USERS} users in {elapsed:.2f}s"
+        f" ({len(arrivals) / elapsed:.0f} updates/s, up to {concurrency['max']} handlers at once);"
+        f" latency p50 {percentile(latencies, 50) * 1000:.1f} ms, p95 {percentile(latencies, 95) * 1000:.1f} ms,"
+        f" p99 {percentile(latencies, 99) * 1000:.1f} ms"
+    )
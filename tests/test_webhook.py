@@ -0,0 +1,90 @@
+"""End-to-end test of webhook mode: synthetic updates posted to the local listener."""
+import asyncio
+import socket
+import time
+
+import httpx
+
+import bot
+from bench import FakeTelegramRequest, command_update
+from config import config
+
+SECRET = "s3cret-token"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _with_webhook(test):
+    """Run test(client, url, request) against the bot listening for webhooks."""
+    request = FakeTelegramRequest()
+    application = bot.build_application(request=request, jobs=False)
+    port = _free_port()
+    async with application:
+        await application.updater.start_webhook(
+            listen="127.0.0.1",
+            port=port,
+            url_path=config.WEBHOOK_PATH,
+            secret_token=SECRET,
+            webhook_url=f"https://example.invalid/{config.WEBHOOK_PATH}",
+        )
+        await application.start()
+        try:
+            async with httpx.AsyncClient(timeout=10) as client:
+                await test(client, f"http://127.0.0.1:{port}/{config.WEBHOOK_PATH}", request)
+        finally:
+            await application.updater.stop()
+            await application.stop()
+
+
+async def _wait_for_replies(request: FakeTelegramRequest, count: int, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while len(request.sent) < count:
+        assert time.monotonic() < deadline, f"only {len(request.sent)}/{count} replies sent"
+        await asyncio.sleep(0.01)
+
+
+def test_secret_token_and_path_are_enforced():
+    async def test(client, url, request):
+        update = command_update(1, 1000, "/help")
+        assert (await client.post(url, json=update)).status_code == 403
+        wrong = {"X-Telegram-Bot-Api-Secret-Token": "wrong"}
+        assert (await client.post(url, json=update, headers=wrong)).status_code == 403
+        good = {"X-Telegram-Bot-Api-Secret-Token": SECRET}
+        assert (await client.post(url + "-other", json=update, headers=good)).status_code == 404
+        await asyncio.sleep(0.2)
+        assert request.sent == []
+
+        assert (await client.post(url, json=update, headers=good)).status_code == 200
+        await _wait_for_replies(request, 1)
+        assert request.sent[0][1]["chat_id"] == 1000
+
+    asyncio.run(_with_webhook(test))
+
+
+def test_webhook_throughput():
+    updates = 500
+    headers = {"X-Telegram-Bot-Api-Secret-Token": SECRET}
+
+    async def test(client, url, request):
+        semaphore = asyncio.Semaphore(config.UPDATE_CONCURRENCY * 4)
+
+        async def post(n: int):
+            async with semaphore:
+                response = await client.post(url, json=command_update(n, 1000 + n % 50, "/help"), headers=headers)
+                assert response.status_code == 200
+
+        start = time.perf_counter()
+        await asyncio.gather(*(post(n) for n in range(updates)))
+        await _wait_for_replies(request, updates)
+        elapsed = time.perf_counter() - start
+        print(f"\nwebhook: {updates} updates in {elapsed:.2f}s, {updates / elapsed:.0f} updates/s"
+              f" (UPDATE_CONCURRENCY={config.UPDATE_CONCURRENCY})")
+        assert sorted(parameters["chat_id"] for _, parameters in request.sent) == sorted(
+            1000 + n % 50 for n in range(updates)
+        )
+
+    asyncio.run(_with_webhook(test))
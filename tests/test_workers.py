@@ -0,0 +1,77 @@
+"""Worker processes: update partitioning and state shared through the store."""
+import multiprocessing
+
+import pytest
+from telegram import Update
+
+import workers
+from bench import command_update
+from cache import TTLCache
+from config import config
+from state_store import StateStore
+
+
+def update(update_id: int, user_id: int, chat_id: int = None, chat_type: str = "private") -> Update:
+    data = command_update(update_id, user_id, "/status")
+    data["message"]["chat"] = {"id": chat_id or user_id, "type": chat_type}
+    return Update.de_json(data, None)
+
+
+def test_each_user_stays_on_one_worker():
+    count = 4
+    seen = {}
+    for n in range(200):
+        user = 1000 + n % 25
+        # The same user writes in private and in two groups
+        chat, kind = [(user, "private"), (-100, "group"), (-200, "supergroup")][n % 3]
+        seen.setdefault(user, set()).add(workers.partition(update(n, user, chat, kind), count))
+
+    assert all(len(indexes) == 1 for indexes in seen.values())
+    assert {index for indexes in seen.values() for index in indexes} == set(range(count))
+
+
+def test_updates_without_user_or_chat_go_to_worker_zero():
+    channel_post = Update.de_json({
+        "update_id": 1,
+        "channel_post": {"message_id": 1, "date": 0, "chat": {"id": -1003, "type": "channel"}, "text": "hi"},
+    }, None)
+
+    assert workers.partition(channel_post, 4) == -1003 % 4
+    assert workers.partition(Update(update_id=2), 4) == 0
+
+
+@pytest.mark.parametrize("backend, state_db", [("json", "state.db"), ("sqlite", ""), ("sqlite", ":memory:")])
+def test_refuses_process_local_state(monkeypatch, backend, state_db):
+    monkeypatch.setattr(config, "MAPPING_BACKEND", backend)
+    monkeypatch.setattr(config, "STATE_DB", state_db)
+
+    with pytest.raises(ValueError):
+        workers.check_shared_state()
+
+
+def _worker(path: str, set_key: str, get_key: str, results: "multiprocessing.Queue"):
+    """In another process: cache set_key, then read get_key as cached by anybody."""
+    cache = TTLCache("locations", ttl=60, store=StateStore(path))
+    cache.set(set_key, {"set by": set_key})
+    results.put(cache.get(get_key))
+
+
+def test_workers_share_cached_state(tmp_path):
+    path = str(tmp_path / "state.db")
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+
+    first = context.Process(target=_worker, args=(path, "lab", "lab", results))
+    first.start()
+    first.join(30)
+    assert results.get(timeout=5) == {"set by": "lab"}
+
+    # Another worker, started later, reads what the first one fetched
+    second = context.Process(target=_worker, args=(path, "office", "lab", results))
+    second.start()
+    second.join(30)
+    assert results.get(timeout=5) == {"set by": "lab"}
+
+    # And so does this process, already running, on a miss
+    cache = TTLCache("locations", ttl=60, store=StateStore(path))
+    assert cache.get("office") == {"set by": "office"}
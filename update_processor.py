@@ -0,0 +1,73 @@
+"""Concurrent update processing that keeps each user's updates in order."""
+import asyncio
+from typing import Any, Awaitable, Dict, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+def ordering_key(update: object) -> Optional[int]:
+    """Identify whose updates must be serialized: the user, or else the chat."""
+    if not isinstance(update, Update):
+        return None
+    if update.effective_user:
+        return update.effective_user.id
+    if update.effective_chat:
+        return update.effective_chat.id
+    return None
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """
+    Process updates concurrently, but one at a time per Telegram user.
+
+    Updates from different users run in parallel, up to max_concurrent_updates
+    handlers at once. Updates from the same user run in arrival order, so a
+    /clockin followed by a /clockout can never race.
+
+    python-telegram-bot holds a slot of its own semaphore while an update
+    waits for its user's turn. That semaphore is sized max_pending_updates,
+    larger than the handler limit, so one user flooding the bot does not
+    starve everybody else.
+    """
+
+    def __init__(self, max_concurrent_updates: int, max_pending_updates: Optional[int] = None):
+        """
+        Initialize the processor.
+
+        Args:
+            max_concurrent_updates: Maximum number of handlers running at the same time
+            max_pending_updates: Maximum number of updates accepted for processing,
+                including those waiting for their user's turn (defaults to 16 per handler)
+        """
+        super().__init__(max_pending_updates or max_concurrent_updates * 16)
+        self._handler_slots = asyncio.Semaphore(max_concurrent_updates)
+        self._user_locks: Dict[int, asyncio.Lock] = {}
+        self._user_pending: Dict[int, int] = {}
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        key = ordering_key(update)
+        if key is None:
+            async with self._handler_slots:
+                await coroutine
+            return
+
+        lock = self._user_locks.get(key)
+        if lock is None:
+            lock = self._user_locks[key] = asyncio.Lock()
+        self._user_pending[key] = self._user_pending.get(key, 0) + 1
+        try:
+            async with lock:
+                async with self._handler_slots:
+                    await coroutine
+        finally:
+            self._user_pending[key] -= 1
+            if not self._user_pending[key]:
+                del self._user_pending[key]
+                del self._user_locks[key]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
@@ -0,0 +1,185 @@
+"""In-memory index of the LDAP user directory, refreshed in the background."""
+import asyncio
+import logging
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from telegram.ext import ContextTypes
+
+import metrics
+from grillo_client import AsyncGrilloClient, async_admin_grillo
+from state_store import state_store
+
+if TYPE_CHECKING:
+    from state_store import StateStore
+
+logger = logging.getLogger(__name__)
+
+DIRECTORY_LOOKUPS = metrics.counter(
+    "directory_lookups_total",
+    "User lookups by index and outcome (hit: served from memory, fallback: asked the API)",
+    ["index", "result"],
+)
+
+
+def _telegram_id(user: Dict[str, Any]) -> Optional[int]:
+    """Telegram ID of an LDAP user object, if set."""
+    telegram_id = user.get("telegramId", user.get("telegram_id"))
+    try:
+        return int(telegram_id) if telegram_id not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+class UserDirectory:
+    """
+    Snapshot of every LDAP user, indexed by uid, Telegram ID and Grillo ID.
+
+    The snapshot is pulled from /users by refresh(); lookups are answered from
+    memory and fall back to the single-user API endpoints on a miss, so a
+    user added after the last refresh is still found.
+
+    With a store, every refreshed snapshot is saved, and the last one is read
+    back on the first lookup after a restart, before the first refresh ends.
+    """
+
+    def __init__(self, grillo_client: AsyncGrilloClient, store: Optional["StateStore"] = None):
+        """
+        Initialize an empty directory.
+
+        Args:
+            grillo_client: AsyncGrilloClient instance with admin API token
+            store: StateStore keeping the last snapshot across restarts
+        """
+        self.grillo = grillo_client
+        self.store = store
+        self._restored = store is None
+        self.by_uid: Dict[str, Dict[str, Any]] = {}
+        self.by_telegram_id: Dict[int, Dict[str, Any]] = {}
+        self.by_id: Dict[str, Dict[str, Any]] = {}
+        self.loaded_at: Optional[float] = None
+
+    def __len__(self) -> int:
+        return len(self.by_uid)
+
+    def _restore(self):
+        """Load the snapshot saved before the last restart, once, if nothing newer is loaded."""
+        if self._restored:
+            return
+        self._restored = True
+        if self.loaded_at is not None:
+            return
+        stored = self.store.get("directory", "snapshot")
+        if stored is not None:
+            users, loaded_at = stored[0]
+            self.load(users)
+            self.loaded_at = loaded_at
+            logger.info(f"Restored {len(users)} users in the directory")
+
+    def load(self, users: List[Dict[str, Any]]):
+        """Replace the indexes with a new list of users."""
+        by_uid, by_telegram_id, by_id = {}, {}, {}
+        for user in users:
+            if user.get("uid"):
+                by_uid[user["uid"]] = user
+            if user.get("id") is not None:
+                by_id[str(user["id"])] = user
+            telegram_id = _telegram_id(user)
+            if telegram_id is not None:
+                by_telegram_id[telegram_id] = user
+        # Swap all indexes at once so readers never see a half-built snapshot
+        self.by_uid, self.by_telegram_id, self.by_id = by_uid, by_telegram_id, by_id
+        self.loaded_at = time.time()
+
+    async def refresh(self) -> int:
+        """
+        Pull the whole directory from the API and rebuild the indexes.
+
+        Returns:
+            Number of users loaded
+        """
+        users = await self.grillo.get_ldap_users()
+        if not isinstance(users, list):
+            raise ValueError(f"Unexpected /users response: {users}")
+        self.load(users)
+        if self.store is not None:
+            self.store.set("directory", "snapshot", (users, self.loaded_at))
+        return len(users)
+
+    async def refresh_job(self, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """JobQueue callback refreshing the directory, keeping the old snapshot on errors."""
+        try:
+            count = await self.refresh()
+            logger.info(f"Loaded {count} users in the directory")
+        except Exception as e:
+            logger.error(f"Error refreshing user directory: {e}")
+
+    async def get_by_uid(self, uid: str) -> Optional[Dict[str, Any]]:
+        """
+        Find a user by LDAP uid.
+
+        Returns:
+            User object or None if not found
+        """
+        self._restore()
+        user = self.by_uid.get(uid)
+        if user is not None:
+            DIRECTORY_LOOKUPS.inc(index="uid", result="hit")
+            return user
+
+        DIRECTORY_LOOKUPS.inc(index="uid", result="fallback")
+        user = await self.grillo.get_user_by_uid(uid)
+        if not user or 'error' in user:
+            return None
+        self.by_uid[uid] = user
+        if user.get("id") is not None:
+            self.by_id[str(user["id"])] = user
+        return user
+
+    async def get_by_uids(self, uids: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        Resolve many uids at once: hits are answered from memory, misses are
+        fetched from the API concurrently.
+
+        Returns:
+            Dictionary of uid -> user object, or None if not found
+        """
+        self._restore()
+        users = {uid: self.by_uid.get(uid) for uid in uids}
+        missing = [uid for uid, user in users.items() if user is None]
+        DIRECTORY_LOOKUPS.inc(len(users) - len(missing), index="uid", result="hit")
+        if missing:
+            found = await asyncio.gather(*(self.get_by_uid(uid) for uid in missing), return_exceptions=True)
+            for uid, user in zip(missing, found):
+                users[uid] = None if isinstance(user, BaseException) else user
+        return users
+
+    def get_by_telegram_id(self, telegram_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Find a user by Telegram ID in the in-memory snapshot only.
+
+        The API fallback is left to UserMapper, which deduplicates and
+        negatively caches discovery lookups.
+        """
+        self._restore()
+        user = self.by_telegram_id.get(telegram_id)
+        DIRECTORY_LOOKUPS.inc(index="telegram_id", result="fallback" if user is None else "hit")
+        return user
+
+    def get_by_id(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Find a user by Grillo user ID in the in-memory snapshot."""
+        self._restore()
+        return self.by_id.get(str(user_id))
+
+    def members_of(self, group: str) -> List[Dict[str, Any]]:
+        """Users of an LDAP group, from the in-memory snapshot."""
+        self._restore()
+        return [user for user in self.by_id.values() if group in (user.get("groups") or [])]
+
+
+# Initialize user directory
+user_directory = UserDirectory(async_admin_grillo, store=state_store)
+
+metrics.gauge(
+    "directory_users", "LDAP users in the in-memory directory snapshot"
+).set_function(lambda: len(user_directory))
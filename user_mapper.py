@@ -1,41 +1,60 @@
 """User mapping between Telegram and Grillo/LDAP users."""
-import json
-import os
+import logging
+from collections.abc import MutableMapping
 from typing import Optional, Dict
-from grillo_client import GrilloClient, api_admin_grillo
+from cache import TTLCache
+from config import config
+import metrics
+from grillo_client import AsyncGrilloClient, async_admin_grillo
+from mapping_store import open_store
+from state_store import state_store
+from user_directory import UserDirectory, user_directory
+
+logger = logging.getLogger(__name__)
 
 
 class UserMapper:
     """Map Telegram users to Grillo/LDAP users and manage sessions."""
 
-    def __init__(self, grillo_client: GrilloClient, mapping_file: str = "user_mapping.json"):
+    def __init__(self, grillo_client: AsyncGrilloClient, mappings: MutableMapping = None,
+                 directory: UserDirectory = None):
         """
         Initialize the user mapper.
 
         Args:
-            grillo_client: GrilloClient instance with admin API token
-            mapping_file: Path to JSON file storing Telegram ID to LDAP ID mappings
+            grillo_client: AsyncGrilloClient instance with admin API token
+            mappings: Store of Telegram ID to LDAP user mappings (defaults to the configured
+                backend, opened on first access)
+            directory: In-memory user directory consulted before the API
         """
         self.grillo = grillo_client
-        self.mapping_file = mapping_file
-        self.mappings = self._load_mappings()
-        self.clients = {}  # Cache of telegram_id -> GrilloClient
-
-    def _load_mappings(self) -> Dict[int, str]:
-        """Load user mappings from file."""
-        if os.path.exists(self.mapping_file):
-            with open(self.mapping_file, 'r') as f:
-                # Convert string keys back to ints
-                data = json.load(f)
-                return {int(k): v for k, v in data.items()}
-        return {}
-
-    def _save_mappings(self):
-        """Save user mappings to file."""
-        with open(self.mapping_file, 'w') as f:
-            json.dump(self.mappings, f, indent=2)
-
-    def map_user(self, telegram_id: int, ldap_username: str = None) -> bool:
+        self.directory = directory
+        self._mappings = mappings
+        # Cache of telegram_id -> AsyncGrilloClient, bounded in size and idle time
+        self.clients = TTLCache(
+            "user_clients",
+            ttl=config.CLIENT_CACHE_IDLE,
+            maxsize=config.CLIENT_CACHE_SIZE,
+            sliding=True,
+        )
+        # Telegram IDs recently looked up and not found in LDAP, kept across restarts
+        self.unknown_users = TTLCache(
+            "unknown_users",
+            ttl=config.UNKNOWN_USER_CACHE_TTL,
+            maxsize=config.UNKNOWN_USER_CACHE_SIZE,
+            store=state_store,
+        )
+        # Lookups in flight, so that a burst from one user costs one request
+        self._lookups = TTLCache("user_lookups", ttl=0)
+
+    @property
+    def mappings(self) -> MutableMapping:
+        """The mapping store, opened (and the JSON file parsed) on first access."""
+        if self._mappings is None:
+            self._mappings = open_store(config.MAPPING_BACKEND, config.MAPPING_FILE, config.MAPPING_DB)
+        return self._mappings
+
+    async def map_user(self, telegram_id: int, ldap_username: str = None) -> bool:
         """
         Map a Telegram user to an LDAP user. If ldap_username is not provided,
         attempts to auto-discover the user via Telegram ID.
@@ -50,50 +69,65 @@ class UserMapper:
         try:
             # If username not provided, try to find user by Telegram ID
             if not ldap_username:
-                user = self.grillo.get_user_by_telegram_id(telegram_id)
-                print("AUTO-DISCOVERED USER:")
-                print(user)
+                user = self.directory.get_by_telegram_id(telegram_id) if self.directory else None
+                if user is None:
+                    if telegram_id in self.unknown_users:
+                        return False
+                    user = await self._lookups.get_or_load(
+                        telegram_id, lambda: self.grillo.get_user_by_telegram_id(telegram_id)
+                    )
+                logger.debug(f"Discovered user for Telegram ID {telegram_id}: {user}")
                 # if user:
                 #     ldap_username = user.get('uid')
                 if not user:
+                    # Request failed: do not remember, it may be transient
+                    return False
+                if 'error' in user:
+                    self.unknown_users.set(telegram_id, True)
+                    return False
+            else:
+                if self.directory:
+                    user = await self.directory.get_by_uid(ldap_username)
+                else:
+                    user = await self.grillo.get_user_by_uid(ldap_username)
+                if not user or 'error' in user:
                     return False
 
             self.mappings[telegram_id] = user
-            self._save_mappings()
+            self.unknown_users.pop(telegram_id)
 
-            # Clear cached session
-            if telegram_id in self.sessions:
-                del self.sessions[telegram_id]
+            # Clear cached client
+            self.clients.pop(telegram_id)
 
             return True
         except Exception:
             return False
 
-    def get_client_for_user(self, telegram_id: int) -> Optional[GrilloClient]:
+    async def get_client_for_user(self, telegram_id: int) -> Optional[AsyncGrilloClient]:
         """
-        Get a GrilloClient with session auth for a specific Telegram user.
+        Get an AsyncGrilloClient with session auth for a specific Telegram user.
 
         Args:
             telegram_id: Telegram user ID
 
         Returns:
-            GrilloClient instance with user session or None if user not mapped
+            AsyncGrilloClient instance with user session or None if user not mapped
         """
         user = self.mappings.get(telegram_id)
         if not user:
-            res = self.map_user(telegram_id)
+            res = await self.map_user(telegram_id)
             if not res:
                 return None
+            user = self.mappings[telegram_id]
 
         # Check if we have a cached client
-        if telegram_id in self.clients:
-            client = self.clients[telegram_id]
-        else:
-            client = GrilloClient(
+        client = self.clients.get(telegram_id)
+        if client is None:
+            client = AsyncGrilloClient(
                 api_url=self.grillo.api_url,
                 user=user
             )
-            self.clients[telegram_id] = client
+            self.clients.set(telegram_id, client)
 
         return client
 
@@ -101,9 +135,33 @@ class UserMapper:
         """Check if a Telegram user is mapped to an LDAP user."""
         return telegram_id in self.mappings
 
-    def list_mappings(self) -> Dict[int, str]:
+    def list_mappings(self) -> Dict[int, dict]:
         """Get all user mappings."""
-        return self.mappings.copy()
+        return dict(self.mappings.items())
+
+    def memory_usage(self) -> Dict[str, int]:
+        """
+        Report the size of the client cache.
+
+        Returns:
+            Dictionary with the number of cached clients, their approximate
+            total size and the approximate bytes per entry
+        """
+        self.clients.expire()
+        entries = len(self.clients)
+        total = self.clients.approx_bytes()
+        return {
+            "entries": entries,
+            "bytes": total,
+            "bytes_per_entry": total // entries if entries else 0,
+        }
 
 # Initialize user mapper
-user_mapper = UserMapper(api_admin_grillo)
\ No newline at end of file
+user_mapper = UserMapper(async_admin_grillo, directory=user_directory)
+
+metrics.gauge(
+    "user_clients_cached", "Per-user Grillo clients held in memory"
+).set_function(lambda: len(user_mapper.clients))
+metrics.gauge(
+    "user_clients_bytes", "Approximate memory held by cached per-user Grillo clients"
+).set_function(lambda: user_mapper.clients.approx_bytes())
\ No newline at end of file
@@ -0,0 +1,43 @@
+"""Utility functions for Grillo Telegram Bot."""
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+
+def format_duration(seconds: int) -> str:
+    """Format a duration in seconds as "Xh Ym", omitting the hours when zero."""
+    hours = seconds // 3600
+    minutes = (seconds % 3600) // 60
+    if hours > 0:
+        return f"{hours}h {minutes}m"
+    return f"{minutes}m"
+
+
+def user_display_name(user: Optional[Dict[str, Any]], fallback: str = "Unknown") -> str:
+    """Human readable name of an LDAP user object."""
+    if not user:
+        return fallback
+    return user.get("cn") or user.get("name") or user.get("uid") or fallback
+
+
+def format_location_status(location: Dict[str, Any]) -> str:
+    """Render a location object (people in the lab, upcoming bookings) as HTML."""
+    response = f"📊 <b>Status for {location['name']}</b>\n\n"
+
+    # People in the lab
+    people = location.get("people", [])
+    if people:
+        response += "👥 <b>People in lab:</b>\n"
+        for person in people:
+            response += f"  • {person.get('name', 'Unknown')}\n"
+    else:
+        response += "👥 No one is currently in the lab.\n"
+
+    # Upcoming bookings
+    bookings = location.get("bookings", [])
+    if bookings:
+        response += "\n📅 <b>Upcoming bookings:</b>\n"
+        for booking in bookings[:5]:  # Show max 5
+            start = datetime.fromtimestamp(booking['startTime'])
+            response += f"  • {start.strftime('%a %H:%M')} - {booking.get('userName', 'Unknown')}\n"
+
+    return response
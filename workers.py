@@ -0,0 +1,171 @@
+"""
+Run the bot as several worker processes sharing their state.
+
+A dispatcher process polls Telegram and hands each update to one worker,
+chosen by Telegram user ID (or chat ID), so every user's updates are still
+handled in order by a single process. Workers share the user mappings and
+the caches through SQLite (MAPPING_BACKEND=sqlite and STATE_DB); the jobs
+that must run once per deployment run only in worker 0.
+
+Usage:
+    python workers.py [count]   Start count workers (default: one per CPU)
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import queue
+import sys
+from typing import Any, Callable, Dict, List, Optional
+
+from telegram import Bot, Update
+
+from config import config
+from update_processor import ordering_key
+
+logging.basicConfig(
+    format="%(asctime)s - %(processName)s - %(name)s - %(levelname)s - %(message)s",
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+
+def partition(update: Update, count: int) -> int:
+    """Index of the worker handling update: updates without a user or chat go to worker 0."""
+    key = ordering_key(update)
+    return key % count if key is not None else 0
+
+
+def check_shared_state():
+    """
+    Make sure the state workers rely on is shared between processes.
+
+    Raises:
+        ValueError: If mappings or caches would stay process-local
+    """
+    if config.MAPPING_BACKEND != "sqlite":
+        raise ValueError("Workers need MAPPING_BACKEND=sqlite: the JSON file cannot be shared")
+    if not config.STATE_DB or config.STATE_DB == ":memory:":
+        raise ValueError("Workers need STATE_DB to point to a database file shared by all of them")
+
+
+async def _serve(application, updates: "multiprocessing.Queue") -> None:
+    """Feed the updates received from the dispatcher to the application, until None arrives."""
+    loop = asyncio.get_running_loop()
+    async with application:
+        if application.post_init:
+            await application.post_init(application)
+        await application.start()
+        try:
+            while True:
+                data = await loop.run_in_executor(None, updates.get)
+                if data is None:
+                    break
+                await application.update_queue.put(Update.de_json(data, application.bot))
+        finally:
+            # Waits for the updates already handed over to be handled
+            await application.stop()
+            if application.post_shutdown:
+                await application.post_shutdown(application)
+
+
+def run_worker(index: int, count: int, updates: "multiprocessing.Queue",
+               request_factory: Optional[Callable[[], Any]] = None) -> None:
+    """
+    Worker process entry point: build the application and serve updates.
+
+    Args:
+        index: Worker number, from 0
+        count: Total number of workers
+        updates: Queue of update dictionaries from the dispatcher
+        request_factory: Returns the Bot API transport to use instead of the
+            default one (used by the benchmarks)
+    """
+    # Read when the modules below are first imported: each worker gets its own
+    # metrics port and an equal share of the outbound message rate
+    if config.METRICS_PORT:
+        config.METRICS_PORT = config.METRICS_PORT + index
+    config.OUTBOX_GLOBAL_RATE = config.OUTBOX_GLOBAL_RATE / count
+
+    import bot
+
+    request = request_factory() if request_factory else None
+    application = bot.build_application(request=request, jobs=index == 0)
+    try:
+        asyncio.run(_serve(application, updates))
+    except KeyboardInterrupt:
+        pass
+
+
+def start_workers(count: int, request_factory: Optional[Callable[[], Any]] = None) -> List[Dict[str, Any]]:
+    """
+    Start count worker processes.
+
+    Returns:
+        One {"process", "updates"} dictionary per worker
+    """
+    context = multiprocessing.get_context("spawn")
+    workers = []
+    for index in range(count):
+        updates = context.Queue()
+        process = context.Process(
+            target=run_worker,
+            args=(index, count, updates, request_factory),
+            name=f"worker-{index}",
+        )
+        process.start()
+        workers.append({"process": process, "updates": updates})
+    return workers
+
+
+def stop_workers(workers: List[Dict[str, Any]], timeout: float = 30) -> None:
+    """Ask every worker to finish its pending updates and exit, then wait for them."""
+    for worker in workers:
+        try:
+            worker["updates"].put(None)
+        except (OSError, ValueError, queue.Full):
+            pass
+    for worker in workers:
+        worker["process"].join(timeout)
+        if worker["process"].is_alive():
+            logger.warning(f"{worker['process'].name} did not stop, terminating it")
+            worker["process"].terminate()
+
+
+async def dispatch(workers: List[Dict[str, Any]]) -> None:
+    """Poll Telegram and hand every update to its worker."""
+    async with Bot(config.TELEGRAM_BOT_TOKEN) as bot:
+        await bot.delete_webhook()
+        offset = None
+        while True:
+            updates = await bot.get_updates(offset=offset, timeout=30, allowed_updates=Update.ALL_TYPES)
+            for update in updates:
+                workers[partition(update, len(workers))]["updates"].put(update.to_dict())
+                offset = update.update_id + 1
+            for worker in workers:
+                if not worker["process"].is_alive():
+                    raise RuntimeError(f"{worker['process'].name} exited")
+
+
+def main() -> None:
+    """Start the workers and the dispatcher."""
+    try:
+        config.validate()
+        check_shared_state()
+    except ValueError as e:
+        logger.error(f"Configuration error: {e}")
+        return
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else os.cpu_count() or 1
+    logger.info(f"Starting Grillo Telegram Bot with {count} workers...")
+    workers = start_workers(count)
+    try:
+        asyncio.run(dispatch(workers))
+    except KeyboardInterrupt:
+        logger.info("Shutting down...")
+    finally:
+        stop_workers(workers)
+
+
+if __name__ == "__main__":
+    main()